@@ -0,0 +1,36 @@
+"""
+SQLite backend that applies tuned pragmas to every new connection.
+
+WAL lets readers keep reading while a quiz submission holds the write
+lock, and busy_timeout makes writers queue instead of failing with
+"database is locked". Pragmas can be overridden with OPTIONS['pragmas'],
+where None leaves a pragma at SQLite's default.
+
+journal_mode is stored in the database file itself, so switching it
+rewrites the file's header.
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+        for name, value in pragmas.items():
+            if value is not None:
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
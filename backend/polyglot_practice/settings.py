@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from polyglot_practice.db import database_from_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    "quizzes.perf.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # Add CORS middleware
@@ -85,13 +89,48 @@ WSGI_APPLICATION = "polyglot_practice.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL selects the backend (see polyglot_practice/db). Connections
+# are kept open for DB_CONN_MAX_AGE seconds and health-checked before reuse.
+# DB_POOLED=True is for running behind a transaction pooler like PgBouncer.
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')
+
 DATABASES = {
+    "default": database_from_url(
+        DATABASE_URL,
+        base_dir=BASE_DIR,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        conn_health_checks=True,
+        pooled=os.getenv('DB_POOLED', 'False') == 'True',
+    )
+}
+if DATABASES["default"]["ENGINE"] == "polyglot_practice.db.sqlite3":
+    # A file-backed test database lets concurrency tests use real
+    # per-thread connections.
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+    if 'DATABASE_URL' not in os.environ:
+        # Leave the checked-in development database in its journal mode;
+        # switching to WAL would rewrite it on every manage.py run
+        DATABASES["default"]["OPTIONS"].setdefault("pragmas", {}).setdefault("journal_mode", None)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# The quiz content version lives here, so the local-memory default is only
+# right for a single process (runserver). With several workers, point
+# CACHE_BACKEND at a shared cache; `manage.py check --deploy` warns otherwise.
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": os.getenv('CACHE_LOCATION', 'polyglot-practice'),
     }
 }
 
+# Cache alias and lifetime for serialized quiz content
+QUIZ_CACHE_ALIAS = 'default'
+QUIZ_CACHE_TIMEOUT = int(os.getenv('QUIZ_CACHE_TIMEOUT', 60 * 60 * 24))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,6 +177,70 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 AUDIO_FILES_DIR = os.path.join(MEDIA_ROOT, 'audio')
 AUDIO_FILES_URL = f'{MEDIA_URL}audio/'
 
+# Pre-rendered quiz bundles (see quizzes/bundles.py and build_quiz_bundles).
+# QUIZ_BUNDLES: None (off), 'redirect' (expanded language/level quiz lists
+# redirect to the bundle, for a CDN) or 'serve' (Django sends the bundle
+# file). When set, bundles are rebuilt incrementally after content edits.
+QUIZ_BUNDLES = os.getenv('QUIZ_BUNDLES') or None
+QUIZ_BUNDLES_DIR = os.path.join(MEDIA_ROOT, 'bundles')
+QUIZ_BUNDLES_URL = f'{MEDIA_URL}bundles/'
+
+# Offload audio transfers to the front-end server: None (stream from
+# Django), 'x-accel-redirect' (nginx, with an internal location mapped to
+# AUDIO_SENDFILE_PREFIX) or 'x-sendfile' (Apache mod_xsendfile)
+AUDIO_SENDFILE = os.getenv('AUDIO_SENDFILE') or None
+AUDIO_SENDFILE_PREFIX = '/protected-audio/'
+
+# Text-to-speech engine (see quizzes/tts.py): 'gtts', 'google' (Google Cloud,
+# needs GOOGLE_APPLICATION_CREDENTIALS), 'stub' for an offline engine that
+# returns a silent frame, or a dotted path to a TTSEngine subclass
+TTS_ENGINE = os.getenv('TTS_ENGINE', 'gtts')
+TTS_ENGINE_OPTIONS = {
+    'timeout': int(os.getenv('TTS_TIMEOUT', 10)),
+}
+# Voice name, part of the audio cache key alongside text, language and engine
+TTS_VOICE = os.getenv('TTS_VOICE', '')
+
+# Encodings stored for each phrase, most compact first; clients pick one by
+# Accept header or ?format=. The default format is the one every browser
+# plays and the one Question.audio_url points at. Engines that can't produce
+# a format natively are transcoded with ffmpeg at the given bitrate.
+AUDIO_FORMATS = {
+    'opus': {'bitrate': '24k'},
+    'mp3': {'bitrate': '64k'},
+}
+AUDIO_DEFAULT_FORMAT = 'mp3'
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+# When speech question audio is synthesized: 'lazy' on first playback (with
+# single-flight locking, waiting up to TTS_LAZY_WAIT_SECONDS), or 'queue'
+# ahead of time by the process_audio_jobs worker. Lazy synthesis locks with
+# files in AUDIO_FILES_DIR, so workers sharing the directory share the lock.
+AUDIO_SYNTHESIS = os.getenv('AUDIO_SYNTHESIS', 'lazy')
+TTS_LAZY_WAIT_SECONDS = 15
+
+# Audio generation queue (see quizzes/jobs.py and process_audio_jobs)
+AUDIO_JOB_MAX_ATTEMPTS = 5
+AUDIO_JOB_BACKOFF_SECONDS = 30
+AUDIO_JOB_BACKOFF_MAX_SECONDS = 60 * 60
+AUDIO_JOB_STALE_SECONDS = 10 * 60
+
+# Batch synthesis: parallel engine calls and max calls per second (None for
+# no limit). gTTS is an unofficial endpoint, so stay polite by default.
+TTS_BATCH_CONCURRENCY = int(os.getenv('TTS_BATCH_CONCURRENCY', 4))
+TTS_RATE_LIMIT = float(os.getenv('TTS_RATE_LIMIT', 5)) or None
+
+# Share of requests timed by quizzes.perf.PerformanceMiddleware (0 to 1):
+# sampled responses get a Server-Timing header and a JSON log line on the
+# quizzes.perf logger, and feed the per-route percentiles at
+# /api/quizzes/perf-stats/ (admin only). 0 turns sampling off.
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', 0))
+
+# Prometheus metrics at /metrics (quizzes/metrics.py). With a token, scrapes
+# must send "Authorization: Bearer <token>". Multi-process servers also
+# need PROMETHEUS_MULTIPROC_DIR set in the environment before start-up.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
 # AWS S3 Settings (uncomment and configure for production)
 # AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 # AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
@@ -160,6 +263,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Cursor pagination on every list endpoint; clients may ask for up to
+    # 200 rows with ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'quizzes.pagination.CursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 # JWT settings
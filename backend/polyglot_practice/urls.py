@@ -18,7 +18,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from quizzes.audio import serve_audio
+from quizzes.bundles import serve_bundle
+from quizzes.metrics import metrics_view
+from users.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,6 +29,12 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/users/', include('users.urls')),
     path('api/quizzes/', include('quizzes.urls')),
+    # Audio is served by Django in every environment (with optional
+    # X-Accel-Redirect / X-Sendfile offload), not only when DEBUG is on
+    path(f"{settings.AUDIO_FILES_URL.lstrip('/')}<str:filename>", serve_audio, name='audio'),
+    path(f"{settings.QUIZ_BUNDLES_URL.lstrip('/')}<str:filename>", serve_bundle, name='quiz-bundle'),
+    # Prometheus scrape target; see quizzes/metrics.py for multi-process setup
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
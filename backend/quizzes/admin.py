@@ -1,6 +1,22 @@
 from django.contrib import admin
-from .models import Quiz, Question, UserProgress
+from .models import AudioJob, LeaderboardEntry, Quiz, Question, QuizSubmission, ReviewSchedule, UserLanguageStats, UserProgress
 
 admin.site.register(Quiz)
 admin.site.register(Question)
 admin.site.register(UserProgress)
+admin.site.register(QuizSubmission)
+admin.site.register(UserLanguageStats)
+admin.site.register(LeaderboardEntry)
+admin.site.register(ReviewSchedule)
+
+
+@admin.register(AudioJob)
+class AudioJobAdmin(admin.ModelAdmin):
+    list_display = ['question', 'status', 'attempts', 'run_after', 'last_error']
+    list_filter = ['status']
+    actions = ['retry']
+
+    @admin.action(description='Retry audio generation')
+    def retry(self, request, queryset):
+        for job in queryset.select_related('question'):
+            AudioJob.enqueue(job.question)
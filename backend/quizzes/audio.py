@@ -0,0 +1,220 @@
+"""
+Audio delivery for speech questions.
+
+Files are streamed straight from AUDIO_FILES_DIR: full responses go through
+FileResponse (so the WSGI server can use sendfile), byte ranges are read in
+fixed-size chunks, and with settings.AUDIO_SENDFILE the whole transfer is
+handed to the front-end server instead. Audio file names never change
+content, so responses are cacheable forever.
+
+Each phrase is stored in every format in settings.AUDIO_FORMATS; the
+per-question endpoint picks one from ?format= or the Accept header.
+"""
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .metrics import AUDIO_BYTES_SERVED
+from .models import Question
+from .services import TTSService
+from .tts import FORMAT_TYPES
+
+logger = logging.getLogger(__name__)
+
+AUDIO_FILENAME_RE = re.compile(r'^[A-Za-z0-9_-]+\.(mp3|ogg|opus)$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'ogg': 'audio/ogg',
+    'opus': 'audio/ogg',
+}
+CHUNK_SIZE = 64 * 1024
+ONE_YEAR = 60 * 60 * 24 * 365
+
+
+def read_range(path, start, length, chunk_size=CHUNK_SIZE):
+    """
+    Yield `length` bytes of a file from `start` without reading it all.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into (start, end) inclusive.
+    Returns None when the header should be ignored and 'unsatisfiable'
+    when the range lies outside the file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return 'unsatisfiable'
+    else:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            return 'unsatisfiable'
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+def negotiate_format(accept):
+    """
+    Pick the audio format for an Accept header: the configured format the
+    client names with the highest q-value, ties going to the more compact
+    one (AUDIO_FORMATS order). Wildcards alone get the default format,
+    which every browser can play.
+    """
+    accepted = {}
+    for media_range in accept.split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[media_type.lower()] = max(q, accepted.get(media_type.lower(), 0.0))
+
+    best, best_q = TTSService.default_format(), 0.0
+    for audio_format in getattr(settings, 'AUDIO_FORMATS', {}):
+        q = accepted.get(FORMAT_TYPES[audio_format].split(';')[0], 0.0)
+        if q > best_q:
+            best, best_q = audio_format, q
+    return best
+
+
+def audio_response(request, path, filename):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("Audio not found")
+
+    size = stat.st_size
+    etag = f'"{size:x}-{int(stat.st_mtime):x}"'
+    audio_format = filename.rsplit('.', 1)[1]
+    content_type = CONTENT_TYPES[audio_format]
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        sendfile = getattr(settings, 'AUDIO_SENDFILE', None)
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if 'Range' in request.headers and (not if_range or if_range == etag):
+            byte_range = parse_range(request.headers['Range'], size)
+
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+        elif sendfile:
+            # The front-end server (nginx / Apache) serves the bytes and
+            # handles Range itself.
+            response = HttpResponse(content_type=content_type)
+            if sendfile == 'x-accel-redirect':
+                response.headers['X-Accel-Redirect'] = f"{settings.AUDIO_SENDFILE_PREFIX}{filename}"
+            else:
+                response.headers['X-Sendfile'] = path
+            AUDIO_BYTES_SERVED.labels(audio_format).inc(size)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response.headers['Content-Length'] = size
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                read_range(path, start, length), status=206, content_type=content_type
+            )
+            response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response.headers['Content-Length'] = length
+            AUDIO_BYTES_SERVED.labels(audio_format).inc(length)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            AUDIO_BYTES_SERVED.labels(audio_format).inc(size)
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+    return response
+
+
+@require_safe
+def serve_audio(request, filename):
+    """
+    Serve a file from AUDIO_FILES_DIR. No authentication: <audio> elements
+    can't send the API's bearer token, and names are unguessable hashes.
+    """
+    if not AUDIO_FILENAME_RE.match(filename):
+        raise Http404("Audio not found")
+    return audio_response(request, os.path.join(settings.AUDIO_FILES_DIR, filename), filename)
+
+
+@require_safe
+def question_audio(request, pk):
+    """
+    Redirect to a speech question's audio, synthesizing it on first request.
+    Concurrent first requests share a single synthesis. The format comes
+    from ?format= or the Accept header; if a compact variant can't be
+    produced, the default format is served instead.
+    """
+    question = get_object_or_404(
+        Question.objects.select_related('quiz__language'), pk=pk, question_type='speech'
+    )
+    audio_format = request.GET.get('format') or negotiate_format(request.headers.get('Accept', ''))
+    if audio_format not in TTSService.audio_formats():
+        return HttpResponseBadRequest(f"Unsupported audio format '{audio_format}'")
+    default_format = TTSService.default_format()
+
+    if audio_format == default_format and question.audio_url and os.path.exists(
+        os.path.join(settings.AUDIO_FILES_DIR, question.audio_url.split('/')[-1])
+    ):
+        return audio_redirect(question.audio_url)
+
+    for candidate in dict.fromkeys([audio_format, default_format]):
+        try:
+            audio_url = TTSService.get_or_generate_audio(
+                question.correct_answer, question.quiz.language.code, audio_format=candidate
+            )
+        except Exception as e:
+            logger.warning("Lazy %s audio for question %s not available: %s", candidate, question.pk, e)
+        else:
+            break
+    else:
+        response = HttpResponse("Audio is not available yet", status=503, content_type='text/plain')
+        response.headers['Retry-After'] = 5
+        return response
+
+    if candidate == default_format and question.audio_url != audio_url:
+        # update() rather than save(): the content signals would invalidate
+        # every cached payload, which point here already and stay correct
+        Question.objects.filter(pk=question.pk).update(audio_url=audio_url, audio_status=Question.AUDIO_READY)
+    return audio_redirect(audio_url)
+
+
+def audio_redirect(url):
+    response = HttpResponseRedirect(url)
+    patch_vary_headers(response, ['Accept'])
+    return response
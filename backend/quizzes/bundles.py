@@ -0,0 +1,389 @@
+"""
+Pre-rendered quiz bundles for static / CDN delivery.
+
+Quiz content is the same for every user, so each language/level quiz list
+(the payload of /api/quizzes/?language=..&level=..&expand=questions) is
+rendered to QUIZ_BUNDLES_DIR as {code}-{level}.{hash}.json, with .gz and
+.br siblings for front-end servers that serve precompressed files (nginx
+gzip_static / brotli_static). manifest.json maps each language:level pair
+to its current file.
+
+Bundles are rebuilt by the build_quiz_bundles command and, when
+settings.QUIZ_BUNDLES is set, incrementally after each content change.
+Incremental rebuilds run when the editing request's transaction commits,
+so they compress at cheaper levels; the next build_quiz_bundles run
+recompresses what they wrote at the best levels.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+from rest_framework.renderers import JSONRenderer
+
+from .locks import acquire_lock_file, release_lock_file
+from .models import Language, Question, Quiz
+from .serializers import QuizSerializer
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .json and .json.gz are written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_FILENAME_RE = re.compile(r'^(manifest|[a-z0-9_-]+\.[0-9a-f]{16})\.json$')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+# gzip and brotli levels. Brotli's 11 costs tens of times quality 5's CPU
+# for a few percent smaller files: worth it once per bundle, not on every edit.
+COMPRESSION = {
+    'best': {'gzip': 9, 'br': 11},
+    'fast': {'gzip': 6, 'br': 5},
+}
+LOCK_NAME = 'manifest.lock'
+ONE_YEAR = 60 * 60 * 24 * 365
+
+_manifest = {'stamp': None, 'data': None}
+
+
+def expanded_quizzes():
+    """
+    Quizzes with their whole language -> questions -> options graph loaded
+    in a fixed number of queries, as the expanded API payloads need.
+    Prefetching questions through the reverse relation also populates
+    question.quiz, so QuestionSerializer.get_quiz doesn't query per row.
+    """
+    return Quiz.objects.select_related('language').prefetch_related(
+        Prefetch('questions', queryset=Question.objects.order_by('id').prefetch_related('options'))
+    )
+
+
+def write_atomic(path, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class QuizBundleService:
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, 'QUIZ_BUNDLES', None))
+
+    @staticmethod
+    def manifest() -> dict:
+        """
+        The current manifest, re-read only when the file changes.
+        """
+        path = os.path.join(settings.QUIZ_BUNDLES_DIR, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {'bundles': {}}
+        if _manifest['stamp'] != (path, mtime):
+            with open(path, 'rb') as f:
+                _manifest['data'] = json.load(f)
+            _manifest['stamp'] = (path, mtime)
+        return _manifest['data']
+
+    @staticmethod
+    def current(language_code: str, level: str, last_modified=None):
+        """
+        Manifest entry for a bundle, or None if there is none or it is older
+        than `last_modified` (the content changed and it wasn't rebuilt yet).
+        """
+        entry = QuizBundleService.manifest()['bundles'].get(f'{language_code}:{level}')
+        if entry is None:
+            return None
+        if last_modified and datetime.fromisoformat(entry['updated_at']) < last_modified:
+            return None
+        return entry
+
+    @staticmethod
+    def render(language_code: str, level: str):
+        """
+        Serialize one language/level quiz list exactly as the expanded list
+        endpoint does. There is one quiz per language and level, so the
+        bundle is always a single page. Returns (json bytes, quiz ids,
+        last updated_at).
+        """
+        quizzes = list(expanded_quizzes().filter(language__code=language_code, level=level))
+        data = JSONRenderer().render({
+            'next': None,
+            'previous': None,
+            'results': QuizSerializer(quizzes, many=True).data,
+        })
+        updated_at = max((quiz.updated_at for quiz in quizzes), default=None)
+        return data, [quiz.pk for quiz in quizzes], updated_at
+
+    @staticmethod
+    def build(pairs=None, compression='best'):
+        """
+        Render bundles for (language_code, level) pairs, where a level of None
+        means every level of that language, or for all content by default.
+        Unchanged bundles keep their file, though a 'best' build recompresses
+        one a 'fast' build wrote. Returns a list of
+        (key, entry or None, written) for each bundle considered.
+        """
+        bundles_dir = settings.QUIZ_BUNDLES_DIR
+        os.makedirs(bundles_dir, exist_ok=True)
+
+        existing = QuizBundleService.manifest()['bundles']
+        in_db = set(Quiz.objects.values_list('language__code', 'level').distinct())
+        if pairs is None:
+            targets = in_db | {tuple(key.split(':', 1)) for key in existing}
+        else:
+            targets = set()
+            for code, level in pairs:
+                if level is None:
+                    targets |= {pair for pair in in_db if pair[0] == code}
+                    targets |= {tuple(key.split(':', 1)) for key in existing if key.split(':', 1)[0] == code}
+                else:
+                    targets.add((code, level))
+
+        results = []
+        for code, level in sorted(targets):
+            key = f'{code}:{level}'
+            data, quiz_ids, updated_at = QuizBundleService.render(code, level)
+            if not quiz_ids:
+                results.append((key, None, False))
+                continue
+
+            digest = hashlib.sha256(data).hexdigest()
+            filename = f'{code}-{level}.{digest[:16]}.json'
+            path = os.path.join(bundles_dir, filename)
+            # How the files already on disk were compressed, if they exist
+            stored = None
+            if os.path.exists(path):
+                previous = existing.get(key)
+                stored = previous.get('compression', 'best') if previous and previous['hash'] == digest else 'best'
+            written = stored is None or (compression == 'best' and stored != 'best')
+            if written:
+                # Compressed siblings first, so the plain file's presence
+                # means the whole set is in place
+                levels = COMPRESSION[compression]
+                write_atomic(path + '.gz', gzip.compress(data, levels['gzip'], mtime=0))
+                if brotli is not None:
+                    write_atomic(path + '.br', brotli.compress(data, quality=levels['br']))
+                write_atomic(path, data)
+                stored = compression
+
+            encodings = {'identity': len(data)}
+            for encoding, suffix in ENCODINGS:
+                if os.path.exists(path + suffix):
+                    encodings[encoding] = os.path.getsize(path + suffix)
+            results.append((key, {
+                'url': f'{settings.QUIZ_BUNDLES_URL}{filename}',
+                'hash': digest,
+                'bytes': encodings,
+                'quizzes': quiz_ids,
+                'updated_at': updated_at.isoformat(),
+                'compression': stored,
+            }, written))
+
+        QuizBundleService._update_manifest({key: entry for key, entry, _ in results})
+        return results
+
+    @staticmethod
+    def _update_manifest(changes):
+        """
+        Merge changed entries (None removes one) into the manifest. The
+        read-modify-write is serialized across processes with a lock file.
+        """
+        lock_path = os.path.join(settings.QUIZ_BUNDLES_DIR, LOCK_NAME)
+        deadline = time.monotonic() + 30
+        while not acquire_lock_file(lock_path, 60):
+            if time.monotonic() >= deadline:
+                raise TimeoutError('Timed out waiting for the quiz bundle manifest lock')
+            time.sleep(0.05)
+        try:
+            bundles = dict(QuizBundleService.manifest()['bundles'])
+            for key, entry in changes.items():
+                if entry is None:
+                    bundles.pop(key, None)
+                elif key not in bundles or bundles[key]['updated_at'] <= entry['updated_at']:
+                    # A concurrent build may have rendered newer content
+                    bundles[key] = entry
+            manifest = {
+                'generated_at': timezone.now().isoformat(),
+                'bundles': dict(sorted(bundles.items())),
+            }
+            write_atomic(
+                os.path.join(settings.QUIZ_BUNDLES_DIR, MANIFEST_NAME),
+                json.dumps(manifest, indent=2).encode('utf-8')
+            )
+        finally:
+            release_lock_file(lock_path)
+
+    @staticmethod
+    def prune(min_age: int = 3600, dry_run: bool = False):
+        """
+        Delete bundle files the manifest no longer points at, once they are
+        older than min_age seconds (clients may still hold the old manifest).
+        Returns (files removed, bytes freed).
+        """
+        bundles_dir = settings.QUIZ_BUNDLES_DIR
+        if not os.path.isdir(bundles_dir):
+            return 0, 0
+        current = {
+            entry['url'].rsplit('/', 1)[-1]
+            for entry in QuizBundleService.manifest()['bundles'].values()
+        }
+        cutoff = time.time() - min_age
+        removed = freed = 0
+        with os.scandir(bundles_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                for _, suffix in ENCODINGS:
+                    name = name[:-len(suffix)] if name.endswith(suffix) else name
+                if name == MANIFEST_NAME or name in current or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(entry.path)
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+
+class _PendingRebuild:
+    """
+    Ids whose bundles to rebuild when a transaction commits. Registered with
+    on_commit once per transaction, so a rollback discards it with the
+    transaction's other callbacks.
+    """
+
+    def __init__(self):
+        self.ids = {'languages': set(), 'quizzes': set(), 'questions': set()}
+
+    def __call__(self):
+        _rebuild(self.ids)
+
+
+def schedule_rebuild(languages=(), quizzes=(), questions=()):
+    """
+    Rebuild the bundles containing these languages, quizzes or questions
+    (by id) once the current transaction commits. Requests within one
+    transaction are merged, so a bulk edit rebuilds each bundle once.
+    """
+    if not QuizBundleService.enabled():
+        return
+    connection = transaction.get_connection()
+    pending = next(
+        (func for _, func, *_ in connection.run_on_commit if isinstance(func, _PendingRebuild)), None
+    )
+    register = pending is None
+    if register:
+        pending = _PendingRebuild()
+    pending.ids['languages'].update(languages)
+    pending.ids['quizzes'].update(quizzes)
+    pending.ids['questions'].update(questions)
+    if register:
+        transaction.on_commit(pending)
+
+
+def _rebuild(ids):
+    if not any(ids.values()):
+        return
+
+    codes = dict(Language.objects.filter(pk__in=ids['languages']).values_list('pk', 'code'))
+    if len(codes) < len(ids['languages']):
+        # A language was deleted; only a full build can tell what to drop
+        pairs = None
+    else:
+        pairs = {(code, None) for code in codes.values()}
+        pairs |= set(Quiz.objects.filter(pk__in=ids['quizzes']).values_list('language__code', 'level'))
+        pairs |= set(
+            Question.objects.filter(pk__in=ids['questions'])
+            .values_list('quiz__language__code', 'quiz__level')
+        )
+    try:
+        QuizBundleService.build(pairs, compression='fast')
+    except Exception:
+        # Stale bundles are never served (see QuizBundleService.current),
+        # so a failed rebuild only costs the dynamic fallback
+        logger.exception('Incremental quiz bundle rebuild failed')
+
+
+def accepted_encodings(header: str) -> set:
+    """
+    Content codings an Accept-Encoding header allows (q-value above zero).
+    """
+    encodings = set()
+    for part in header.split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def bundle_response(request, filename):
+    """
+    Serve a bundle file, precompressed to match Accept-Encoding. Hashed
+    bundles never change and are cacheable forever; the manifest is
+    revalidated on every use.
+    """
+    path = os.path.join(settings.QUIZ_BUNDLES_DIR, filename)
+    if not os.path.exists(path):
+        raise Http404('Bundle not found')
+
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.exists(path + suffix):
+            encoding, path = name, path + suffix
+            break
+
+    stat = os.stat(path)
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}{"-" + encoding if encoding else ""}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if filename == MANIFEST_NAME:
+        patch_cache_control(response, public=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+    return response
+
+
+@require_safe
+def serve_bundle(request, filename):
+    """
+    Serve a file from QUIZ_BUNDLES_DIR. In production the front-end server
+    or CDN serves these directly and this view is never reached.
+    """
+    if not BUNDLE_FILENAME_RE.match(filename):
+        raise Http404('Bundle not found')
+    return bundle_response(request, filename)
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CONTENT_VERSION_KEY = 'quizzes:content-version'
+_language_ids = {'version': None, 'ids': {}}
+_language_ids_lock = threading.Lock()
+
+STATS_KEYS = {
+    'hits': 'quizzes:cache-stats:hits',
+    'misses': 'quizzes:cache-stats:misses',
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def get_content_version() -> int:
+    """
+    Return the current quiz content version.
+
+    The version is seeded from the clock rather than starting at 1, so if the
+    key is ever evicted the new version cannot collide with one that stale
+    entries were stored under.
+    """
+    cache = get_cache()
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(CONTENT_VERSION_KEY)
+    return version
+
+
+def bump_content_version() -> None:
+    """
+    Invalidate every cached quiz payload by moving to a new content version.
+    """
+    cache = get_cache()
+    try:
+        cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:
+        # Key was evicted; the next read seeds a fresh version.
+        get_content_version()
+    logger.debug("Quiz content version bumped")
+
+
+def make_key(name: str, variant: str = '') -> str:
+    """
+    Cache key for a payload. Variants can be whole URLs, so they are hashed
+    to keep keys within memcached's 250 characters.
+    """
+    digest = hashlib.sha1(variant.encode()).hexdigest() if variant else ''
+    return f"quizzes:v{get_content_version()}:{name}:{digest}"
+
+
+def make_etag(name: str, variant: str = '') -> str:
+    """
+    Strong ETag for a payload. It only changes when the content version
+    does, so it can be computed without touching the database.
+    """
+    digest = hashlib.sha1(make_key(name, variant).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _record(stat: str) -> None:
+    cache = get_cache()
+    key = STATS_KEYS[stat]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_or_build(name: str, variant: str, build, record_stats: bool = True):
+    """
+    Return the cached payload for (name, variant) at the current content
+    version, calling build() and storing its result on a miss.
+    """
+    cache = get_cache()
+    key = make_key(name, variant)
+    data = cache.get(key)
+    if data is not None:
+        if record_stats:
+            _record('hits')
+        return data
+
+    if record_stats:
+        _record('misses')
+    data = build()
+    cache.set(key, data, getattr(settings, 'QUIZ_CACHE_TIMEOUT', 60 * 60 * 24))
+    return data
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    hits = cache.get(STATS_KEYS['hits'], 0)
+    misses = cache.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'content_version': get_content_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats() -> None:
+    get_cache().delete_many(list(STATS_KEYS.values()))
+
+
+def language_ids() -> dict:
+    """
+    Map of language code -> id, held in process memory and reloaded when
+    the content version moves on, so code lookups skip the database.
+    """
+    version = get_content_version()
+    if _language_ids['version'] != version:
+        from .models import Language
+
+        with _language_ids_lock:
+            if _language_ids['version'] != version:
+                _language_ids['ids'] = dict(Language.objects.values_list('code', 'id'))
+                _language_ids['version'] = version
+    return _language_ids['ids']
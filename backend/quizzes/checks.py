@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_quiz_cache_is_shared(app_configs, **kwargs):
+    """
+    The content version that keys cached payloads, ETags and language
+    lookups lives in the quiz cache, so every worker process has to share it.
+    """
+    alias = getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Warning(
+        f"The '{alias}' cache is local to each process, so a content edit only "
+        "invalidates cached quiz payloads, ETags and language codes in the worker that made it.",
+        hint="Run a single worker process, or set CACHE_BACKEND and CACHE_LOCATION "
+             "to a cache every worker shares (Redis, Memcached or the database cache).",
+        id='quizzes.W001',
+    )]
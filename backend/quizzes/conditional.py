@@ -0,0 +1,40 @@
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from . import cache as content_cache
+
+
+class ConditionalContentMixin:
+    """
+    Conditional GET for cached content endpoints.
+
+    The ETag comes from the content version and Last-Modified from a cached
+    lookup, so a matching If-None-Match / If-Modified-Since is answered with
+    a 304 before anything is serialized.
+    """
+
+    def get_last_modified(self, name, variant):
+        return None
+
+    def conditional_get(self, request, name, variant, build):
+        etag = content_cache.make_etag(name, variant)
+        last_modified = content_cache.get_or_build(
+            f'{name}-modified', variant,
+            lambda: self.get_last_modified(name, variant),
+            record_stats=False,
+        )
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = Response(content_cache.get_or_build(name, variant, build))
+
+        response.headers['ETag'] = etag
+        if timestamp is not None:
+            response.headers['Last-Modified'] = http_date(timestamp)
+        # Content is the same for every user but sits behind authentication,
+        # so clients must revalidate rather than reuse it blindly.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,401 @@
+"""
+Quiz content from files.
+
+A catalogue is one or more JSON, YAML or CSV files (or directories of
+them). JSON and YAML files hold a versioned document:
+
+    version: 1
+    languages:
+      - code: es
+        name: Spanish
+        flag_emoji: "🇪🇸"
+        quizzes:
+          - level: beginner
+            title: Spanish - Beginner
+            description: Learn Spanish at Beginner level
+            questions:
+              - key: hello            # optional, defaults to the text
+                type: multiple_choice
+                text: How do you say "hello" in Spanish?
+                answer: Hola
+                options: [Bonjour, Ciao, Hola]
+
+CSV files have one question per row with the columns language, level,
+key, type, text, answer and options ('|'-separated), plus optional
+language_name, flag_emoji, quiz_title and quiz_description.
+
+ContentService.load() diffs a catalogue against the database and applies
+it with bulk queries in one transaction. Questions are matched within
+their quiz by key, options within their question by text, so loading the
+same files again changes nothing.
+"""
+import csv
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bundles import schedule_rebuild
+from .cache import bump_content_version
+from .models import AudioJob, Language, Question, QuestionOption, Quiz, UserAnswer
+from .signals import bulk_content_changes
+from .stats import UserStatsService
+
+CONTENT_VERSION = 1
+CONTENT_EXTENSIONS = ('.json', '.yaml', '.yml', '.csv')
+BATCH_SIZE = 1000
+QUESTION_FIELDS = ['key', 'text', 'question_type', 'correct_answer', 'audio_url', 'audio_status']
+
+
+class ContentError(ValueError):
+    pass
+
+
+def batches(items, size=BATCH_SIZE):
+    # Keeps IN (...) lists under the backends' parameter limits
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def content_files(paths):
+    """
+    The content files under `paths`, directories expanded in name order.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith(CONTENT_EXTENSIONS)
+            )
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            raise ContentError(f"{path}: no such file or directory")
+    return files
+
+
+def read_catalogue(paths) -> dict:
+    """
+    Read and merge content files into
+    {code: {'name', 'flag_emoji', 'quizzes': {level: {'title', 'description',
+    'questions': {key: question}}}}}.
+    """
+    catalogue = {}
+    for path in content_files(paths):
+        if path.endswith('.csv'):
+            languages = read_csv(path)
+        else:
+            document = read_document(path)
+            if not isinstance(document, dict) or document.get('version') != CONTENT_VERSION:
+                raise ContentError(f"{path}: expected a document with version: {CONTENT_VERSION}")
+            languages = document.get('languages') or []
+        for language in languages:
+            merge_language(catalogue, language, path)
+    return catalogue
+
+
+def read_document(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            try:
+                return json.load(f)
+            except ValueError as e:
+                raise ContentError(f"{path}: {e}")
+        try:
+            import yaml
+        except ImportError:
+            raise ContentError(f"{path}: PyYAML is needed to read YAML content")
+        try:
+            return yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise ContentError(f"{path}: {e}")
+
+
+def read_csv(path) -> list:
+    """
+    Rows of a CSV file regrouped into the document's languages list.
+    """
+    languages = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            if not row.get('language') or not row.get('level'):
+                raise ContentError(f"{path}:{line}: language and level are required")
+            language = languages.setdefault(row['language'], {
+                'code': row['language'], 'name': '', 'flag_emoji': '', 'quizzes': {},
+            })
+            language['name'] = language['name'] or row.get('language_name') or ''
+            language['flag_emoji'] = language['flag_emoji'] or row.get('flag_emoji') or ''
+            quiz = language['quizzes'].setdefault(row['level'], {
+                'level': row['level'], 'title': '', 'description': '', 'questions': [],
+            })
+            quiz['title'] = quiz['title'] or row.get('quiz_title') or ''
+            quiz['description'] = quiz['description'] or row.get('quiz_description') or ''
+            quiz['questions'].append({
+                'key': row.get('key') or '',
+                'type': row.get('type') or '',
+                'text': row.get('text') or '',
+                'answer': row.get('answer') or '',
+                'options': [option for option in (row.get('options') or '').split('|') if option],
+            })
+    return [
+        {**language, 'quizzes': list(language['quizzes'].values())}
+        for language in languages.values()
+    ]
+
+
+def merge_language(catalogue, language, path):
+    code = language.get('code')
+    if not code:
+        raise ContentError(f"{path}: every language needs a code")
+    entry = catalogue.setdefault(code, {'name': '', 'flag_emoji': '', 'quizzes': {}})
+    entry['name'] = language.get('name') or entry['name'] or code
+    entry['flag_emoji'] = language.get('flag_emoji') or entry['flag_emoji']
+
+    levels = dict(Quiz.LEVEL_CHOICES)
+    question_types = dict(Question.QUESTION_TYPES)
+    for quiz in language.get('quizzes') or []:
+        level = quiz.get('level')
+        if level not in levels:
+            raise ContentError(f"{path}: {code} has unknown level '{level}'")
+        quiz_entry = entry['quizzes'].setdefault(level, {'title': '', 'description': '', 'questions': {}})
+        quiz_entry['title'] = quiz.get('title') or quiz_entry['title'] or f"{entry['name']} - {levels[level]}"
+        quiz_entry['description'] = quiz.get('description') or quiz_entry['description']
+
+        for question in quiz.get('questions') or []:
+            text = str(question.get('text') or '')
+            key = str(question.get('key') or text)
+            where = f"{path}: {code}/{level} question '{key[:40]}'"
+            if not text:
+                raise ContentError(f"{where}: text is required")
+            if question.get('type') not in question_types:
+                raise ContentError(f"{where}: unknown type '{question.get('type')}'")
+            if key in quiz_entry['questions']:
+                raise ContentError(f"{where}: duplicate key")
+            options = [str(option) for option in question.get('options') or []]
+            if len(set(options)) != len(options):
+                raise ContentError(f"{where}: duplicate options")
+            answer = str(question.get('answer') or '')
+            quiz_entry['questions'][key] = {
+                'text': text,
+                'question_type': question['type'],
+                'correct_answer': answer,
+                'options': [(option, option == answer) for option in options],
+            }
+
+
+class ContentService:
+    @staticmethod
+    def load(catalogue, delete=True, dry_run=False) -> dict:
+        """
+        Make the database match a catalogue from read_catalogue(): create
+        and update languages, quizzes, questions and options, and (with
+        delete) remove the questions and options of the catalogue's quizzes
+        that it no longer has. Languages and quizzes are never deleted.
+        Speech questions whose phrase is new or changed are marked pending
+        for lazy synthesis, or queued with AUDIO_SYNTHESIS='queue'; nothing
+        is synthesized here. Returns counts of what changed.
+        """
+        counts = defaultdict(int)
+        now = timezone.now()
+        # The bulk queries below skip the content signals, and the deletes
+        # would run the cache, quiz-touching and bundle receivers once per
+        # row, so those return early and their work is done once at the end
+        with transaction.atomic(), bulk_content_changes():
+            languages = ContentService._load_languages(catalogue, counts)
+            quizzes = ContentService._load_quizzes(catalogue, languages, counts)
+
+            # Plain rows rather than model instances: building 100k of them
+            # would cost more than all of the queries together
+            stored = defaultdict(dict)
+            unkeyed = defaultdict(dict)
+            for row in Question.objects.filter(quiz_id__in=[quiz.pk for quiz in quizzes.values()]).values(
+                'pk', 'quiz_id', 'key', 'text', 'question_type', 'correct_answer', 'audio_url', 'audio_status'
+            ):
+                if row['key']:
+                    stored[row['quiz_id']][row['key']] = row
+                else:
+                    # Rows from before content files: matched by their text
+                    unkeyed[row['quiz_id']].setdefault(row['text'], row)
+
+            created, changed, deleted, needs_audio = [], [], [], []
+            wanted_options = {}
+            touched = set()
+            for (code, level), quiz in quizzes.items():
+                questions = catalogue[code]['quizzes'][level]['questions']
+                existing = stored[quiz.pk]
+                for key, content in questions.items():
+                    fields = {
+                        'key': key,
+                        'text': content['text'],
+                        'question_type': content['question_type'],
+                        'correct_answer': content['correct_answer'],
+                    }
+                    row = existing.pop(key, None) or unkeyed[quiz.pk].pop(content['text'], None)
+                    if row is None:
+                        row = {'pk': None, 'audio_url': None, 'audio_status': None}
+                    elif (row['question_type'], row['correct_answer']) != (content['question_type'], content['correct_answer']):
+                        # A new phrase needs new audio
+                        fields.update(audio_url=None, audio_status=None)
+                    current = {**row, **fields}
+                    if current['question_type'] == 'speech' and not current['audio_url'] and current['audio_status'] is None:
+                        fields['audio_status'] = current['audio_status'] = Question.AUDIO_PENDING
+                        needs_audio.append((quiz.pk, key))
+
+                    if row['pk'] is None:
+                        created.append(Question(quiz_id=quiz.pk, created_at=now, **fields))
+                        touched.add(quiz.pk)
+                    elif any(row[name] != value for name, value in fields.items()):
+                        changed.append(Question(pk=row['pk'], **{name: current[name] for name in QUESTION_FIELDS}))
+                        touched.add(quiz.pk)
+                    wanted_options[quiz.pk, key] = content['options']
+                if delete:
+                    leftovers = list(existing.values()) + list(unkeyed[quiz.pk].values())
+                    deleted += [row['pk'] for row in leftovers]
+                    if leftovers:
+                        touched.add(quiz.pk)
+
+            if deleted:
+                # Their answers go with them; recount the stats they fed
+                user_ids = set()
+                for batch in batches(deleted):
+                    user_ids.update(UserAnswer.objects.filter(question_id__in=batch).values_list('user_id', flat=True))
+                    Question.objects.filter(pk__in=batch).delete()
+                if user_ids:
+                    UserStatsService.rebuild(list(user_ids))
+            Question.objects.bulk_update(changed, QUESTION_FIELDS, batch_size=BATCH_SIZE)
+            Question.objects.bulk_create(created, batch_size=BATCH_SIZE)
+            counts['questions_created'] = len(created)
+            counts['questions_updated'] = len(changed)
+            counts['questions_deleted'] = len(deleted)
+
+            # Not every backend sets primary keys from bulk_create
+            question_ids = {
+                (quiz_id, key): pk for pk, quiz_id, key in Question.objects.filter(
+                    quiz_id__in=[quiz.pk for quiz in quizzes.values()]
+                ).values_list('pk', 'quiz_id', 'key')
+            }
+            touched.update(ContentService._load_options(wanted_options, question_ids, counts))
+
+            pending = [question_ids[key] for key in needs_audio]
+            if pending and getattr(settings, 'AUDIO_SYNTHESIS', 'lazy') == 'queue':
+                for batch in batches(pending):
+                    AudioJob.objects.filter(question_id__in=batch).update(
+                        status=AudioJob.QUEUED, attempts=0, run_after=now, locked_at=None, last_error=''
+                    )
+                AudioJob.objects.bulk_create(
+                    [AudioJob(question_id=pk, run_after=now) for pk in pending],
+                    batch_size=BATCH_SIZE, ignore_conflicts=True,
+                )
+            counts['audio_queued'] = len(pending)
+
+            # Keep cached payloads, Last-Modified and bundles in step
+            if touched:
+                Quiz.objects.filter(pk__in=touched).update(updated_at=now)
+                schedule_rebuild(quizzes=touched)
+            if touched or counts['languages_created'] or counts['languages_updated']:
+                transaction.on_commit(bump_content_version)
+
+            if dry_run:
+                transaction.set_rollback(True)
+        return dict(counts)
+
+    @staticmethod
+    def _load_languages(catalogue, counts) -> dict:
+        languages = Language.objects.in_bulk(list(catalogue), field_name='code')
+        created, changed = [], []
+        for code, content in catalogue.items():
+            language = languages.get(code)
+            if language is None:
+                created.append(Language(code=code, name=content['name'], flag_emoji=content['flag_emoji']))
+            elif (language.name, language.flag_emoji) != (content['name'], content['flag_emoji']):
+                language.name, language.flag_emoji = content['name'], content['flag_emoji']
+                changed.append(language)
+        Language.objects.bulk_create(created)
+        Language.objects.bulk_update(changed, ['name', 'flag_emoji'])
+        if changed:
+            # Every quiz payload embeds its language
+            Quiz.objects.filter(language__in=changed).update(updated_at=timezone.now())
+            schedule_rebuild(languages=[language.pk for language in changed])
+        counts['languages_created'] = len(created)
+        counts['languages_updated'] = len(changed)
+        return Language.objects.in_bulk(list(catalogue), field_name='code') if created else languages
+
+    @staticmethod
+    def _load_quizzes(catalogue, languages, counts) -> dict:
+        quizzes = {
+            (quiz.language.code, quiz.level): quiz
+            for quiz in Quiz.objects.filter(language__code__in=list(catalogue)).select_related('language')
+        }
+        created, changed = [], []
+        for code, content in catalogue.items():
+            for level, quiz_content in content['quizzes'].items():
+                quiz = quizzes.get((code, level))
+                if quiz is None:
+                    created.append(Quiz(
+                        language=languages[code], level=level,
+                        title=quiz_content['title'], description=quiz_content['description'],
+                    ))
+                elif (quiz.title, quiz.description) != (quiz_content['title'], quiz_content['description']):
+                    quiz.title, quiz.description = quiz_content['title'], quiz_content['description']
+                    # bulk_update doesn't apply auto_now
+                    quiz.updated_at = timezone.now()
+                    changed.append(quiz)
+        Quiz.objects.bulk_create(created)
+        Quiz.objects.bulk_update(changed, ['title', 'description', 'updated_at'])
+        if changed:
+            schedule_rebuild(quizzes=[quiz.pk for quiz in changed])
+        counts['quizzes_created'] = len(created)
+        counts['quizzes_updated'] = len(changed)
+        if created:
+            quizzes = {
+                (quiz.language.code, quiz.level): quiz
+                for quiz in Quiz.objects.filter(language__code__in=list(catalogue)).select_related('language')
+            }
+        # Only the quizzes the catalogue has content for
+        return {
+            (code, level): quizzes[code, level]
+            for code, content in catalogue.items() for level in content['quizzes']
+        }
+
+    @staticmethod
+    def _load_options(wanted_options, question_ids, counts) -> set:
+        """
+        Diff options by text within each question. Returns the ids of the
+        quizzes whose options changed.
+        """
+        stored = defaultdict(dict)
+        for pk, question_id, text, is_correct in QuestionOption.objects.filter(
+            question__quiz_id__in={quiz_id for quiz_id, _ in wanted_options}
+        ).values_list('pk', 'question_id', 'text', 'is_correct'):
+            stored[question_id].setdefault(text, (pk, is_correct))
+
+        created, changed, deleted = [], [], []
+        touched = set()
+        for (quiz_id, key), options in wanted_options.items():
+            question_id = question_ids[quiz_id, key]
+            existing = stored.get(question_id, {})
+            for text, is_correct in options:
+                option = existing.pop(text, None)
+                if option is None:
+                    created.append(QuestionOption(question_id=question_id, text=text, is_correct=is_correct))
+                    touched.add(quiz_id)
+                elif option[1] != is_correct:
+                    changed.append(QuestionOption(pk=option[0], is_correct=is_correct))
+                    touched.add(quiz_id)
+            if existing:
+                deleted += [pk for pk, _ in existing.values()]
+                touched.add(quiz_id)
+
+        for batch in batches(deleted):
+            QuestionOption.objects.filter(pk__in=batch).delete()
+        QuestionOption.objects.bulk_update(changed, ['is_correct'], batch_size=BATCH_SIZE)
+        QuestionOption.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        counts['options_created'] = len(created)
+        counts['options_updated'] = len(changed)
+        counts['options_deleted'] = len(deleted)
+        return touched
@@ -0,0 +1,176 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .leaderboards import LeaderboardService
+from .models import Question, QuestionOption, QuizSubmission, UserAnswer, UserProgress
+from .reviews import ReviewService
+from .stats import UserStatsService
+
+
+class SubmissionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This submission id was already used for a different quiz.'
+    default_code = 'submission_conflict'
+
+
+class GradingService:
+    @staticmethod
+    def grade_answers(quiz, answers):
+        """
+        Validate and grade a list of {'question_id', 'selected_option_id'}
+        answers for a quiz, or for questions of any quiz when quiz is None,
+        without writing anything.
+
+        Questions and options are loaded with one query each, so the cost
+        does not grow with the size of the submission.
+        Returns (unsaved UserAnswer rows without a user, result dict).
+        """
+        question_ids = [answer['question_id'] for answer in answers]
+        if len(set(question_ids)) != len(question_ids):
+            raise ValidationError({'error': 'Each question may only be answered once'})
+
+        questions = Question.objects.filter(id__in=question_ids)
+        if quiz is not None:
+            questions = questions.filter(quiz=quiz)
+        unknown_questions = sorted(set(question_ids) - set(questions.values_list('id', flat=True)))
+        if unknown_questions:
+            raise ValidationError({
+                'error': 'Questions do not belong to this quiz' if quiz is not None else 'Unknown questions',
+                'question_ids': unknown_questions,
+            })
+
+        options = QuestionOption.objects.in_bulk(
+            [answer['selected_option_id'] for answer in answers]
+        )
+        mismatched = [
+            answer['question_id'] for answer in answers
+            if answer['selected_option_id'] not in options
+            or options[answer['selected_option_id']].question_id != answer['question_id']
+        ]
+        if mismatched:
+            raise ValidationError({
+                'error': 'Selected options do not belong to their questions',
+                'question_ids': mismatched,
+            })
+
+        user_answers = [
+            UserAnswer(
+                question_id=answer['question_id'],
+                selected_option=options[answer['selected_option_id']],
+                is_correct=options[answer['selected_option_id']].is_correct,
+            )
+            for answer in answers
+        ]
+        correct_answers = sum(1 for user_answer in user_answers if user_answer.is_correct)
+        total_questions = len(user_answers)
+        score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+
+        return user_answers, {
+            'total_questions': total_questions,
+            'correct_answers': correct_answers,
+            'score_percentage': score_percentage,
+            'completed': True
+        }
+
+    @staticmethod
+    def submit(user, quiz, answers, submission_id=None) -> dict:
+        """
+        Grade and record a submission.
+
+        Concurrent submissions for the same user and quiz are serialized on
+        the UserProgress row, so answers and score always come from the same
+        submission. When a submission_id is given, repeating it returns the
+        stored result instead of grading again. The user's language stats
+        and leaderboard scores are adjusted by the difference to the
+        previous submission in the same transaction, and the answers are
+        logged and their questions rescheduled for review.
+        """
+        if submission_id:
+            replay = GradingService._replay(user, quiz, submission_id)
+            if replay is not None:
+                return replay
+
+        user_answers, result = GradingService.grade_answers(quiz, answers)
+        for user_answer in user_answers:
+            user_answer.user = user
+
+        # Progress normally exists from start(), but submitting without it
+        # must not fail. get_or_create tolerates a concurrent insert.
+        progress, _ = UserProgress.objects.get_or_create(user=user, quiz=quiz)
+
+        with transaction.atomic():
+            # Writing first takes the lock before anything is read: a row
+            # lock on PostgreSQL/MySQL, the database write lock on SQLite.
+            UserProgress.objects.filter(pk=progress.pk).update(last_attempted=timezone.now())
+
+            if submission_id:
+                replay = GradingService._replay(user, quiz, submission_id)
+                if replay is not None:
+                    return replay
+                # Claim the id before writing anything. The same id sent for
+                # another quiz locks a different progress row, so only the
+                # unique constraint keeps the two apart: the loser gets a 409.
+                try:
+                    with transaction.atomic():
+                        QuizSubmission.objects.create(
+                            user=user,
+                            quiz=quiz,
+                            submission_id=submission_id,
+                            result=result,
+                        )
+                except IntegrityError:
+                    replay = GradingService._replay(user, quiz, submission_id)
+                    if replay is None:
+                        raise
+                    return replay
+
+            previous = UserProgress.objects.filter(pk=progress.pk).values('score', 'completed').get()
+            previous_answers = UserAnswer.objects.filter(user=user, question__quiz=quiz).aggregate(
+                given=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+            )
+
+            # Answers to questions left out of this submission are discarded,
+            # the rest are overwritten in place.
+            UserAnswer.objects.filter(
+                user=user,
+                question__quiz=quiz
+            ).exclude(question_id__in=[a.question_id for a in user_answers]).delete()
+
+            UserAnswer.objects.bulk_create(
+                user_answers,
+                update_conflicts=True,
+                unique_fields=['user', 'question'],
+                update_fields=['selected_option', 'is_correct', 'created_at'],
+            )
+
+            UserProgress.objects.filter(pk=progress.pk).update(
+                score=result['score_percentage'],
+                completed=True,
+            )
+            ReviewService.record(user, user_answers)
+            UserStatsService.apply(
+                user.pk, quiz.language_id,
+                active_on=timezone.localdate(),
+                quizzes_completed=0 if previous['completed'] else 1,
+                # score is an IntegerField, so the stored value is truncated
+                score_total=int(result['score_percentage']) - previous['score'],
+                answers_given=len(user_answers) - previous_answers['given'],
+                correct_answers=result['correct_answers'] - previous_answers['correct'],
+            )
+            LeaderboardService.apply(
+                user.pk, quiz.language_id, quiz.level, int(result['score_percentage']) - previous['score']
+            )
+
+        return result
+
+    @staticmethod
+    def _replay(user, quiz, submission_id):
+        submission = QuizSubmission.objects.filter(user=user, submission_id=submission_id).first()
+        if submission is None:
+            return None
+        if submission.quiz_id != quiz.id:
+            raise SubmissionConflict()
+        return submission.result
@@ -0,0 +1,129 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bundles import schedule_rebuild
+from .cache import bump_content_version
+from .models import AudioJob, Question, Quiz
+from .services import TTSService
+
+logger = logging.getLogger(__name__)
+
+
+class AudioJobService:
+    @staticmethod
+    def claim(batch_size: int = 10):
+        """
+        Claim up to batch_size due jobs for this worker.
+
+        Each job is claimed with a conditional update, so several workers can
+        poll the same table without processing a job twice. Jobs left running
+        by a worker that died are put back in the queue first.
+        """
+        now = timezone.now()
+        stale_after = timedelta(seconds=getattr(settings, 'AUDIO_JOB_STALE_SECONDS', 600))
+        AudioJob.objects.filter(
+            status=AudioJob.RUNNING,
+            locked_at__lt=now - stale_after
+        ).update(status=AudioJob.QUEUED, locked_at=None)
+
+        candidates = list(
+            AudioJob.objects.filter(status=AudioJob.QUEUED, run_after__lte=now)
+            .order_by('run_after')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        claimed = [
+            pk for pk in candidates
+            if AudioJob.objects.filter(pk=pk, status=AudioJob.QUEUED).update(
+                status=AudioJob.RUNNING, locked_at=now
+            )
+        ]
+        return list(
+            AudioJob.objects.filter(pk__in=claimed)
+            .select_related('question__quiz__language')
+            .order_by('run_after')
+        )
+
+    @staticmethod
+    def run(job) -> bool:
+        """
+        Generate audio for a claimed job. Returns True on success.
+        """
+        succeeded, _ = AudioJobService.run_batch([job])
+        return succeeded == 1
+
+    @staticmethod
+    def run_batch(jobs, max_workers=None, rate_limit=None):
+        """
+        Generate audio for claimed jobs with bounded concurrency, then write
+        the successful results back in bulk. Failures are retried or given
+        up on individually. Returns (succeeded, failed) counts.
+        """
+        phrases = {
+            job.pk: (job.question.correct_answer, job.question.quiz.language.code)
+            for job in jobs
+        }
+        urls, errors = TTSService.generate_audio_batch(
+            phrases.values(), max_workers=max_workers, rate_limit=rate_limit
+        )
+
+        now = timezone.now()
+        done, questions = [], []
+        for job in jobs:
+            job.attempts += 1
+            if phrases[job.pk] in urls:
+                job.status = AudioJob.DONE
+                job.locked_at = None
+                job.last_error = ''
+                job.updated_at = now
+                job.question.audio_url = urls[phrases[job.pk]]
+                job.question.audio_status = Question.AUDIO_READY
+                done.append(job)
+                questions.append(job.question)
+
+        if done:
+            with transaction.atomic():
+                Question.objects.bulk_update(questions, ['audio_url', 'audio_status'])
+                AudioJob.objects.bulk_update(done, ['status', 'attempts', 'locked_at', 'last_error', 'updated_at'])
+                # bulk_update skips the signals that keep cached payloads
+                # and Last-Modified in step, so do their work once here.
+                quiz_ids = {q.quiz_id for q in questions}
+                Quiz.objects.filter(pk__in=quiz_ids).update(updated_at=now)
+                transaction.on_commit(bump_content_version)
+                schedule_rebuild(quizzes=quiz_ids)
+
+        for job in jobs:
+            if phrases[job.pk] in errors:
+                AudioJobService._fail(job, job.question, errors[phrases[job.pk]])
+
+        return len(done), len(jobs) - len(done)
+
+    @staticmethod
+    def backoff(attempts: int) -> timedelta:
+        """
+        Exponential backoff: base, 2 * base, 4 * base, ... capped at the maximum.
+        """
+        base = getattr(settings, 'AUDIO_JOB_BACKOFF_SECONDS', 30)
+        maximum = getattr(settings, 'AUDIO_JOB_BACKOFF_MAX_SECONDS', 3600)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+    @staticmethod
+    def _fail(job, question, error):
+        job.last_error = str(error)
+        job.locked_at = None
+        with transaction.atomic():
+            if job.attempts >= getattr(settings, 'AUDIO_JOB_MAX_ATTEMPTS', 5):
+                job.status = AudioJob.FAILED
+                question.audio_status = Question.AUDIO_FAILED
+                question.save(update_fields=['audio_status'])
+                logger.error("Giving up on audio for question %s after %s attempts: %s",
+                             question.pk, job.attempts, error)
+            else:
+                job.status = AudioJob.QUEUED
+                job.run_after = timezone.now() + AudioJobService.backoff(job.attempts)
+                logger.warning("Audio for question %s failed (attempt %s), retrying at %s: %s",
+                               question.pk, job.attempts, job.run_after, error)
+            job.save()
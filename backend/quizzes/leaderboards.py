@@ -0,0 +1,194 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+from .models import LeaderboardBucket, LeaderboardEntry, UserProgress
+
+# LeaderboardEntry.level of the board covering every level of a language
+ALL_LEVELS = ''
+
+
+class LeaderboardService:
+    @staticmethod
+    def apply(user_id, language_id, level, delta=0, create=True):
+        """
+        Move a user's score by delta on the board for the quiz's level and on
+        the language's overall board, entering them with a score of delta
+        where they aren't on a board yet (unless create is False). Each
+        entry is locked while its score bucket moves.
+        """
+        with transaction.atomic(savepoint=False):
+            entries = LeaderboardEntry.objects.filter(user_id=user_id, language_id=language_id)
+            stored = {
+                entry.level: entry
+                for entry in entries.select_for_update().filter(level__in=[level, ALL_LEVELS])
+            }
+            for board_level in (level, ALL_LEVELS):
+                entry = stored.get(board_level)
+                if entry is None:
+                    if not create:
+                        continue
+                    try:
+                        with transaction.atomic():
+                            LeaderboardEntry.objects.create(
+                                user_id=user_id, language_id=language_id, level=board_level, score=delta
+                            )
+                    except IntegrityError:
+                        # Entered concurrently; move it like any other entry
+                        entry = entries.select_for_update().get(level=board_level)
+                    else:
+                        LeaderboardService._move(language_id, board_level, None, delta)
+                        continue
+                if delta:
+                    entries.filter(level=board_level).update(score=entry.score + delta)
+                    LeaderboardService._move(language_id, board_level, entry.score, entry.score + delta)
+
+    @staticmethod
+    def _move(language_id, level, old, new):
+        buckets = LeaderboardBucket.objects.filter(language_id=language_id, level=level)
+        # Lowest score first, whichever way the user moves, so two users
+        # moving in opposite directions lock the same buckets in the same
+        # order rather than each waiting on the other's
+        steps = sorted([(new, 1)] if old is None else [(old, -1), (new, 1)])
+        for score, step in steps:
+            if not buckets.filter(score=score).update(count=F('count') + step):
+                # First user with this score: add the bucket, tolerating a
+                # concurrent insert, then count them like any other
+                LeaderboardBucket.objects.bulk_create(
+                    [LeaderboardBucket(language_id=language_id, level=level, score=score)], ignore_conflicts=True
+                )
+                buckets.filter(score=score).update(count=F('count') + step)
+
+    @staticmethod
+    def top(language_id, level=ALL_LEVELS, limit=10) -> list:
+        """
+        The board's highest scores, best first. Equal scores share a rank
+        and later ranks skip accordingly (1, 2, 2, 4).
+        """
+        entries = (
+            LeaderboardEntry.objects.filter(language_id=language_id, level=level)
+            .select_related('user').order_by('-score', 'user_id')[:limit]
+        )
+        rows = []
+        for position, entry in enumerate(entries, start=1):
+            rank = rows[-1]['rank'] if rows and rows[-1]['score'] == entry.score else position
+            rows.append({
+                'rank': rank,
+                'user_id': entry.user_id,
+                'name': display_name(entry.user),
+                'score': entry.score,
+            })
+        return rows
+
+    @staticmethod
+    def rank(user_id, language_id, level=ALL_LEVELS):
+        """
+        A user's {'rank', 'score', 'total'} on a board, or None when they
+        aren't on it. Reads the user's entry and the board's buckets only.
+        """
+        score = LeaderboardEntry.objects.filter(
+            user_id=user_id, language_id=language_id, level=level
+        ).values_list('score', flat=True).first()
+        if score is None:
+            return None
+        counts = LeaderboardBucket.objects.filter(language_id=language_id, level=level).aggregate(
+            above=Sum('count', filter=Q(score__gt=score)),
+            total=Sum('count'),
+        )
+        return {'rank': (counts['above'] or 0) + 1, 'score': score, 'total': counts['total'] or 0}
+
+    @staticmethod
+    def total(language_id, level=ALL_LEVELS) -> int:
+        return LeaderboardBucket.objects.filter(
+            language_id=language_id, level=level
+        ).aggregate(total=Sum('count'))['total'] or 0
+
+    @staticmethod
+    def compute(language_ids=None) -> dict:
+        """
+        Every board score recomputed from UserProgress with one grouped
+        query, keyed by (user_id, language_id, level).
+        """
+        progress = UserProgress.objects.all()
+        if language_ids is not None:
+            progress = progress.filter(quiz__language_id__in=language_ids)
+
+        expected = {}
+        for row in progress.values('user_id', 'quiz__language_id', 'quiz__level').annotate(
+            score=Sum('score')
+        ).order_by():
+            user_id, language_id = row['user_id'], row['quiz__language_id']
+            expected[user_id, language_id, row['quiz__level']] = row['score']
+            overall = (user_id, language_id, ALL_LEVELS)
+            expected[overall] = expected.get(overall, 0) + row['score']
+        return expected
+
+    @staticmethod
+    def rebuild(language_ids=None, dry_run=False):
+        """
+        Compare stored entries and buckets with ones recomputed from
+        UserProgress and, unless dry_run, fix every difference. Returns a
+        list of drift entries: ('entry', (user_id, language_id, level),
+        stored, expected) and ('bucket', (language_id, level, score),
+        stored, expected), with None for a missing row.
+        """
+        expected = LeaderboardService.compute(language_ids)
+        entries = LeaderboardEntry.objects.all()
+        buckets = LeaderboardBucket.objects.all()
+        if language_ids is not None:
+            entries = entries.filter(language_id__in=language_ids)
+            buckets = buckets.filter(language_id__in=language_ids)
+
+        drift, changed, extra = [], [], []
+        seen = set()
+        for entry in entries.only('pk', 'user_id', 'language_id', 'level', 'score').iterator():
+            key = (entry.user_id, entry.language_id, entry.level)
+            seen.add(key)
+            if key not in expected:
+                drift.append(('entry', key, entry.score, None))
+                extra.append(entry.pk)
+            elif entry.score != expected[key]:
+                drift.append(('entry', key, entry.score, expected[key]))
+                entry.score = expected[key]
+                changed.append(entry)
+        missing = []
+        for key, score in expected.items():
+            if key not in seen:
+                drift.append(('entry', key, None, score))
+                missing.append(LeaderboardEntry(user_id=key[0], language_id=key[1], level=key[2], score=score))
+
+        counts = Counter((language_id, level, score) for (_, language_id, level), score in expected.items())
+        stale_buckets, bucket_changes = [], []
+        for bucket in buckets.iterator():
+            key = (bucket.language_id, bucket.level, bucket.score)
+            count = counts.pop(key, 0)
+            if bucket.count != count:
+                drift.append(('bucket', key, bucket.count, count or None))
+                if count:
+                    bucket.count = count
+                    bucket_changes.append(bucket)
+                else:
+                    stale_buckets.append(bucket.pk)
+        new_buckets = []
+        for key, count in counts.items():
+            drift.append(('bucket', key, None, count))
+            new_buckets.append(LeaderboardBucket(language_id=key[0], level=key[1], score=key[2], count=count))
+
+        if not dry_run:
+            with transaction.atomic():
+                LeaderboardEntry.objects.filter(pk__in=extra).delete()
+                LeaderboardEntry.objects.bulk_update(changed, ['score'], batch_size=1000)
+                LeaderboardEntry.objects.bulk_create(missing, batch_size=1000)
+                LeaderboardBucket.objects.filter(pk__in=stale_buckets).delete()
+                LeaderboardBucket.objects.bulk_update(bucket_changes, ['count'], batch_size=1000)
+                LeaderboardBucket.objects.bulk_create(new_buckets, batch_size=1000)
+        return drift
+
+
+def display_name(user) -> str:
+    """
+    The public name on a leaderboard. Usernames are email addresses, so
+    they're never shown.
+    """
+    return f"{user.first_name} {user.last_name[:1]}".strip() or f"Learner {user.pk}"
@@ -0,0 +1,36 @@
+"""
+Cross-process locks held as files.
+
+Audio and bundle files live in directories every worker shares, whatever
+the cache backend, so a file created there with O_CREAT|O_EXCL is a lock
+all of them see. A lock older than its ttl was left by a process that died
+holding it and is taken over.
+"""
+import os
+import time
+
+
+def acquire_lock_file(path, ttl) -> bool:
+    """
+    Create the lock file, or return False if another process holds it.
+    A stale lock is removed, to be taken on the next attempt.
+    """
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def release_lock_file(path) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
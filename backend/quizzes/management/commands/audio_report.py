@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quizzes.models import Question
+from quizzes.services import TTSService
+
+
+class Command(BaseCommand):
+    help = 'Reports audio storage per language and format, and the bytes saved by compact formats'
+
+    def handle(self, *args, **options):
+        default_format = TTSService.default_format()
+        formats = TTSService.audio_formats()
+
+        # Every phrase is stored once per format, so count files by key
+        phrases = {}
+        for name, code, audio_url, text in (
+            Question.objects.filter(question_type='speech')
+            .values_list('quiz__language__name', 'quiz__language__code', 'audio_url', 'correct_answer')
+            .iterator()
+        ):
+            key = (
+                audio_url.split('/')[-1].split('.')[0].split('-')[0] if audio_url
+                else TTSService.audio_key(text, code)
+            )
+            phrases.setdefault(name, set()).add(key)
+
+        self.stdout.write(
+            f"{'language':<12} {'phrases':>8} "
+            + ''.join(f"{audio_format + ' KiB':>12}" for audio_format in formats)
+            + f" {'saved KiB':>10} {'saved':>6}"
+        )
+        total_baseline = total_saved = 0
+        for name, keys in sorted(phrases.items()):
+            sizes = {audio_format: 0 for audio_format in formats}
+            baseline = saved = 0
+            for key in keys:
+                phrase_sizes = {}
+                for audio_format in formats:
+                    path = os.path.join(settings.AUDIO_FILES_DIR, TTSService.variant_filename(key, audio_format))
+                    if os.path.exists(path):
+                        phrase_sizes[audio_format] = os.path.getsize(path)
+                        sizes[audio_format] += phrase_sizes[audio_format]
+                # Saving per phrase: default format versus the smallest variant
+                # a client could be served instead
+                if default_format in phrase_sizes:
+                    baseline += phrase_sizes[default_format]
+                    saved += phrase_sizes[default_format] - min(phrase_sizes.values())
+            total_baseline += baseline
+            total_saved += saved
+            self.stdout.write(
+                f"{name:<12} {len(keys):>8} "
+                + ''.join(f"{sizes[audio_format] / 1024:>12.1f}" for audio_format in formats)
+                + f" {saved / 1024:>10.1f} {self.percent(saved, baseline):>6}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Compact formats save {total_saved / 1024:.1f} KiB of {total_baseline / 1024:.1f} KiB "
+            f"({self.percent(total_saved, total_baseline)}) per full download of every phrase"
+        ))
+
+    @staticmethod
+    def percent(part, whole):
+        return f"{100 * part / whole:.0f}%" if whole else '-'
@@ -0,0 +1,152 @@
+import copy
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.models import Count, Prefetch
+
+from quizzes.grading import GradingService
+from quizzes.models import Question, Quiz
+
+User = get_user_model()
+
+BENCHMARK_USER = 'benchmark-{}@example.invalid'
+
+
+class Command(BaseCommand):
+    help = 'Load-tests the configured database with concurrent quiz reads and submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Fraction of requests that submit a quiz')
+        parser.add_argument('--compare', action='store_true',
+                            help='Run every connection mode for this backend, not just the configured one')
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.annotate(n=Count('questions')).filter(n__gt=0).first()
+        if quiz is None:
+            raise CommandError('No quizzes with questions found; run load_content first')
+        answers = [
+            {'question_id': question.id, 'selected_option_id': question.options.first().id}
+            for question in quiz.questions.all()
+            if question.options.exists()
+        ]
+
+        users = [
+            User.objects.get_or_create(username=BENCHMARK_USER.format(i))[0]
+            for i in range(options['threads'])
+        ]
+        original = copy.deepcopy(connections.settings['default'])
+        modes = self.get_modes(original) if options['compare'] else [('configured', {})]
+        journal_mode = self.journal_mode() if options['compare'] else None
+
+        self.stdout.write(
+            f"{'mode':<40} {'req/s':>8} {'read p50':>9} {'read p95':>9} "
+            f"{'write p50':>10} {'write p95':>10} {'errors':>7}"
+        )
+        try:
+            for name, overrides in modes:
+                connections.close_all()
+                connections.settings['default'] = {**copy.deepcopy(original), **overrides}
+                stats = self.run_mode(quiz, answers, users, options)
+                self.stdout.write(
+                    f"{name:<40} {stats['throughput']:>8.1f} "
+                    f"{stats['read_p50']:>8.1f}ms {stats['read_p95']:>8.1f}ms "
+                    f"{stats['write_p50']:>9.1f}ms {stats['write_p95']:>9.1f}ms {stats['errors']:>7}"
+                )
+        finally:
+            connections.close_all()
+            connections.settings['default'] = original
+            if journal_mode:
+                # journal_mode is stored in the database file; put it back
+                with connections['default'].cursor() as cursor:
+                    cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+            User.objects.filter(username__in=[user.username for user in users]).delete()
+
+    def get_modes(self, settings_dict):
+        per_request = {'CONN_MAX_AGE': 0}
+        persistent = {'CONN_MAX_AGE': 600}
+        if settings_dict['ENGINE'] == 'polyglot_practice.db.sqlite3':
+            # Every mode sets journal_mode itself: it persists in the database
+            # file, so a mode would otherwise inherit the previous one's
+            def pragmas(**values):
+                return {'OPTIONS': {**settings_dict['OPTIONS'], 'pragmas': values}}
+
+            rollback_journal = pragmas(journal_mode='DELETE', synchronous='FULL')
+            wal = pragmas(journal_mode='WAL', synchronous='NORMAL')
+            return [
+                ('rollback journal, connection per request', {**per_request, **rollback_journal}),
+                ('WAL, connection per request', {**per_request, **wal}),
+                ('WAL, persistent connections', {**persistent, **wal}),
+            ]
+        return [
+            ('connection per request', per_request),
+            ('persistent connections', persistent),
+        ]
+
+    @staticmethod
+    def journal_mode():
+        if connections['default'].vendor != 'sqlite':
+            return None
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def run_mode(self, quiz, answers, users, options):
+        reads, writes, errors = [], [], []
+        lock = threading.Lock()
+
+        def worker(user, seed):
+            rng = random.Random(seed)
+            local_reads, local_writes, local_errors = [], [], 0
+            try:
+                for _ in range(options['requests']):
+                    start = time.perf_counter()
+                    try:
+                        if rng.random() < options['write_ratio']:
+                            GradingService.submit(user, quiz, answers)
+                            local_writes.append(time.perf_counter() - start)
+                        else:
+                            list(Quiz.objects.select_related('language').prefetch_related(
+                                Prefetch('questions', queryset=Question.objects.prefetch_related('options'))
+                            ).filter(pk=quiz.pk))
+                            local_reads.append(time.perf_counter() - start)
+                    except Exception:
+                        local_errors += 1
+                    # What request_finished does at the end of every request.
+                    close_old_connections()
+            finally:
+                connections.close_all()
+                with lock:
+                    reads.extend(local_reads)
+                    writes.extend(local_writes)
+                    errors.append(local_errors)
+
+        threads = [threading.Thread(target=worker, args=(user, i)) for i, user in enumerate(users)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            'throughput': (len(reads) + len(writes)) / elapsed,
+            'read_p50': self.percentile(reads, 50),
+            'read_p95': self.percentile(reads, 95),
+            'write_p50': self.percentile(writes, 50),
+            'write_p95': self.percentile(writes, 95),
+            'errors': sum(errors),
+        }
+
+    @staticmethod
+    def percentile(samples, pct):
+        if len(samples) < 2:
+            return samples[0] * 1000 if samples else 0.0
+        return statistics.quantiles(samples, n=100)[pct - 1] * 1000
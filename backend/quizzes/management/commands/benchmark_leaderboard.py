@@ -0,0 +1,116 @@
+import random
+import statistics
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quizzes.leaderboards import ALL_LEVELS, LeaderboardService
+from quizzes.models import Language, LeaderboardBucket, LeaderboardEntry, Quiz
+
+User = get_user_model()
+
+BENCHMARK_USER = 'leaderboard-benchmark-{}@example.invalid'
+BENCHMARK_LANGUAGE = 'zz-bench'
+
+
+class Command(BaseCommand):
+    help = 'Times leaderboard rank lookups against COUNT(*) on a synthetic board of many users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--lookups', type=int, default=200, help='Rank lookups per method')
+        parser.add_argument('--updates', type=int, default=200, help='Score changes to apply')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if Language.objects.filter(code=BENCHMARK_LANGUAGE).exists():
+            raise CommandError(f"Language '{BENCHMARK_LANGUAGE}' exists; a previous run didn't clean up")
+        rng = random.Random(options['seed'])
+        levels = [level for level, _ in Quiz.LEVEL_CHOICES]
+
+        language = Language.objects.create(name='Leaderboard benchmark', code=BENCHMARK_LANGUAGE, flag_emoji='')
+        try:
+            start = time.perf_counter()
+            user_ids = self.populate(language, levels, rng, options)
+            self.stdout.write(f"Loaded {len(user_ids)} users in {time.perf_counter() - start:.1f}s")
+
+            sample = rng.sample(user_ids, min(options['lookups'], len(user_ids)))
+            self.report('rank from buckets', [
+                self.timed(LeaderboardService.rank, user_id, language.pk) for user_id in sample
+            ])
+            self.report('rank by COUNT(*)', [self.timed(self.count_rank, user_id, language.pk) for user_id in sample])
+            self.report('top 10', [
+                self.timed(LeaderboardService.top, language.pk, ALL_LEVELS, 10) for _ in range(options['lookups'])
+            ])
+
+            updates = []
+            for user_id in rng.sample(user_ids, min(options['updates'], len(user_ids))):
+                delta = rng.randint(-20, 20)
+                updates.append(self.timed(LeaderboardService.apply, user_id, language.pk, rng.choice(levels), delta))
+            self.report('score change', updates)
+
+            for user_id in sample[:20]:
+                if LeaderboardService.rank(user_id, language.pk)['rank'] != self.count_rank(user_id, language.pk):
+                    raise CommandError(f"Bucket rank of user {user_id} disagrees with COUNT(*)")
+            self.stdout.write(self.style.SUCCESS('Bucket ranks match COUNT(*)'))
+        finally:
+            self.stdout.write('Cleaning up...')
+            language.delete()
+            users = User.objects.filter(username__startswith=BENCHMARK_USER.split('{}')[0])
+            pks = list(users.values_list('pk', flat=True))
+            for i in range(0, len(pks), options['batch_size']):
+                User.objects.filter(pk__in=pks[i:i + options['batch_size']]).delete()
+
+    def populate(self, language, levels, rng, options):
+        counts = Counter()
+        user_ids = []
+        for first in range(0, options['users'], options['batch_size']):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=BENCHMARK_USER.format(i), password='!')
+                    for i in range(first, min(first + options['batch_size'], options['users']))
+                ])
+                # bulk_create only sets primary keys on some backends
+                ids = list(User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list('pk', flat=True))
+                entries = []
+                for user_id in ids:
+                    scores = {level: rng.randint(0, 100) for level in levels}
+                    scores[ALL_LEVELS] = sum(scores.values())
+                    for level, score in scores.items():
+                        entries.append(LeaderboardEntry(user_id=user_id, language=language, level=level, score=score))
+                        counts[level, score] += 1
+                LeaderboardEntry.objects.bulk_create(entries)
+            user_ids.extend(ids)
+        LeaderboardBucket.objects.bulk_create([
+            LeaderboardBucket(language=language, level=level, score=score, count=count)
+            for (level, score), count in counts.items()
+        ])
+        return user_ids
+
+    @staticmethod
+    def count_rank(user_id, language_id):
+        # What a rank costs without the buckets: a count over every user ahead
+        score = LeaderboardEntry.objects.get(user_id=user_id, language_id=language_id, level=ALL_LEVELS).score
+        return LeaderboardEntry.objects.filter(
+            language_id=language_id, level=ALL_LEVELS, score__gt=score
+        ).count() + 1
+
+    @staticmethod
+    def timed(func, *args):
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start
+
+    def report(self, name, samples):
+        if len(samples) < 2:
+            p50 = p95 = samples[0] * 1000 if samples else 0.0
+        else:
+            quantiles = statistics.quantiles(samples, n=100)
+            p50, p95 = quantiles[49] * 1000, quantiles[94] * 1000
+        self.stdout.write(f"{name:<20} p50 {p50:>8.2f}ms  p95 {p95:>8.2f}ms")
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from quizzes.services import TTSService
+from quizzes.tts import get_engine
+
+
+class Command(BaseCommand):
+    help = 'Compares serial and batched TTS synthesis against the stub engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500],
+                            help='Number of distinct phrases per run')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Simulated seconds per engine call')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--duplicates', type=float, default=0.2,
+                            help='Fraction of extra items that repeat an earlier phrase')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'phrases':>8} {'items':>6} {'workers':>8} {'seconds':>8} {'items/s':>8} {'engine calls':>13}"
+        )
+        for size in options['sizes']:
+            items = [(f"Phrase number {i}", 'es') for i in range(size)]
+            items += items[:int(size * options['duplicates'])]
+            for workers in options['concurrency']:
+                elapsed, calls = self.run(items, workers, options['latency'])
+                self.stdout.write(
+                    f"{size:>8} {len(items):>6} {workers:>8} {elapsed:>8.2f} "
+                    f"{len(items) / elapsed:>8.1f} {calls:>13}"
+                )
+
+    def run(self, items, workers, latency):
+        audio_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                TTS_ENGINE='stub',
+                TTS_ENGINE_OPTIONS={'latency': latency},
+                AUDIO_FILES_DIR=audio_dir,
+            ):
+                start = time.perf_counter()
+                urls, errors = TTSService.generate_audio_batch(items, max_workers=workers, rate_limit=0)
+                elapsed = time.perf_counter() - start
+                calls = get_engine().stats()['calls']
+        finally:
+            shutil.rmtree(audio_dir, ignore_errors=True)
+        if errors:
+            self.stderr.write(f"{len(errors)} items failed")
+        return elapsed, calls
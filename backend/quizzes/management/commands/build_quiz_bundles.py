@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.bundles import QuizBundleService, brotli
+
+
+class Command(BaseCommand):
+    help = 'Renders every language/level quiz list to compressed static JSON bundles with a manifest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', help='Only rebuild this language code')
+        parser.add_argument('--level', help='Only rebuild this level (with --language)')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Delete superseded bundle files older than this many seconds; '
+                                 'clients may still hold the previous manifest')
+        parser.add_argument('--no-prune', action='store_true')
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; writing gzip bundles only'))
+
+        pairs = None
+        if options['language']:
+            pairs = [(options['language'], options['level'])]
+        results = QuizBundleService.build(pairs)
+
+        self.stdout.write(f"{'bundle':<24} {'json KiB':>9} {'gzip KiB':>9} {'br KiB':>9} {'status':>10}")
+        for key, entry, written in results:
+            if entry is None:
+                self.stdout.write(f"{key:<24} {'':>9} {'':>9} {'':>9} {'removed':>10}")
+                continue
+            sizes = [entry['bytes'].get(encoding) for encoding in ('identity', 'gzip', 'br')]
+            self.stdout.write(
+                f"{key:<24} "
+                + ' '.join(f"{size / 1024:>9.1f}" if size is not None else f"{'-':>9}" for size in sizes)
+                + f" {'written' if written else 'unchanged':>10}"
+            )
+
+        if not options['no_prune']:
+            removed, freed = QuizBundleService.prune(min_age=options['min_age'])
+            if removed:
+                self.stdout.write(f"Pruned {removed} superseded files ({freed / 1024:.1f} KiB)")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} quiz bundles up to date"))
@@ -0,0 +1,51 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.transfer import CHUNK_SIZE, COLUMNS, FORMATS, TransferError, export_rows, parse_when, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Streams user progress or answers to NDJSON or CSV, a chunk at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(COLUMNS))
+        parser.add_argument('--output', '-o', default='-', help='File to write (default: standard output)')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Default: from the output file extension, else ndjson')
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help='Only these users (repeatable)')
+        parser.add_argument('--language', metavar='CODE', help='Only this language')
+        parser.add_argument('--since', help='From this date or datetime (by last attempt for progress)')
+        parser.add_argument('--until', help='Up to this date (inclusive) or datetime')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        format = options['format'] or ('csv' if output.endswith('.csv') else 'ndjson')
+        try:
+            since = options['since'] and parse_when(options['since'])
+            until = options['until'] and parse_when(options['until'], end=True)
+        except TransferError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        rows = export_rows(
+            options['table'], usernames=options['usernames'], language=options['language'],
+            since=since, until=until, chunk_size=options['chunk_size'],
+        )
+        if output == '-':
+            count = write_rows(options['table'], rows, self.stdout, format)
+            report = self.stderr
+        else:
+            # Written beside the target and renamed, so a failed export
+            # never leaves a truncated file behind
+            partial = f"{output}.partial"
+            with open(partial, 'w', encoding='utf-8', newline='') as f:
+                count = write_rows(options['table'], rows, f, format)
+            os.replace(partial, output)
+            report = self.stdout
+        report.write(self.style.SUCCESS(
+            f"Exported {count} {options['table']} rows in {time.perf_counter() - start:.1f}s"
+        ))
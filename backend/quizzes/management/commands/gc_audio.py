@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quizzes.models import Question
+from quizzes.services import TTSService
+
+
+class Command(BaseCommand):
+    help = 'Deletes audio files under AUDIO_FILES_DIR that no question references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List orphaned files without deleting them')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Only delete files older than this many seconds, '
+                                 'so audio being written for a new question is left alone')
+
+    def handle(self, *args, **options):
+        audio_dir = settings.AUDIO_FILES_DIR
+        if not os.path.isdir(audio_dir):
+            self.stdout.write('No audio directory, nothing to do')
+            return
+
+        # Files are named {key}.{format} or {key}-{encoding}.{format}; every
+        # format of a referenced phrase is kept, including variants
+        # synthesized on demand for questions whose default-format
+        # audio_url isn't set yet.
+        referenced = {
+            url.split('/')[-1].split('.')[0].split('-')[0]
+            for url in Question.objects.exclude(audio_url__isnull=True)
+            .values_list('audio_url', flat=True).iterator()
+        }
+        referenced.update(
+            TTSService.audio_key(text, code)
+            for text, code in Question.objects.filter(question_type='speech')
+            .values_list('correct_answer', 'quiz__language__code').iterator()
+        )
+        cutoff = time.time() - options['min_age']
+
+        removed = freed = 0
+        with os.scandir(audio_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.split('.')[0].split('-')[0] in referenced:
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > cutoff:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f"Would delete {entry.name}")
+                else:
+                    os.remove(entry.path)
+                removed += 1
+                freed += stat.st_size
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} orphaned audio files ({freed / 1024:.1f} KiB)"
+        ))
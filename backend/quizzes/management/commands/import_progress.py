@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from quizzes.leaderboards import LeaderboardService
+from quizzes.transfer import CHUNK_SIZE, COLUMNS, FORMATS, TransferError, TransferService, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Upserts user progress or answers from NDJSON or CSV in batches, resumably'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(COLUMNS))
+        parser.add_argument('path', help="File to read, or '-' for standard input")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Default: from the file extension, else ndjson')
+        parser.add_argument('--batch-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the rows an interrupted import of this file already committed")
+
+    def handle(self, *args, **options):
+        path, table = options['path'], options['table']
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        # Rows committed so far and the languages whose leaderboards they
+        # changed, saved after every batch
+        checkpoint = None if path == '-' else f"{path}.checkpoint"
+        done, language_ids = 0, set()
+        if options['resume']:
+            if checkpoint is None or not os.path.exists(checkpoint):
+                raise CommandError('Nothing to resume: no checkpoint for this file')
+            with open(checkpoint, encoding='utf-8') as f:
+                state = json.load(f)
+            done, language_ids = state['rows'], set(state['language_ids'])
+            self.stdout.write(f"Resuming after row {done}")
+
+        start = time.perf_counter()
+        imported = skipped = 0
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            rows = islice(read_rows(table, stream, format), done, None)
+            while batch := list(islice(rows, options['batch_size'])):
+                result = TransferService.import_rows(table, batch)
+                done += len(batch)
+                imported += result['imported']
+                skipped += result['skipped']
+                language_ids |= result['language_ids']
+                # With DEBUG every query is kept; don't let them pile up
+                reset_queries()
+                if checkpoint:
+                    self.save_checkpoint(checkpoint, done, language_ids)
+                self.stdout.write(f"{done} rows", ending='\r')
+        except TransferError as e:
+            raise CommandError(f"{path}: {e} (rerun with --resume to continue after row {done})")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if language_ids:
+            # Rankings are rebuilt once at the end rather than per batch
+            LeaderboardService.rebuild(sorted(language_ids))
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} {table} rows, skipped {skipped} naming unknown users, quizzes or questions "
+            f"({time.perf_counter() - start:.1f}s)"
+        ))
+
+    @staticmethod
+    def save_checkpoint(checkpoint, rows, language_ids):
+        partial = f"{checkpoint}.partial"
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'language_ids': sorted(language_ids)}, f)
+        os.replace(partial, checkpoint)
@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.content import ContentError, ContentService, read_catalogue
+
+BUNDLED_CONTENT = os.path.join(os.path.dirname(__file__), '..', '..', 'content')
+
+
+class Command(BaseCommand):
+    help = 'Loads quiz content from JSON, YAML or CSV files, applying only what changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=[BUNDLED_CONTENT],
+                            help='Content files or directories (default: the bundled catalogue)')
+        parser.add_argument('--keep', action='store_true',
+                            help="Don't delete questions and options missing from the files")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change and roll it back')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            catalogue = read_catalogue(options['paths'])
+        except ContentError as e:
+            raise CommandError(str(e))
+        questions = sum(
+            len(quiz['questions']) for language in catalogue.values() for quiz in language['quizzes'].values()
+        )
+        self.stdout.write(f"Read {questions} questions in {len(catalogue)} languages")
+
+        counts = ContentService.load(catalogue, delete=not options['keep'], dry_run=options['dry_run'])
+        for kind in ('languages', 'quizzes', 'questions', 'options'):
+            self.stdout.write(
+                f"{kind:<10} {counts.get(f'{kind}_created', 0):>7} created "
+                f"{counts.get(f'{kind}_updated', 0):>7} updated {counts.get(f'{kind}_deleted', 0):>7} deleted"
+            )
+        self.stdout.write(f"Audio pending for {counts['audio_queued']} speech questions")
+
+        elapsed = time.perf_counter() - start
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run; nothing was saved ({elapsed:.1f}s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Content loaded in {elapsed:.1f}s"))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from quizzes.jobs import AudioJobService
+
+
+class Command(BaseCommand):
+    help = 'Runs the worker that generates TTS audio for queued speech questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process the jobs that are currently due and exit')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Parallel TTS calls (default: settings.TTS_BATCH_CONCURRENCY)')
+        parser.add_argument('--rate-limit', type=float, default=None,
+                            help='Max TTS calls per second (default: settings.TTS_RATE_LIMIT)')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        succeeded = failed = 0
+        try:
+            while True:
+                jobs = AudioJobService.claim(batch_size=options['batch_size'])
+                if jobs:
+                    batch_succeeded, batch_failed = AudioJobService.run_batch(
+                        jobs,
+                        max_workers=options['concurrency'],
+                        rate_limit=options['rate_limit']
+                    )
+                    succeeded += batch_succeeded
+                    failed += batch_failed
+                # Long-running worker: drop broken or expired connections
+                # between batches, as request_finished does for web requests.
+                if not connection.in_atomic_block:
+                    close_old_connections()
+
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Audio jobs processed: {succeeded} succeeded, {failed} failed"
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.leaderboards import LeaderboardService
+from quizzes.models import Language
+
+
+class Command(BaseCommand):
+    help = 'Recomputes leaderboard scores and rank buckets from progress, reporting any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift; exit with an error if there is any')
+        parser.add_argument('--language', action='append', dest='languages', metavar='CODE',
+                            help='Limit to these languages (repeatable)')
+        parser.add_argument('--show', type=int, default=20,
+                            help='How many drifted rows to list')
+
+    def handle(self, *args, **options):
+        language_ids = None
+        if options['languages']:
+            language_ids = list(Language.objects.filter(code__in=options['languages']).values_list('pk', flat=True))
+            if len(language_ids) != len(set(options['languages'])):
+                raise CommandError('Unknown language code in --language')
+
+        drift = LeaderboardService.rebuild(language_ids, dry_run=options['check'])
+        for kind, key, stored, expected in drift[:options['show']]:
+            self.stdout.write(f"{kind} {key}: {stored} -> {expected}")
+        if len(drift) > options['show']:
+            self.stdout.write(f"... and {len(drift) - options['show']} more")
+
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} drifted leaderboard rows")
+            self.stdout.write(self.style.SUCCESS('Leaderboards match progress'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} leaderboard rows"))
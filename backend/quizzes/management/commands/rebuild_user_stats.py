@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.stats import UserStatsService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recomputes per-user language statistics from progress and answers, reporting any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift; exit with an error if there is any')
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help='Limit to these users (repeatable)')
+        parser.add_argument('--show', type=int, default=20,
+                            help='How many drifted values to list')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Unknown username in --user')
+
+        drift = UserStatsService.rebuild(user_ids, dry_run=options['check'])
+        for user_id, language_id, field, stored, expected in drift[:options['show']]:
+            self.stdout.write(f"user {user_id} language {language_id} {field}: {stored} -> {expected}")
+        if len(drift) > options['show']:
+            self.stdout.write(f"... and {len(drift) - options['show']} more")
+
+        rows = len({(user_id, language_id) for user_id, language_id, *_ in drift})
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} drifted values in {rows} stats rows")
+            self.stdout.write(self.style.SUCCESS('User statistics match progress and answers'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} values in {rows} stats rows"))
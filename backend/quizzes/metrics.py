@@ -0,0 +1,80 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Under a multi-process server (gunicorn, uWSGI, several ASGI workers) set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers
+before they start: each worker then writes its samples to files there,
+and /metrics adds them up across workers, whichever one serves the
+scrape. Clear the directory when the server restarts, and have the
+server call prometheus_client.multiprocess.mark_process_dead(pid) when a
+worker exits (gunicorn's child_exit hook).
+
+Only counters and histograms are used, since they are the types that
+aggregate across processes without extra configuration.
+"""
+import os
+import secrets
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+QUIZ_SUBMISSIONS = Counter(
+    'quiz_submissions_total', 'Graded quiz submissions', ['language', 'level'],
+)
+QUIZ_GRADING_SECONDS = Histogram(
+    'quiz_grading_seconds', 'Time to grade and record a submission', ['language', 'level'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+QUIZ_ANSWERS_PER_SUBMISSION = Histogram(
+    'quiz_answers_per_submission', 'Answers in a graded submission',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+AUTH_SECONDS = Histogram(
+    'auth_request_seconds', 'Login and signup latency', ['endpoint', 'outcome'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+JWT_ISSUED = Counter(
+    'jwt_tokens_issued_total', 'JWT access tokens issued', ['endpoint'],
+)
+
+TTS_SYNTHESIS = Counter(
+    'tts_synthesis_total', 'TTS engine calls', ['engine', 'outcome'],
+)
+TTS_SYNTHESIS_SECONDS = Histogram(
+    'tts_synthesis_seconds', 'TTS engine call latency', ['engine'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+TTS_CACHE = Counter(
+    'tts_cache_lookups_total', 'On-demand audio lookups, by whether the file already existed', ['result'],
+)
+AUDIO_BYTES_SERVED = Counter(
+    'audio_bytes_served_total', 'Audio bytes in responses (file size when offloaded to the front-end server)',
+    ['format'],
+)
+
+
+def observe_submission(quiz, answers, seconds) -> None:
+    language = quiz.language.code
+    QUIZ_SUBMISSIONS.labels(language, quiz.level).inc()
+    QUIZ_GRADING_SECONDS.labels(language, quiz.level).observe(seconds)
+    QUIZ_ANSWERS_PER_SUBMISSION.observe(answers)
+
+
+def metrics_view(request):
+    """
+    The metrics in Prometheus' text format. With settings.METRICS_TOKEN
+    set, scrapes must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.20 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_quizsubmission'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='language',
+            name='code',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['level', 'language'], name='quiz_level_language_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', '-last_attempted'], name='progress_user_recent_idx'),
+        ),
+    ]
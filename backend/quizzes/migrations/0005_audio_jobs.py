@@ -0,0 +1,48 @@
+# Generated by Django 4.2.20 on 2026-10-18 05:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def set_audio_status(apps, schema_editor):
+    Question = apps.get_model('quizzes', 'Question')
+    AudioJob = apps.get_model('quizzes', 'AudioJob')
+    speech = Question.objects.filter(question_type='speech')
+    speech.exclude(audio_url__isnull=True).exclude(audio_url='').update(audio_status='ready')
+    missing = speech.filter(models.Q(audio_url__isnull=True) | models.Q(audio_url=''))
+    missing.update(audio_status='pending')
+    AudioJob.objects.bulk_create([AudioJob(question_id=pk) for pk in missing.values_list('pk', flat=True)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='audio_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='AudioJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='audio_job', to='quizzes.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='audiojob_status_run_after_idx')],
+            },
+        ),
+        migrations.RunPython(set_audio_status, migrations.RunPython.noop),
+    ]
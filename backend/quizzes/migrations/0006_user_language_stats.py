@@ -0,0 +1,73 @@
+# Generated by Django 4.2.20 on 2026-10-18 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    UserProgress = apps.get_model('quizzes', 'UserProgress')
+    UserAnswer = apps.get_model('quizzes', 'UserAnswer')
+    UserLanguageStats = apps.get_model('quizzes', 'UserLanguageStats')
+
+    rows = {}
+    for row in UserProgress.objects.values('user_id', 'quiz__language_id').annotate(
+        attempted=models.Count('id'),
+        completed=models.Count('id', filter=models.Q(completed=True)),
+        score_total=models.Sum('score'),
+        last_attempted=models.Max('last_attempted'),
+    ).order_by():
+        rows[row['user_id'], row['quiz__language_id']] = UserLanguageStats(
+            user_id=row['user_id'],
+            language_id=row['quiz__language_id'],
+            quizzes_attempted=row['attempted'],
+            quizzes_completed=row['completed'],
+            score_total=row['score_total'] or 0,
+            # Streak history isn't recorded anywhere; start from the last attempt
+            current_streak=1,
+            longest_streak=1,
+            last_active_date=row['last_attempted'].date(),
+        )
+    for row in UserAnswer.objects.values('user_id', 'question__quiz__language_id').annotate(
+        given=models.Count('id'),
+        correct=models.Count('id', filter=models.Q(is_correct=True)),
+    ).order_by():
+        stats = rows.setdefault(
+            (row['user_id'], row['question__quiz__language_id']),
+            UserLanguageStats(user_id=row['user_id'], language_id=row['question__quiz__language_id']),
+        )
+        stats.answers_given = row['given']
+        stats.correct_answers = row['correct']
+    UserLanguageStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0005_audio_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLanguageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quizzes_attempted', models.IntegerField(default=0)),
+                ('quizzes_completed', models.IntegerField(default=0)),
+                ('score_total', models.IntegerField(default=0)),
+                ('answers_given', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('last_active_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.language')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='language_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'language')},
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.20 on 2026-10-18 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_leaderboards(apps, schema_editor):
+    UserProgress = apps.get_model('quizzes', 'UserProgress')
+    LeaderboardEntry = apps.get_model('quizzes', 'LeaderboardEntry')
+    LeaderboardBucket = apps.get_model('quizzes', 'LeaderboardBucket')
+
+    # One board per language and level, and one per language ('')
+    scores = {}
+    for row in UserProgress.objects.values('user_id', 'quiz__language_id', 'quiz__level').annotate(
+        score=models.Sum('score')
+    ).order_by():
+        user_id, language_id = row['user_id'], row['quiz__language_id']
+        scores[user_id, language_id, row['quiz__level']] = row['score']
+        scores[user_id, language_id, ''] = scores.get((user_id, language_id, ''), 0) + row['score']
+
+    counts = {}
+    for (_, language_id, level), score in scores.items():
+        counts[language_id, level, score] = counts.get((language_id, level, score), 0) + 1
+    LeaderboardEntry.objects.bulk_create(
+        [LeaderboardEntry(user_id=key[0], language_id=key[1], level=key[2], score=score)
+         for key, score in scores.items()],
+        batch_size=1000,
+    )
+    LeaderboardBucket.objects.bulk_create(
+        [LeaderboardBucket(language_id=key[0], level=key[1], score=key[2], count=count)
+         for key, count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0006_user_language_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(blank=True, max_length=20)),
+                ('score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.language')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['language', 'level', '-score', 'user'], name='leaderboard_top_idx')],
+                'unique_together': {('user', 'language', 'level')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(blank=True, max_length=20)),
+                ('score', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.language')),
+            ],
+            options={
+                'unique_together': {('language', 'level', 'score')},
+            },
+        ),
+        migrations.RunPython(populate_leaderboards, migrations.RunPython.noop),
+    ]
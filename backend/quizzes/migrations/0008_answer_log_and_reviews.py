@@ -0,0 +1,83 @@
+# Generated by Django 4.2.20 on 2026-10-18 06:20
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def populate_reviews(apps, schema_editor):
+    UserAnswer = apps.get_model('quizzes', 'UserAnswer')
+    AnswerLog = apps.get_model('quizzes', 'AnswerLog')
+    ReviewSchedule = apps.get_model('quizzes', 'ReviewSchedule')
+
+    # Only the latest answer per question survives; start the log and the
+    # schedule from it, as a first SM-2 step (see quizzes.reviews)
+    logs, schedules = [], []
+    for answer in UserAnswer.objects.iterator():
+        logs.append(AnswerLog(
+            user_id=answer.user_id,
+            question_id=answer.question_id,
+            selected_option_id=answer.selected_option_id,
+            is_correct=answer.is_correct,
+            created_at=answer.created_at,
+        ))
+        schedules.append(ReviewSchedule(
+            user_id=answer.user_id,
+            question_id=answer.question_id,
+            ease=2.6 if answer.is_correct else 2.18,
+            interval_days=1,
+            repetitions=1 if answer.is_correct else 0,
+            lapses=0 if answer.is_correct else 1,
+            due_at=answer.created_at + timedelta(days=1),
+            last_reviewed_at=answer.created_at,
+        ))
+    AnswerLog.objects.bulk_create(logs, batch_size=1000)
+    ReviewSchedule.objects.bulk_create(schedules, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0007_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease', models.FloatField(default=2.5)),
+                ('interval_days', models.IntegerField(default=0)),
+                ('repetitions', models.IntegerField(default=0)),
+                ('lapses', models.IntegerField(default=0)),
+                ('due_at', models.DateTimeField()),
+                ('last_reviewed_at', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_schedule', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_at'], name='review_user_due_idx')],
+                'unique_together': {('user', 'question')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AnswerLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField(default=False)),
+                ('source', models.CharField(choices=[('quiz', 'Quiz'), ('review', 'Review')], default='quiz', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizzes.question')),
+                ('selected_option', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='quizzes.questionoption')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_log', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'question', '-created_at'], name='answer_log_history_idx')],
+            },
+        ),
+        migrations.RunPython(populate_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_answer_log_and_reviews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='key',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddConstraint(
+            model_name='question',
+            constraint=models.UniqueConstraint(condition=models.Q(('key', ''), _negated=True), fields=('quiz', 'key'), name='question_quiz_key_uniq'),
+        ),
+    ]
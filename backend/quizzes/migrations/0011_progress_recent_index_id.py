@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0010_user_answer_created_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userprogress',
+            name='progress_user_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', '-last_attempted', '-id'], name='progress_user_recent_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
@@ -8,7 +9,7 @@ User = get_user_model()
 
 class Language(models.Model):
     name = models.CharField(max_length=50)
-    code = models.CharField(max_length=10)  # For language codes like 'es', 'fr', etc.
+    code = models.CharField(max_length=10, unique=True)  # For language codes like 'es', 'fr', etc.
     flag_emoji = models.CharField(max_length=10)  # For storing flag emojis
 
     def __str__(self):
@@ -30,6 +31,10 @@ class Quiz(models.Model):
 
     class Meta:
         unique_together = ['language', 'level']
+        indexes = [
+            # ?level= without ?language= can't use the unique index above
+            models.Index(fields=['level', 'language'], name='quiz_level_language_idx'),
+        ]
 
     def __str__(self):
         return f"{self.language.name} - {self.level}"
@@ -40,31 +45,119 @@ class Question(models.Model):
         ('speech', 'Speech Practice'),
         ('translation', 'Translation'),
     ]
+    AUDIO_PENDING = 'pending'
+    AUDIO_READY = 'ready'
+    AUDIO_FAILED = 'failed'
+    AUDIO_STATUS_CHOICES = [
+        (AUDIO_PENDING, 'Pending'),
+        (AUDIO_READY, 'Ready'),
+        (AUDIO_FAILED, 'Failed'),
+    ]
 
     quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE)
     text = models.CharField(max_length=500, default='')
+    # Identifies the question in content files (see quizzes.content), so
+    # edits to its text update it in place instead of replacing it
+    key = models.CharField(max_length=500, blank=True, default='')
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPES)
     correct_answer = models.CharField(max_length=500)
     audio_url = models.URLField(null=True, blank=True)  # For storing TTS audio URLs
+    audio_status = models.CharField(max_length=10, choices=AUDIO_STATUS_CHOICES, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['quiz', 'key'], condition=~models.Q(key=''), name='question_quiz_key_uniq'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.quiz.language.name} - {self.quiz.level} - {self.text[:30]}"
     
     def save(self, *args, **kwargs):
-        # Generate audio for speech practice questions
-        if self.question_type == 'speech' and not self.audio_url:
-            self.audio_url = TTSService.generate_audio(
-                text=self.correct_answer,
-                language_code=self.quiz.language.code
-            )
+        # Speech questions without audio are marked pending. In 'lazy' mode
+        # the audio is synthesized the first time it is requested (see
+        # quizzes.audio.question_audio); in 'queue' mode a job is queued for
+        # the process_audio_jobs worker. Neither calls TTS in this request.
+        # Failed questions are only retried on request (see AudioJob.enqueue).
+        needs_audio = (
+            self.question_type == 'speech'
+            and not self.audio_url
+            and self.audio_status not in (self.AUDIO_PENDING, self.AUDIO_FAILED)
+        )
+        if needs_audio:
+            self.audio_status = self.AUDIO_PENDING
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'audio_status'}
         super().save(*args, **kwargs)
+        if needs_audio and getattr(settings, 'AUDIO_SYNTHESIS', 'lazy') == 'queue':
+            AudioJob.enqueue(self)
     
     def delete(self, *args, **kwargs):
-        # Delete associated audio file
-        TTSService.delete_audio(self.audio_url)
+        # Audio files are shared by every question with the same phrase;
+        # only delete the file when this is its last reference.
+        # Bulk deletes skip this, and gc_audio cleans up what they leave.
+        if self.audio_url and not Question.objects.filter(
+            audio_url=self.audio_url
+        ).exclude(pk=self.pk).exists():
+            TTSService.delete_audio(self.audio_url)
         super().delete(*args, **kwargs)
 
+class AudioJob(models.Model):
+    """
+    Database-backed queue entry for generating a question's TTS audio.
+    Processed by the process_audio_jobs management command.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    question = models.OneToOneField(Question, related_name='audio_job', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='audiojob_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"Audio for question {self.question_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, question):
+        """
+        Queue (or re-queue) audio generation for a question, resetting retries.
+        """
+        job, _ = cls.objects.update_or_create(
+            question=question,
+            defaults={
+                'status': cls.QUEUED,
+                'attempts': 0,
+                'run_after': timezone.now(),
+                'locked_at': None,
+                'last_error': '',
+            }
+        )
+        if question.audio_status != Question.AUDIO_PENDING:
+            question.audio_status = Question.AUDIO_PENDING
+            question.save(update_fields=['audio_status'])
+        return job
+
 class QuestionOption(models.Model):
     question = models.ForeignKey(Question, related_name='options', on_delete=models.CASCADE)
     text = models.CharField(max_length=500)
@@ -83,19 +176,170 @@ class UserProgress(models.Model):
 
     class Meta:
         unique_together = ['user', 'quiz']
+        indexes = [
+            models.Index(fields=['user', '-last_attempted', '-id'], name='progress_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.quiz} - Score: {self.score}"
 
+class UserLanguageStats(models.Model):
+    """
+    Running totals of a user's progress in one language, kept up to date by
+    UserStatsService as progress is created and quizzes are submitted, so
+    dashboards read one row per language instead of the user's history.
+    rebuild_user_stats recomputes the counters from UserProgress and
+    UserAnswer and reports drift.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='language_stats')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+    quizzes_attempted = models.IntegerField(default=0)
+    quizzes_completed = models.IntegerField(default=0)
+    score_total = models.IntegerField(default=0)
+    answers_given = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    # Consecutive days with a submission in this language
+    current_streak = models.IntegerField(default=0)
+    longest_streak = models.IntegerField(default=0)
+    last_active_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTERS = ['quizzes_attempted', 'quizzes_completed', 'score_total', 'answers_given', 'correct_answers']
+
+    class Meta:
+        unique_together = ['user', 'language']
+
+    @property
+    def average_score(self):
+        return self.score_total / self.quizzes_attempted if self.quizzes_attempted else None
+
+    def __str__(self):
+        return f"{self.user.email} - {self.language.code}"
+
+class LeaderboardEntry(models.Model):
+    """
+    A user's score on one leaderboard: the sum of their UserProgress.score
+    over a language's quizzes, or over one level when level is set ('' is
+    the whole language). Maintained by LeaderboardService together with
+    LeaderboardBucket.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+    level = models.CharField(max_length=20, blank=True)
+    score = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'language', 'level']
+        indexes = [
+            # Top N is a range scan from the highest score down
+            models.Index(fields=['language', 'level', '-score', 'user'], name='leaderboard_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.language.code} {self.level or 'all'}: {self.score}"
+
+class LeaderboardBucket(models.Model):
+    """
+    How many users on a leaderboard have exactly this score. A rank is one
+    plus the counts of the buckets above it, so looking one up reads at
+    most one row per distinct score (0-100 per level) however many users
+    there are.
+    """
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+    level = models.CharField(max_length=20, blank=True)
+    score = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['language', 'level', 'score']
+
+    def __str__(self):
+        return f"{self.language.code} {self.level or 'all'}: {self.count} at {self.score}"
+
 class UserAnswer(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_option = models.ForeignKey(QuestionOption, null=True, on_delete=models.SET_NULL)
     is_correct = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so imports can keep the original time
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         unique_together = ['user', 'question']
     
     def __str__(self):
         return f"{self.user.email} - {self.question.text[:30]}"
+
+
+class AnswerLog(models.Model):
+    """
+    Every answer ever given, in quizzes and in reviews. Rows are only ever
+    added: UserAnswer keeps the latest answer per question, this keeps the
+    history.
+    """
+    SOURCE_QUIZ = 'quiz'
+    SOURCE_REVIEW = 'review'
+    SOURCE_CHOICES = [
+        (SOURCE_QUIZ, 'Quiz'),
+        (SOURCE_REVIEW, 'Review'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='answer_log')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    selected_option = models.ForeignKey(QuestionOption, null=True, on_delete=models.SET_NULL)
+    is_correct = models.BooleanField(default=False)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_QUIZ)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'question', '-created_at'], name='answer_log_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.question.text[:30]} ({self.source})"
+
+
+class ReviewSchedule(models.Model):
+    """
+    When a user should next see a question, by the SM-2 algorithm: ease
+    grows with correct answers and the interval with it; a wrong answer
+    starts the question over. Maintained by ReviewService.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_schedule')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    ease = models.FloatField(default=2.5)
+    interval_days = models.IntegerField(default=0)
+    repetitions = models.IntegerField(default=0)
+    lapses = models.IntegerField(default=0)
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'question']
+        indexes = [
+            # The review queue is a range scan over one user's due dates
+            models.Index(fields=['user', 'due_at'], name='review_user_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.question.text[:30]} due {self.due_at}"
+
+
+class QuizSubmission(models.Model):
+    """
+    A graded submission, keyed by the client-supplied submission id so that
+    retries and double-clicks replay the stored result instead of re-grading.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    submission_id = models.CharField(max_length=64)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'submission_id']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.quiz} - {self.submission_id}"
@@ -0,0 +1,18 @@
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Cursor pagination for every list endpoint (DEFAULT_PAGINATION_CLASS).
+
+    Pages are found with an indexed WHERE on the ordering column instead of
+    OFFSET, so deep pages cost the same as the first. Views set `ordering`
+    to a column their filter is indexed on, tie-broken by id.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('id',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,235 @@
+"""
+Request performance sampling.
+
+PerformanceMiddleware times a sample of requests (settings.PERF_SAMPLE_RATE,
+0 to 1) and, for each one, records wall time, database query count and
+time, serializer time, render time and response size against its route
+(method plus URL name, e.g. "POST quiz-submit"). Sampled responses carry a
+Server-Timing header and are logged as one JSON line on the quizzes.perf
+logger.
+
+Timings go into fixed-bucket histograms held in process memory, so
+perf_stats() can report p50/p95/p99 per route without keeping every
+sample. Buckets grow by 10%, which bounds a percentile's error to 10%.
+Each worker process keeps its own figures.
+
+With sampling off, a request costs the middleware one settings lookup,
+and a serializer one context variable read per object.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in milliseconds: 0.1ms to about a minute
+BUCKETS_MS = tuple(0.1 * 1.1 ** i for i in range(141))
+TIMINGS = ('total', 'db', 'serialize', 'render')
+PERCENTILES = (50, 95, 99)
+
+_current = ContextVar('perf_sample', default=None)
+_lock = threading.Lock()
+_routes = {}
+_since = timezone.now()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p) -> float:
+        """
+        Upper bound of the bucket holding the p-th percentile, capped at the
+        largest value seen.
+        """
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return 0.0
+
+
+class RouteStats:
+    def __init__(self):
+        self.timings = {name: Histogram() for name in TIMINGS}
+        self.errors = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.bytes = 0
+        self.max_bytes = 0
+
+    def add(self, sample, status, size):
+        for name in TIMINGS:
+            self.timings[name].add(sample.ms[name])
+        self.errors += status >= 500
+        self.queries += sample.queries
+        self.max_queries = max(self.max_queries, sample.queries)
+        self.bytes += size
+        self.max_bytes = max(self.max_bytes, size)
+
+    def as_dict(self) -> dict:
+        count = self.timings['total'].count
+        stats = {
+            'count': count,
+            'errors': self.errors,
+            'queries': {'mean': self.queries / count, 'max': self.max_queries},
+            'bytes': {'mean': self.bytes / count, 'max': self.max_bytes},
+        }
+        for name, histogram in self.timings.items():
+            stats[f'{name}_ms'] = {
+                **{f'p{p}': round(histogram.percentile(p), 2) for p in PERCENTILES},
+                'mean': round(histogram.sum / count, 2),
+                'max': round(histogram.max, 2),
+            }
+        return stats
+
+
+class Sample:
+    __slots__ = ('ms', 'queries', 'active', 'started')
+
+    def __init__(self):
+        self.ms = dict.fromkeys(TIMINGS, 0.0)
+        self.queries = 0
+        self.active = set()
+        self.started = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.ms['db'] += (time.perf_counter() - start) * 1000
+            self.queries += 1
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the block's time to the current sample's `name` timing. Nested
+    blocks of the same name (a serializer inside a serializer) count once.
+    """
+    sample = _current.get()
+    if sample is None or name in sample.active:
+        yield
+        return
+    sample.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.ms[name] += (time.perf_counter() - start) * 1000
+        sample.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """
+    Count a serializer's to_representation() as serializer time.
+    """
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with phase('serialize'):
+            return super().to_representation(instance)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+        if not rate or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        sample = Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        sample.ms['total'] = (time.perf_counter() - start) * 1000
+        if 'render' in sample.started:
+            sample.ms['render'] = (time.perf_counter() - sample.started['render']) * 1000
+
+        match = request.resolver_match
+        route = f"{request.method} {match.view_name if match else 'unresolved'}"
+        if response.streaming:
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        record(route, sample, response.status_code, size)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f"total;dur={sample.ms['total']:.1f}",
+            f"db;dur={sample.ms['db']:.1f};desc=\"{sample.queries} queries\"",
+            f"serialize;dur={sample.ms['serialize']:.1f}",
+            f"render;dur={sample.ms['render']:.1f}",
+        ])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                **{f'{name}_ms': round(ms, 2) for name, ms in sample.ms.items()},
+                'queries': sample.queries,
+                'bytes': size,
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this; time it from here
+        sample = _current.get()
+        if sample is not None:
+            sample.started['render'] = time.perf_counter()
+        return response
+
+
+def record(route, sample, status, size) -> None:
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = RouteStats()
+        stats.add(sample, status, size)
+
+
+def perf_stats() -> dict:
+    with _lock:
+        routes = {route: stats.as_dict() for route, stats in sorted(_routes.items())}
+    return {
+        'sample_rate': getattr(settings, 'PERF_SAMPLE_RATE', 0),
+        'since': _since,
+        'routes': routes,
+    }
+
+
+def reset_perf_stats() -> None:
+    global _since
+    with _lock:
+        _routes.clear()
+        _since = timezone.now()
@@ -0,0 +1,99 @@
+"""
+Spaced repetition over answered questions.
+
+Each answer is appended to AnswerLog and moves its question's
+ReviewSchedule with SM-2: answers are graded on SM-2's 0-5 quality scale
+(right or wrong only, so QUALITY_CORRECT or QUALITY_INCORRECT), the ease
+factor follows the quality, and the interval grows 1 day, 6 days, then by
+the ease factor with every correct answer in a row. A wrong answer starts
+the question over at one day.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import AnswerLog, ReviewSchedule
+
+QUALITY_CORRECT = 5
+QUALITY_INCORRECT = 2
+MIN_EASE = 1.3
+
+
+def next_review(ease, interval_days, repetitions, correct):
+    """
+    SM-2 step: (ease, interval_days, repetitions) after an answer.
+    """
+    quality = QUALITY_CORRECT if correct else QUALITY_INCORRECT
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if not correct:
+        return ease, 1, 0
+    if repetitions == 0:
+        interval_days = 1
+    elif repetitions == 1:
+        interval_days = 6
+    else:
+        interval_days = round(interval_days * ease)
+    return ease, interval_days, repetitions + 1
+
+
+class ReviewService:
+    @staticmethod
+    def record(user, answers, source=AnswerLog.SOURCE_QUIZ, now=None) -> list:
+        """
+        Log graded answers (objects with question_id, selected_option_id and
+        is_correct, such as unsaved UserAnswers) and reschedule their
+        questions: one insert, one read and one upsert however many answers
+        there are. Returns the new ReviewSchedule values, unsaved.
+        """
+        now = now or timezone.now()
+        AnswerLog.objects.bulk_create([
+            AnswerLog(
+                user=user,
+                question_id=answer.question_id,
+                selected_option_id=answer.selected_option_id,
+                is_correct=answer.is_correct,
+                source=source,
+                created_at=now,
+            )
+            for answer in answers
+        ])
+
+        stored = {
+            schedule.question_id: schedule
+            for schedule in ReviewSchedule.objects.filter(user=user, question_id__in=[a.question_id for a in answers])
+        }
+        schedules = []
+        for answer in answers:
+            # New instances rather than the stored ones, so the upsert below
+            # conflicts on (user, question) and never on the primary key
+            schedule = ReviewSchedule(user=user, question_id=answer.question_id)
+            previous = stored.get(answer.question_id, schedule)
+            schedule.ease, schedule.interval_days, schedule.repetitions = next_review(
+                previous.ease, previous.interval_days, previous.repetitions, answer.is_correct
+            )
+            schedule.lapses = previous.lapses + (not answer.is_correct)
+            schedule.due_at = now + timedelta(days=schedule.interval_days)
+            schedule.last_reviewed_at = now
+            schedules.append(schedule)
+
+        ReviewSchedule.objects.bulk_create(
+            schedules,
+            update_conflicts=True,
+            unique_fields=['user', 'question'],
+            update_fields=['ease', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at'],
+        )
+        return schedules
+
+    @staticmethod
+    def due(user, limit=20, now=None):
+        """
+        The user's next `limit` due questions across all quizzes, most
+        overdue first: a range scan on review_user_due_idx, with the options
+        prefetched.
+        """
+        return (
+            ReviewSchedule.objects.filter(user=user, due_at__lte=now or timezone.now())
+            .select_related('question__quiz__language')
+            .prefetch_related('question__options')
+            .order_by('due_at')[:limit]
+        )
@@ -1,24 +1,119 @@
+from django.conf import settings
+from django.urls import reverse
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import Language, Quiz, Question, QuestionOption, UserProgress, UserAnswer
+from .perf import TimedSerializerMixin
+from .models import Language, Quiz, Question, QuestionOption, ReviewSchedule, UserProgress, UserAnswer
+from .tts import FORMAT_TYPES
 
-class LanguageSerializer(serializers.ModelSerializer):
+def parse_field_paths(value):
+    """
+    Turn 'score,quiz.id,quiz.title' into {'score': {}, 'quiz': {'id': {}, 'title': {}}}.
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def field_requested(path, fields=None, omit=None):
+    """
+    Whether the dotted field `path` survives a fields/omit selection, so
+    views can skip joins and prefetches for fields nobody asked for.
+    """
+    fields = parse_field_paths(fields) if isinstance(fields, str) else fields
+    omit = parse_field_paths(omit) if isinstance(omit, str) else omit
+    for name in path.split('.'):
+        if fields:
+            if name not in fields:
+                return False
+            fields = fields[name]
+        if omit is not None:
+            if name in omit and not omit[name]:
+                return False
+            omit = omit.get(name)
+    return True
+
+
+class SparseFieldsetsMixin:
+    """
+    Sparse fieldsets: fields= keeps only the listed fields, omit= drops the
+    listed ones. Both take comma-separated names (or parsed trees), and
+    dotted names reach into nested serializers: fields='score,quiz.id'.
+    Unknown names are ignored.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        self.only_fields = parse_field_paths(fields) if isinstance(fields, str) else fields
+        self.omit_fields = parse_field_paths(omit) if isinstance(omit, str) else omit
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def fields(self):
+        fields = super().fields
+        if self.only_fields:
+            for name in list(fields):
+                if name not in self.only_fields:
+                    fields.pop(name)
+                elif self.only_fields[name]:
+                    self._narrow(fields[name], only_fields=self.only_fields[name])
+        for name, nested in (self.omit_fields or {}).items():
+            if name not in fields:
+                continue
+            if nested:
+                self._narrow(fields[name], omit_fields=nested)
+            else:
+                fields.pop(name)
+        return fields
+
+    @staticmethod
+    def _narrow(field, **selection):
+        serializer = getattr(field, 'child', field)
+        if isinstance(serializer, SparseFieldsetsMixin):
+            for attr, tree in selection.items():
+                setattr(serializer, attr, tree)
+
+
+class LanguageSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Language
         fields = ['id', 'name', 'code', 'flag_emoji']
 
-class QuestionOptionSerializer(serializers.ModelSerializer):
+class QuestionOptionSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = QuestionOption
         fields = ['id', 'text']
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     options = QuestionOptionSerializer(many=True, read_only=True)
+    audio_url = serializers.SerializerMethodField()
+    audio_sources = serializers.SerializerMethodField()
     quiz = serializers.SerializerMethodField()
     
     class Meta:
         model = Question
-        fields = ['id', 'text', 'question_type', 'options', 'audio_url', 'quiz']
+        fields = ['id', 'text', 'question_type', 'options', 'audio_url', 'audio_sources', 'audio_status', 'quiz']
     
+    def get_audio_url(self, obj):
+        # Speech questions whose audio hasn't been synthesized yet point at
+        # the endpoint that synthesizes it on first playback
+        if obj.audio_url or obj.question_type != 'speech' or obj.audio_status == obj.AUDIO_FAILED:
+            return obj.audio_url
+        return reverse('question-audio', args=[obj.pk])
+
+    def get_audio_sources(self, obj):
+        # One entry per stored format, most compact first, for clients to
+        # pick the first they can play (as <audio><source> does)
+        if obj.question_type != 'speech' or obj.audio_status == obj.AUDIO_FAILED:
+            return []
+        url = reverse('question-audio', args=[obj.pk])
+        return [
+            {'src': f"{url}?format={audio_format}", 'type': FORMAT_TYPES[audio_format]}
+            for audio_format in getattr(settings, 'AUDIO_FORMATS', {})
+        ]
+
     def get_quiz(self, obj):
         return {
             'language': {
@@ -26,7 +121,7 @@ class QuestionSerializer(serializers.ModelSerializer):
             }
         }
 
-class QuizSerializer(serializers.ModelSerializer):
+class QuizSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     language = LanguageSerializer(read_only=True)
     questions = QuestionSerializer(many=True, read_only=True)
     
@@ -34,7 +129,15 @@ class QuizSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = ['id', 'language', 'level', 'title', 'description', 'questions']
 
-class UserProgressSerializer(serializers.ModelSerializer):
+class QuizSummarySerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
+    language = LanguageSerializer(read_only=True)
+    question_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'language', 'level', 'title', 'description', 'question_count']
+
+class UserProgressSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
     quiz = QuizSerializer(read_only=True)
     
     class Meta:
@@ -46,6 +149,14 @@ class UserAnswerSerializer(serializers.ModelSerializer):
         model = UserAnswer
         fields = ['id', 'question', 'selected_option', 'is_correct', 'created_at']
 
+class ReviewItemSerializer(TimedSerializerMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
+    question = QuestionSerializer(read_only=True)
+    quiz_id = serializers.IntegerField(source='question.quiz_id', read_only=True)
+
+    class Meta:
+        model = ReviewSchedule
+        fields = ['question', 'quiz_id', 'due_at', 'interval_days', 'repetitions', 'ease', 'lapses']
+
 class QuizSubmissionSerializer(serializers.Serializer):
     question_id = serializers.IntegerField()
     selected_option_id = serializers.IntegerField()
@@ -1,41 +1,316 @@
+import hashlib
+import json
 import os
-import uuid
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
 from django.conf import settings
-from gtts import gTTS
 import logging
 
+from .locks import acquire_lock_file, release_lock_file
+from .metrics import TTS_CACHE
+from .tts import get_engine, transcode
+
 logger = logging.getLogger(__name__)
 
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls at most `rate` per second apart.
+    A rate of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if wait:
+            time.sleep(wait)
+
+# Syntheses in progress in this process, keyed by audio key
+_inflight = {}
+_inflight_lock = threading.Lock()
+
 class TTSService:
     @staticmethod
-    def generate_audio(text: str, language_code: str) -> str:
+    def normalize_text(text: str) -> str:
+        """
+        Canonical form of a phrase for cache keys: NFC, trimmed, single spaces
+        """
+        return ' '.join(unicodedata.normalize('NFC', text).split())
+
+    @staticmethod
+    def default_format() -> str:
+        return getattr(settings, 'AUDIO_DEFAULT_FORMAT', 'mp3')
+
+    @staticmethod
+    def audio_formats() -> list:
         """
-        Generate audio file using gTTS and store it
-        Returns the URL path to the audio file
+        Formats stored for each phrase, the default format first
+        """
+        default = TTSService.default_format()
+        return [default] + [f for f in getattr(settings, 'AUDIO_FORMATS', {}) if f != default]
+
+    @staticmethod
+    def audio_key(text: str, language_code: str) -> str:
         """
+        Content address of the audio for a phrase: a hash of the normalized
+        text, language, voice and engine. Identical phrases share one file
+        per format (see variant_filename).
+        """
+        parts = [
+            TTSService.normalize_text(text),
+            language_code.lower(),
+            getattr(settings, 'TTS_VOICE', ''),
+            get_engine().name,
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def source_format(audio_format: str) -> str:
+        """
+        Format the engine is asked for to produce audio_format: the format
+        itself when the engine makes it, otherwise the one it is transcoded
+        from (the default format where the engine makes that).
+        """
+        engine = get_engine()
+        if audio_format in engine.native_formats:
+            return audio_format
+        default = TTSService.default_format()
+        return default if default in engine.native_formats else engine.native_formats[0]
+
+    @staticmethod
+    def variant_filename(key: str, audio_format: str) -> str:
+        """
+        {key}.{format} for audio straight from the engine. Transcoded
+        variants are {key}-{encoding}.{format}, {encoding} hashing the
+        format's AUDIO_FORMATS options, so changing a bitrate makes new
+        files rather than serving the old ones.
+        """
+        if audio_format == TTSService.source_format(audio_format):
+            return f"{key}.{audio_format}"
+        options = getattr(settings, 'AUDIO_FORMATS', {}).get(audio_format, {})
+        encoding = hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        return f"{key}-{encoding}.{audio_format}"
+
+    @staticmethod
+    def audio_filename(text: str, language_code: str, audio_format: str) -> str:
+        return TTSService.variant_filename(TTSService.audio_key(text, language_code), audio_format)
+
+    @staticmethod
+    def cached_audio_url(text: str, language_code: str, audio_format: str = None):
+        """
+        URL of already-synthesized audio for a phrase, or None
+        """
+        audio_format = audio_format or TTSService.default_format()
+        filename = TTSService.audio_filename(text, language_code, audio_format)
+        if os.path.exists(os.path.join(settings.AUDIO_FILES_DIR, filename)):
+            return f"{settings.AUDIO_FILES_URL}{filename}"
+        return None
+
+    @staticmethod
+    def get_or_generate_audio(text: str, language_code: str, wait: float = None,
+                              audio_format: str = None) -> str:
+        """
+        Return the audio URL for a phrase, synthesizing it on first use.
+
+        Single-flight: however many requests ask for the same new phrase at
+        once, the engine is called once. Threads in this process wait on the
+        leader's result; other processes wait on a lock file next to the
+        audio and poll for the file. Raises TimeoutError if the audio isn't ready within `wait`
+        seconds, or the engine's error if synthesis failed.
+        """
+        audio_format = audio_format or TTSService.default_format()
+        cached = TTSService.cached_audio_url(text, language_code, audio_format)
+        TTS_CACHE.labels('hit' if cached else 'miss').inc()
+        if cached:
+            return cached
+        if wait is None:
+            wait = getattr(settings, 'TTS_LAZY_WAIT_SECONDS', 15)
+
+        key = TTSService.audio_filename(text, language_code, audio_format)
+        with _inflight_lock:
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = _inflight[key] = Future()
+        if not leader:
+            return future.result(timeout=wait)
+
+        try:
+            url = TTSService._generate_once_across_processes(text, language_code, audio_format, key, wait)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(url)
+            return url
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+
+    @staticmethod
+    def _generate_once_across_processes(text, language_code, audio_format, key, wait):
+        # Every process that serves the audio shares AUDIO_FILES_DIR, whatever
+        # the cache backend, so the lock is a file created there exclusively
+        lock_path = os.path.join(settings.AUDIO_FILES_DIR, f"{key}.lock")
+        # Long enough for an engine call and then transcoding its output,
+        # which is allowed three engine timeouts (see generate_audio)
+        engine_timeout = get_engine().timeout
+        lock_ttl = engine_timeout + engine_timeout * 3 + 5
+        os.makedirs(settings.AUDIO_FILES_DIR, exist_ok=True)
+        deadline = time.monotonic() + wait
+        while True:
+            if acquire_lock_file(lock_path, lock_ttl):
+                try:
+                    return TTSService.generate_audio(
+                        text, language_code, raise_errors=True, audio_format=audio_format
+                    )
+                finally:
+                    release_lock_file(lock_path)
+            # Another process is synthesizing this phrase; wait for its file.
+            # If it gives up, the lock disappears and we take over.
+            cached = TTSService.cached_audio_url(text, language_code, audio_format)
+            if cached:
+                return cached
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for audio '{key}'")
+            time.sleep(0.1)
+
+    @staticmethod
+    def generate_audio_batch(items, max_workers: int = None, rate_limit: float = None, formats=None):
+        """
+        Synthesize many (text, language_code) pairs on a bounded thread pool,
+        in each of `formats` (default: every configured format).
+
+        Pairs that map to the same audio are synthesized once, files that
+        are already on disk skip the engine (and the rate limiter), formats
+        transcoded from one already made skip it too, and a failure only
+        affects its own item.
+        Returns (urls, errors): dicts keyed by the (text, language_code) pairs,
+        with the URL of the default format.
+        """
+        if formats is None:
+            formats = TTSService.audio_formats()
+        if max_workers is None:
+            max_workers = getattr(settings, 'TTS_BATCH_CONCURRENCY', 4)
+        if rate_limit is None:
+            rate_limit = getattr(settings, 'TTS_RATE_LIMIT', None)
+        limiter = RateLimiter(rate_limit)
+
+        by_key = {}
+        for text, language_code in items:
+            by_key.setdefault(TTSService.audio_key(text, language_code), []).append((text, language_code))
+
+        def synthesize(text, language_code):
+            urls = {}
+            for audio_format in formats:
+                urls[audio_format] = TTSService.cached_audio_url(text, language_code, audio_format)
+                if not urls[audio_format]:
+                    source_format = TTSService.source_format(audio_format)
+                    if not TTSService.cached_audio_url(text, language_code, source_format):
+                        limiter.acquire()
+                    urls[audio_format] = TTSService.generate_audio(
+                        text, language_code, raise_errors=True, audio_format=audio_format
+                    )
+            return urls.get(TTSService.default_format(), urls[formats[0]])
+
+        urls, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {
+                key: pool.submit(synthesize, *pairs[0])
+                for key, pairs in by_key.items()
+            }
+            for key, future in futures.items():
+                try:
+                    url = future.result()
+                except Exception as e:
+                    for pair in by_key[key]:
+                        errors[pair] = e
+                else:
+                    for pair in by_key[key]:
+                        urls[pair] = url
+        return urls, errors
+
+    @staticmethod
+    def generate_audio(text: str, language_code: str, raise_errors: bool = False,
+                       audio_format: str = None) -> str:
+        """
+        Generate audio file using the configured TTS engine and store it,
+        in the default format unless audio_format is given. Formats the
+        engine can't produce are transcoded from the stored file of the
+        format they're made from, which is generated first if missing.
+        Returns the URL path to the audio file, or None on failure unless
+        raise_errors is set
+        """
+        audio_format = audio_format or TTSService.default_format()
         try:
             # Create audio directory if it doesn't exist
             os.makedirs(settings.AUDIO_FILES_DIR, exist_ok=True)
             
-            # Generate unique filename
-            filename = f"{uuid.uuid4()}.mp3"
+            # Content-addressed filename: reuse the file if this phrase
+            # has already been synthesized
+            cached = TTSService.cached_audio_url(text, language_code, audio_format)
+            if cached:
+                return cached
+            filename = TTSService.audio_filename(text, language_code, audio_format)
             filepath = os.path.join(settings.AUDIO_FILES_DIR, filename)
+
+            engine = get_engine()
+            source_format = TTSService.source_format(audio_format)
+            if source_format == audio_format:
+                audio = engine.synthesize(
+                    TTSService.normalize_text(text),
+                    language_code,
+                    getattr(settings, 'TTS_VOICE', ''),
+                    audio_format=audio_format
+                )
+            else:
+                source_url = TTSService.generate_audio(
+                    text, language_code, raise_errors=True, audio_format=source_format
+                )
+                with open(os.path.join(settings.AUDIO_FILES_DIR, source_url.split('/')[-1]), 'rb') as f:
+                    audio = transcode(
+                        f.read(),
+                        audio_format,
+                        getattr(settings, 'AUDIO_FORMATS', {}).get(audio_format, {}).get('bitrate'),
+                        timeout=engine.timeout * 3
+                    )
             
-            # Generate audio file
-            tts = gTTS(text=text, lang=language_code)
-            tts.save(filepath)
+            # Write to a temporary file and rename it into place, so a
+            # half-written file is never picked up as a cache hit
+            fd, tmp_path = tempfile.mkstemp(dir=settings.AUDIO_FILES_DIR, suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(audio)
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
             
             # Return the URL path
             return f"{settings.AUDIO_FILES_URL}{filename}"
             
         except Exception as e:
             logger.error(f"Error generating audio for text '{text}': {str(e)}")
+            if raise_errors:
+                raise
             return None
 
     @staticmethod
     def delete_audio(url: str) -> bool:
         """
-        Delete an audio file given its URL
+        Delete an audio file, and its variants in other formats, given its URL
         Returns True if successful, False otherwise
         """
         try:
@@ -45,6 +320,11 @@ class TTSService:
             # Extract filename from URL
             filename = url.split('/')[-1]
             filepath = os.path.join(settings.AUDIO_FILES_DIR, filename)
+            key = filename.split('.')[0].split('-')[0]
+            for audio_format in TTSService.audio_formats():
+                variant = os.path.join(settings.AUDIO_FILES_DIR, TTSService.variant_filename(key, audio_format))
+                if variant != filepath and os.path.exists(variant):
+                    os.remove(variant)
             
             # Delete file if it exists
             if os.path.exists(filepath):
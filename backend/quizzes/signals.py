@@ -0,0 +1,107 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .bundles import schedule_rebuild
+from .cache import bump_content_version
+from .leaderboards import LeaderboardService
+from .models import Language, Quiz, Question, QuestionOption, UserProgress
+from .stats import UserStatsService
+
+CONTENT_MODELS = (Language, Quiz, Question, QuestionOption)
+
+_bulk = threading.local()
+
+
+@contextmanager
+def bulk_content_changes():
+    """
+    Make invalidate_quiz_content, touch_quizzes and rebuild_quiz_bundles
+    return early for saves and deletes made by this thread inside the block,
+    which touches quizzes, bumps the content version and schedules bundle
+    rebuilds itself, once, instead of once per row. The signals are still
+    sent, so any other receiver runs as usual (as does the audio job
+    queueing in Question.save()), and other threads are unaffected.
+    """
+    previous = getattr(_bulk, 'active', False)
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = previous
+
+
+def in_bulk_content_changes() -> bool:
+    return getattr(_bulk, 'active', False)
+
+
+def invalidate_quiz_content(sender, **kwargs):
+    if in_bulk_content_changes():
+        return
+    # Bump after commit so a concurrent reader can't re-cache the old rows
+    # between the bump and the commit.
+    transaction.on_commit(bump_content_version)
+
+
+def touch_quizzes(sender, instance, **kwargs):
+    """
+    Keep Quiz.updated_at (served as Last-Modified) in step with edits to the
+    rows nested inside a quiz payload. Uses update() so no signals re-fire.
+    """
+    if in_bulk_content_changes():
+        return
+    if sender is Language:
+        quizzes = Quiz.objects.filter(language_id=instance.pk)
+    elif sender is Question:
+        quizzes = Quiz.objects.filter(pk=instance.quiz_id)
+    else:
+        quizzes = Quiz.objects.filter(questions__id=instance.question_id)
+    quizzes.update(updated_at=timezone.now())
+
+
+def rebuild_quiz_bundles(sender, instance, **kwargs):
+    if in_bulk_content_changes():
+        return
+    if sender is Language:
+        schedule_rebuild(languages=[instance.pk])
+    elif sender is Quiz:
+        # All of the language's bundles: the quiz may have changed level
+        schedule_rebuild(languages=[instance.language_id])
+    elif sender is Question:
+        schedule_rebuild(quizzes=[instance.quiz_id])
+    else:
+        schedule_rebuild(questions=[instance.question_id])
+
+
+def count_attempted_quiz(sender, instance, created, **kwargs):
+    """
+    A new progress row is a newly attempted quiz. Deletes (of quizzes or
+    accounts) aren't tracked; rebuild_user_stats reconciles them.
+    """
+    if created:
+        UserStatsService.apply(instance.user_id, instance.quiz.language_id, quizzes_attempted=1)
+
+
+def enter_leaderboards(sender, instance, created, **kwargs):
+    """
+    Starting a quiz puts the user on its level's and language's boards.
+    """
+    if created:
+        LeaderboardService.apply(instance.user_id, instance.quiz.language_id, instance.quiz.level)
+
+
+post_save.connect(count_attempted_quiz, sender=UserProgress, dispatch_uid='stats-progress-created')
+post_save.connect(enter_leaderboards, sender=UserProgress, dispatch_uid='leaderboards-progress-created')
+
+for model in CONTENT_MODELS:
+    post_save.connect(invalidate_quiz_content, sender=model, dispatch_uid=f'invalidate-{model.__name__}-save')
+    post_delete.connect(invalidate_quiz_content, sender=model, dispatch_uid=f'invalidate-{model.__name__}-delete')
+    post_save.connect(rebuild_quiz_bundles, sender=model, dispatch_uid=f'bundles-{model.__name__}-save')
+    post_delete.connect(rebuild_quiz_bundles, sender=model, dispatch_uid=f'bundles-{model.__name__}-delete')
+
+for model in (Language, Question, QuestionOption):
+    post_save.connect(touch_quizzes, sender=model, dispatch_uid=f'touch-quizzes-{model.__name__}-save')
+    post_delete.connect(touch_quizzes, sender=model, dispatch_uid=f'touch-quizzes-{model.__name__}-delete')
@@ -0,0 +1,179 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import UserAnswer, UserLanguageStats, UserProgress
+
+
+class UserStatsService:
+    @staticmethod
+    def apply(user_id, language_id, active_on=None, create=True, **deltas):
+        """
+        Add deltas to a user's counters for a language in a single UPDATE,
+        creating the row on first use. With active_on (a date), also extend
+        or restart the day streak. Safe under concurrency: every change is
+        computed by the database from the stored values.
+        """
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if active_on is not None:
+            streak = Case(
+                When(last_active_date=active_on, then=F('current_streak')),
+                When(last_active_date=active_on - timedelta(days=1), then=F('current_streak') + 1),
+                default=Value(1),
+            )
+            updates.update(
+                current_streak=streak,
+                longest_streak=Greatest(F('longest_streak'), streak),
+                last_active_date=active_on,
+            )
+        if not updates:
+            return
+
+        rows = UserLanguageStats.objects.filter(user_id=user_id, language_id=language_id)
+        if rows.update(**updates) or not create:
+            return
+        initial = dict(deltas)
+        if active_on is not None:
+            initial.update(current_streak=1, longest_streak=1, last_active_date=active_on)
+        try:
+            with transaction.atomic():
+                UserLanguageStats.objects.create(user_id=user_id, language_id=language_id, **initial)
+        except IntegrityError:
+            # Created concurrently; apply on top of it
+            rows.update(**updates)
+
+    @staticmethod
+    def compute(user_ids=None) -> dict:
+        """
+        Counters recomputed from UserProgress and UserAnswer with two grouped
+        queries, keyed by (user_id, language_id).
+        """
+        progress = UserProgress.objects.all()
+        answers = UserAnswer.objects.all()
+        if user_ids is not None:
+            progress = progress.filter(user_id__in=user_ids)
+            answers = answers.filter(user_id__in=user_ids)
+
+        expected = {}
+        for row in progress.values('user_id', 'quiz__language_id').annotate(
+            attempted=Count('id'),
+            completed=Count('id', filter=Q(completed=True)),
+            score_total=Sum('score'),
+            last_attempted=Max('last_attempted'),
+        ).order_by():
+            expected[row['user_id'], row['quiz__language_id']] = {
+                'quizzes_attempted': row['attempted'],
+                'quizzes_completed': row['completed'],
+                'score_total': row['score_total'] or 0,
+                'answers_given': 0,
+                'correct_answers': 0,
+                'last_attempted': row['last_attempted'],
+            }
+        for row in answers.values('user_id', 'question__quiz__language_id').annotate(
+            given=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+        ).order_by():
+            counters = expected.setdefault((row['user_id'], row['question__quiz__language_id']), {
+                field: 0 for field in UserLanguageStats.COUNTERS
+            })
+            counters['answers_given'] = row['given']
+            counters['correct_answers'] = row['correct']
+        return expected
+
+    @staticmethod
+    def rebuild(user_ids=None, dry_run=False):
+        """
+        Compare stored counters with recomputed ones and, unless dry_run,
+        fix every difference. Streaks aren't recoverable from the tables, so
+        stored streaks are kept; rows created here start a streak of one on
+        the last attempt's date. Returns a list of drift entries:
+        (user_id, language_id, field, stored, expected).
+        """
+        expected = UserStatsService.compute(user_ids)
+        stored = UserLanguageStats.objects.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+
+        drift, changed = [], []
+        seen = set()
+        for stats in stored.iterator():
+            key = (stats.user_id, stats.language_id)
+            seen.add(key)
+            counters = expected.get(key, {})
+            dirty = False
+            for field in UserLanguageStats.COUNTERS:
+                value = counters.get(field, 0)
+                if getattr(stats, field) != value:
+                    drift.append((*key, field, getattr(stats, field), value))
+                    setattr(stats, field, value)
+                    dirty = True
+            if dirty:
+                stats.updated_at = timezone.now()
+                changed.append(stats)
+
+        missing = []
+        for key, counters in expected.items():
+            if key in seen:
+                continue
+            stats = UserLanguageStats(user_id=key[0], language_id=key[1])
+            for field in UserLanguageStats.COUNTERS:
+                drift.append((*key, field, None, counters[field]))
+                setattr(stats, field, counters[field])
+            if counters.get('last_attempted'):
+                stats.current_streak = stats.longest_streak = 1
+                stats.last_active_date = timezone.localdate(counters['last_attempted'])
+            missing.append(stats)
+
+        if not dry_run:
+            with transaction.atomic():
+                UserLanguageStats.objects.bulk_update(
+                    changed, UserLanguageStats.COUNTERS + ['updated_at'], batch_size=1000
+                )
+                UserLanguageStats.objects.bulk_create(missing, batch_size=1000)
+        return drift
+
+    @staticmethod
+    def summary(user) -> dict:
+        """
+        A user's statistics per language and overall, from their stats rows
+        alone.
+        """
+        languages = []
+        totals = {field: 0 for field in UserLanguageStats.COUNTERS}
+        current_streak = longest_streak = 0
+        yesterday = timezone.localdate() - timedelta(days=1)
+        for stats in UserLanguageStats.objects.filter(user=user).select_related('language').order_by('language__code'):
+            # A streak is only current while its last day is today or yesterday
+            alive = stats.last_active_date is not None and stats.last_active_date >= yesterday
+            languages.append({
+                'language': stats.language.code,
+                'quizzes_attempted': stats.quizzes_attempted,
+                'quizzes_completed': stats.quizzes_completed,
+                'average_score': round(stats.average_score, 1) if stats.average_score is not None else None,
+                'answers_given': stats.answers_given,
+                'correct_answers': stats.correct_answers,
+                'current_streak': stats.current_streak if alive else 0,
+                'longest_streak': stats.longest_streak,
+                'last_active_date': stats.last_active_date,
+            })
+            for field in totals:
+                totals[field] += getattr(stats, field)
+            if alive:
+                current_streak = max(current_streak, stats.current_streak)
+            longest_streak = max(longest_streak, stats.longest_streak)
+
+        score_total = totals.pop('score_total')
+        return {
+            'languages': languages,
+            'totals': {
+                **totals,
+                'average_score': (
+                    round(score_total / totals['quizzes_attempted'], 1) if totals['quizzes_attempted'] else None
+                ),
+                'current_streak': current_streak,
+                'longest_streak': longest_streak,
+            },
+        }
@@ -1,3 +1,1726 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from . import cache as content_cache
+from . import perf
+from .grading import GradingService
+from .jobs import AudioJobService
+from .leaderboards import LeaderboardService
+from .reviews import ReviewService
+from .services import TTSService
+from .stats import UserStatsService
+from .audio import negotiate_format
+from .bundles import QuizBundleService, brotli
+from .tts import STUB_MP3_FRAME, STUB_OGG_PAGE, StubTTSEngine, get_engine
+from .models import (
+    AnswerLog, AudioJob, Language, LeaderboardEntry, Quiz, Question, QuestionOption, QuizSubmission, ReviewSchedule,
+    UserAnswer, UserLanguageStats, UserProgress,
+)
+
+User = get_user_model()
+
+
+def seed_catalogue(questions_per_quiz=200, options_per_question=3):
+    """
+    Build a catalogue of 4 languages x 3 levels with bulk inserts so that
+    Question.save() (and its TTS call) is never triggered.
+    """
+    languages = Language.objects.bulk_create([
+        Language(name=name, code=code, flag_emoji='')
+        for name, code in [('Spanish', 'es'), ('French', 'fr'), ('German', 'de'), ('Italian', 'it')]
+    ])
+    quizzes = Quiz.objects.bulk_create([
+        Quiz(language=language, level=level, title=f"{language.name} - {level}", description='')
+        for language in languages
+        for level in ['beginner', 'intermediate', 'expert']
+    ])
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=f"Question {i}", question_type='multiple_choice', correct_answer='0')
+        for quiz in quizzes
+        for i in range(questions_per_quiz)
+    ])
+    QuestionOption.objects.bulk_create([
+        QuestionOption(question=question, text=str(i), is_correct=(i == 0))
+        for question in questions
+        for i in range(options_per_question)
+    ])
+    return quizzes
+
+
+class TemporaryAudioDirMixin:
+    """
+    Point AUDIO_FILES_DIR at a throwaway directory and use the offline engine.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.audio_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.audio_dir, ignore_errors=True)
+        settings_override = override_settings(TTS_ENGINE='stub', AUDIO_FILES_DIR=self.audio_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def build_answers(quiz, correct):
+    """
+    Answer every question of the quiz, getting the first `correct` right.
+    """
+    answers = []
+    for question in quiz.questions.prefetch_related('options').order_by('id'):
+        option = next(o for o in question.options.all() if o.is_correct == (len(answers) < correct))
+        answers.append({'question_id': question.id, 'selected_option_id': option.id})
+    return answers
+
+
+class QuizCatalogueQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_is_independent_of_catalogue_size(self):
+        # Last-Modified, quizzes + languages (joined), questions, options
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/quizzes/', {'expand': 'questions'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(sum(len(quiz['questions']) for quiz in response.data['results']), 2400)
+
+    def test_retrieve_query_count_is_independent_of_question_count(self):
+        quiz = self.quizzes[0]
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/quizzes/{quiz.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['questions']), 200)
+        self.assertEqual(response.data['questions'][0]['quiz'], {'language': {'code': 'es'}})
+
+    def test_list_returns_summaries_by_default(self):
+        # Last-Modified, then quizzes + languages + question counts in a
+        # single aggregate query
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/quizzes/', {'language': 'fr', 'level': 'expert'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        summary = response.data['results'][0]
+        self.assertEqual(
+            set(summary),
+            {'id', 'language', 'level', 'title', 'description', 'question_count'},
+        )
+        self.assertEqual(summary['language']['code'], 'fr')
+        self.assertEqual(summary['question_count'], 200)
+
+
+class QuizContentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.admin = User.objects.create_user(username='admin@example.com', password='pass', is_staff=True)
+        cls.quizzes = seed_catalogue(questions_per_quiz=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        quiz = self.quizzes[0]
+        for url in ['/api/quizzes/', f'/api/quizzes/{quiz.id}/', '/api/quizzes/languages/']:
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+
+        stats = content_cache.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 3))
+
+    def test_filters_and_expansion_are_cached_separately(self):
+        summary = self.client.get('/api/quizzes/', {'language': 'es'})
+        expanded = self.client.get('/api/quizzes/', {'language': 'es', 'expand': 'questions'})
+        self.assertEqual(len(summary.data['results']), 3)
+        self.assertNotIn('questions', summary.data['results'][0])
+        self.assertIn('questions', expanded.data['results'][0])
+
+    def test_long_urls_make_valid_cache_keys(self):
+        url = '/api/quizzes/?language=es&' + '&'.join(f'unused{i}=value' for i in range(40))
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                self.client.get(url)
+
+    def test_content_changes_invalidate_cached_payloads(self):
+        quiz = self.quizzes[0]
+        self.client.get(f'/api/quizzes/{quiz.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question = quiz.questions.first()
+            question.text = 'Edited'
+            question.save()
+
+        response = self.client.get(f'/api/quizzes/{quiz.id}/')
+        self.assertEqual(response.data['questions'][0]['text'], 'Edited')
+        self.assertEqual(content_cache.cache_stats()['misses'], 2)
+
+    def test_deploy_check_warns_about_a_process_local_cache(self):
+        def warnings():
+            return [m.id for m in checks.run_checks(tags=[checks.Tags.caches], include_deployment_checks=True)]
+
+        self.assertIn('quizzes.W001', warnings())
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with override_settings(CACHES=shared):
+            self.assertNotIn('quizzes.W001', warnings())
+
+    def test_cache_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/quizzes/cache-stats/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/quizzes/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_ratio', response.data)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matching_etag_returns_304_without_queries(self):
+        quiz = self.quizzes[0]
+        for url in ['/api/quizzes/', f'/api/quizzes/{quiz.id}/', '/api/quizzes/languages/']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers['ETag']
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_uses_quiz_updated_at(self):
+        quiz = self.quizzes[0]
+        response = self.client.get(f'/api/quizzes/{quiz.id}/')
+        last_modified = response.headers['Last-Modified']
+
+        response = self.client.get(f'/api/quizzes/{quiz.id}/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_change_produces_new_etag(self):
+        quiz = self.quizzes[0]
+        updated_at = quiz.updated_at
+        etag = self.client.get(f'/api/quizzes/{quiz.id}/').headers['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            option = QuestionOption.objects.filter(question__quiz=quiz).first()
+            option.text = 'Edited'
+            option.save()
+
+        response = self.client.get(f'/api/quizzes/{quiz.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        quiz.refresh_from_db()
+        self.assertGreater(quiz.updated_at, updated_at)
+
+
+class QuizSubmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=50)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.quiz = self.quizzes[0]
+        UserProgress.objects.create(user=self.user, quiz=self.quiz)
+
+    def answers(self, quiz, correct):
+        return build_answers(quiz, correct)
+
+    def test_submit_query_count_does_not_grow_with_answers(self):
+        answers = self.answers(self.quiz, correct=40)
+        # quiz, questions, options, progress, then the transaction: lock,
+        # previous score and answer counts, delete, upsert, progress write,
+        # answer log insert, review schedule read and upsert, stats update,
+        # then for the level and language leaderboards: lock both entries,
+        # and per board an entry write and the move between score buckets
+        # (a score's first user also adds its bucket)
+        with self.assertNumQueries(27):
+            response = self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', answers, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['correct_answers'], 40)
+        self.assertEqual(response.data['score_percentage'], 80.0)
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 50)
+        self.assertEqual(UserProgress.objects.get(user=self.user, quiz=self.quiz).score, 80)
+
+    def test_resubmission_overwrites_previous_answers(self):
+        answers = self.answers(self.quiz, correct=50)
+        self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', answers, format='json')
+        response = self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', answers[:10], format='json')
+        self.assertEqual(response.data['score_percentage'], 100.0)
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 10)
+
+    def test_rejects_questions_from_another_quiz(self):
+        answers = self.answers(self.quizzes[1], correct=1)[:1]
+        response = self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', answers, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserAnswer.objects.exists())
+
+    def test_rejects_option_from_another_question(self):
+        answers = self.answers(self.quiz, correct=2)[:2]
+        answers[0]['selected_option_id'], answers[1]['selected_option_id'] = (
+            answers[1]['selected_option_id'], answers[0]['selected_option_id']
+        )
+        response = self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', answers, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['question_ids'],
+            [str(answers[0]['question_id']), str(answers[1]['question_id'])],
+        )
+
+    def test_submit_without_start_creates_progress(self):
+        UserProgress.objects.all().delete()
+        response = self.client.post(
+            f'/api/quizzes/{self.quiz.id}/submit/', self.answers(self.quiz, correct=25), format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProgress.objects.get(user=self.user, quiz=self.quiz).score, 50)
+
+    def test_repeated_submission_id_replays_result(self):
+        url = f'/api/quizzes/{self.quiz.id}/submit/'
+        first = self.client.post(url, self.answers(self.quiz, correct=50), format='json',
+                                 HTTP_IDEMPOTENCY_KEY='attempt-1')
+        second = self.client.post(url, self.answers(self.quiz, correct=0), format='json',
+                                  HTTP_IDEMPOTENCY_KEY='attempt-1')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(UserProgress.objects.get(user=self.user, quiz=self.quiz).score, 100)
+        self.assertEqual(QuizSubmission.objects.count(), 1)
+
+        other_quiz = self.client.post(f'/api/quizzes/{self.quizzes[1].id}/submit/', [], format='json',
+                                      HTTP_IDEMPOTENCY_KEY='attempt-1')
+        self.assertEqual(other_quiz.status_code, 409)
+
+
+    def test_submission_id_claimed_concurrently_for_another_quiz(self):
+        # The other submission commits between this one's replay checks and
+        # its insert, as when both hold different progress rows' locks
+        QuizSubmission.objects.create(user=self.user, quiz=self.quizzes[1], submission_id='race', result={})
+        replay = GradingService._replay
+        calls = []
+
+        def not_yet_committed(*args):
+            calls.append(args)
+            return replay(*args) if len(calls) > 2 else None
+
+        with mock.patch.object(GradingService, '_replay', side_effect=not_yet_committed):
+            response = self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', self.answers(self.quiz, correct=50),
+                                        format='json', HTTP_IDEMPOTENCY_KEY='race')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(UserAnswer.objects.filter(user=self.user, question__quiz=self.quiz).exists())
+
+class ConcurrentSubmissionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner@example.com', password='pass')
+        self.quiz = seed_catalogue(questions_per_quiz=20)[0]
+        self.url = f'/api/quizzes/{self.quiz.id}/submit/'
+
+    def run_in_parallel(self, calls):
+        barrier = threading.Barrier(len(calls))
+        responses = []
+
+        def run(answers, submission_id):
+            try:
+                client = APIClient()
+                client.force_authenticate(self.user)
+                headers = {'HTTP_IDEMPOTENCY_KEY': submission_id} if submission_id else {}
+                barrier.wait()
+                responses.append(client.post(self.url, answers, format='json', **headers))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_parallel_submissions_leave_consistent_state(self):
+        all_right = build_answers(self.quiz, correct=20)
+        all_wrong = build_answers(self.quiz, correct=0)
+        responses = self.run_in_parallel([(all_right, None), (all_wrong, None)] * 4)
+
+        self.assertEqual([r.status_code for r in responses], [200] * 8)
+        progress = UserProgress.objects.get(user=self.user, quiz=self.quiz)
+        answers = UserAnswer.objects.filter(user=self.user)
+        self.assertEqual(answers.count(), 20)
+        # Score and answers must come from the same submission.
+        correct = answers.filter(is_correct=True).count()
+        self.assertIn((progress.score, correct), [(100, 20), (0, 0)])
+
+    def test_parallel_retries_of_one_submission_grade_once(self):
+        answers = build_answers(self.quiz, correct=10)
+        responses = self.run_in_parallel([(answers, 'double-click')] * 8)
+
+        self.assertEqual([r.status_code for r in responses], [200] * 8)
+        self.assertEqual(len({r.data['score_percentage'] for r in responses}), 1)
+        self.assertEqual(QuizSubmission.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(UserProgress.objects.get(user=self.user, quiz=self.quiz).score, 50)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan assertions are written against SQLite EXPLAIN output')
+class QueryPlanTests(TestCase):
+    """
+    Capture the queries each endpoint runs and fail if EXPLAIN shows any of
+    them falling back to a full table scan or a sort.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertIndexed(self, method, url, tables, sorts=False, **kwargs):
+        """
+        Request url and check the plan of every SELECT it ran: no scan of
+        `tables` and, unless `sorts`, no temporary sort.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            for table in tables:
+                self.assertNotIn(f'SCAN {table}', plan, f'{sql}\n{plan}')
+            if not sorts:
+                self.assertNotIn('TEMP B-TREE', plan, f'{sql}\n{plan}')
+
+    def test_quiz_list_filters(self):
+        # The catalogue has one quiz per language and level, so a filtered
+        # list is a handful of rows and may be sorted
+        for params in ['language=es&level=beginner', 'language=es', 'level=expert']:
+            with self.subTest(params=params):
+                self.assertIndexed('get', f'/api/quizzes/?{params}', ['quizzes_quiz', 'quizzes_question'], sorts=True)
+
+    def test_progress_list_and_language_filter(self):
+        for quiz in self.quizzes[:3]:
+            self.client.post(f'/api/quizzes/{quiz.id}/start/')
+        self.assertIndexed('get', '/api/quizzes/progress/', ['quizzes_userprogress', 'quizzes_question'])
+        self.assertIndexed('get', '/api/quizzes/progress/?fields=score,quiz.id', ['quizzes_userprogress'])
+        self.assertIndexed('get', '/api/quizzes/progress/by_language/?language=es', ['quizzes_userprogress'])
+
+    def test_submission_answer_cleanup(self):
+        quiz = self.quizzes[0]
+        self.client.post(f'/api/quizzes/{quiz.id}/start/')
+        self.assertIndexed(
+            'post', f'/api/quizzes/{quiz.id}/submit/',
+            ['quizzes_useranswer', 'quizzes_userprogress', 'quizzes_question', 'quizzes_reviewschedule'],
+            data=build_answers(quiz, 2), format='json',
+        )
+
+    def test_review_queue(self):
+        quiz = self.quizzes[0]
+        self.client.post(f'/api/quizzes/{quiz.id}/start/')
+        self.client.post(f'/api/quizzes/{quiz.id}/submit/', build_answers(quiz, 2), format='json')
+        self.assertIndexed('get', '/api/quizzes/progress/review/', ['quizzes_reviewschedule', 'quizzes_question'])
+
+
+@override_settings(AUDIO_SYNTHESIS='queue')
+class AudioJobTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quiz = seed_catalogue(questions_per_quiz=1)[0]
+
+    def create_speech_question(self):
+        return Question.objects.create(
+            quiz=self.quiz, text='Repeat after me', question_type='speech', correct_answer='Hola'
+        )
+
+    def test_saving_speech_question_only_queues_a_job(self):
+        with mock.patch('quizzes.services.TTSService.generate_audio') as generate_audio:
+            question = self.create_speech_question()
+        generate_audio.assert_not_called()
+        self.assertEqual(question.audio_status, Question.AUDIO_PENDING)
+        self.assertEqual(question.audio_job.status, AudioJob.QUEUED)
+
+    def test_worker_generates_audio_and_api_reports_status(self):
+        question = self.create_speech_question()
+        call_command('process_audio_jobs', '--once', stdout=open(os.devnull, 'w'))
+
+        question.refresh_from_db()
+        self.assertEqual(question.audio_status, Question.AUDIO_READY)
+        self.assertTrue(os.path.exists(os.path.join(self.audio_dir, question.audio_url.split('/')[-1])))
+        self.assertEqual(AudioJob.objects.get(question=question).status, AudioJob.DONE)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/quizzes/{self.quiz.id}/')
+        payload = next(q for q in response.data['questions'] if q['id'] == question.id)
+        self.assertEqual((payload['audio_status'], payload['audio_url']), ('ready', question.audio_url))
+
+    @override_settings(AUDIO_JOB_MAX_ATTEMPTS=2, AUDIO_JOB_BACKOFF_SECONDS=30)
+    def test_failures_back_off_then_give_up(self):
+        question = self.create_speech_question()
+        with mock.patch('quizzes.services.TTSService.generate_audio', side_effect=RuntimeError('TTS down')):
+            [job] = AudioJobService.claim()
+            self.assertFalse(AudioJobService.run(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (AudioJob.QUEUED, 1))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertEqual(AudioJobService.claim(), [])
+
+            AudioJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            [job] = AudioJobService.claim()
+            self.assertFalse(AudioJobService.run(job))
+
+        job.refresh_from_db()
+        question.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (AudioJob.FAILED, 'TTS down'))
+        self.assertEqual(question.audio_status, Question.AUDIO_FAILED)
+
+
+@override_settings(AUDIO_SYNTHESIS='queue')
+class AudioCacheTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = seed_catalogue(questions_per_quiz=1)[0]
+
+    def create_question(self, phrase):
+        question = Question.objects.create(
+            quiz=self.quiz, text='Repeat after me', question_type='speech', correct_answer=phrase
+        )
+        AudioJobService.run(AudioJobService.claim()[0])
+        question.refresh_from_db()
+        return question
+
+    def test_same_phrase_is_synthesized_once(self):
+        first = self.create_question('Buenos días')
+        second = self.create_question('  Buenos   días ')
+        other_language = TTSService.generate_audio('Buenos días', 'fr')
+        self.assertEqual(first.audio_url, second.audio_url)
+        self.assertNotEqual(first.audio_url, other_language)
+        # The job stores both formats of the phrase; generate_audio only the default
+        self.assertEqual(get_engine().stats()['calls'], 3)
+        self.assertEqual(len(os.listdir(self.audio_dir)), 3)
+
+    def test_delete_keeps_audio_still_referenced(self):
+        first = self.create_question('Hola')
+        second = self.create_question('Hola')
+        path = os.path.join(self.audio_dir, first.audio_url.split('/')[-1])
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_gc_removes_only_old_orphans(self):
+        kept = self.create_question('Hola')
+        orphan = os.path.join(self.audio_dir, 'orphan.mp3')
+        fresh = os.path.join(self.audio_dir, 'fresh.mp3')
+        for path in (orphan, fresh):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        kept_files = [kept.audio_url.split('/')[-1], kept.audio_url.split('/')[-1].replace('.mp3', '.opus')]
+        old = time.time() - 7200
+        for name in ['orphan.mp3', *kept_files]:
+            os.utime(os.path.join(self.audio_dir, name), (old, old))
+
+        call_command('gc_audio', stdout=open(os.devnull, 'w'))
+        self.assertEqual(sorted(os.listdir(self.audio_dir)), sorted(['fresh.mp3', *kept_files]))
+
+
+class TTSEngineTests(TestCase):
+    @override_settings(TTS_ENGINE='stub')
+    def test_engine_is_shared_and_records_latency(self):
+        engine = get_engine()
+        self.assertIsInstance(engine, StubTTSEngine)
+        self.assertIs(get_engine(), engine)
+
+        engine.synthesize('Hallo', 'de')
+        with mock.patch.object(StubTTSEngine, '_synthesize', side_effect=TimeoutError):
+            with self.assertRaises(TimeoutError):
+                engine.synthesize('Hallo', 'de')
+
+        stats = engine.stats()
+        self.assertEqual((stats['engine'], stats['calls'], stats['failures']), ('stub', 2, 1))
+        self.assertGreaterEqual(stats['max_seconds'], stats['mean_seconds'])
+
+    def test_engine_can_be_selected_by_dotted_path(self):
+        with override_settings(TTS_ENGINE='quizzes.tts.StubTTSEngine', TTS_ENGINE_OPTIONS={'timeout': 3}):
+            engine = get_engine()
+        self.assertIsInstance(engine, StubTTSEngine)
+        self.assertEqual(engine.timeout, 3)
+
+
+@override_settings(AUDIO_SYNTHESIS='queue')
+class BatchSynthesisTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = seed_catalogue(questions_per_quiz=1)[0]
+
+    def test_batch_dedupes_and_isolates_failures(self):
+        def synthesize(text, language_code, voice, audio_format):
+            if text == 'broken':
+                raise RuntimeError('engine error')
+            return b'audio'
+
+        items = [('Hola', 'es'), ('broken', 'es'), (' Hola ', 'es'), ('Adiós', 'es')]
+        with mock.patch.object(StubTTSEngine, '_synthesize', side_effect=synthesize) as engine:
+            urls, errors = TTSService.generate_audio_batch(items, max_workers=4, rate_limit=0)
+
+        # Two phrases in both formats; the broken one stops at its first
+        self.assertEqual(engine.call_count, 5)
+        self.assertEqual(urls[('Hola', 'es')], urls[(' Hola ', 'es')])
+        self.assertIn(('Adiós', 'es'), urls)
+        self.assertEqual(list(errors), [('broken', 'es')])
+
+    def test_run_batch_writes_results_back_in_bulk(self):
+        questions = [
+            Question.objects.create(quiz=self.quiz, text='Repeat', question_type='speech', correct_answer=f'Frase {i}')
+            for i in range(20)
+        ]
+        jobs = AudioJobService.claim(batch_size=50)
+        version = content_cache.get_content_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # One transaction: savepoint, two bulk updates, quiz touch, release
+            with self.assertNumQueries(5):
+                self.assertEqual(AudioJobService.run_batch(jobs, max_workers=8, rate_limit=0), (20, 0))
+
+        self.assertEqual(
+            Question.objects.filter(pk__in=[q.pk for q in questions], audio_status=Question.AUDIO_READY).count(), 20
+        )
+        self.assertFalse(AudioJob.objects.exclude(status=AudioJob.DONE).exists())
+        self.assertGreater(content_cache.get_content_version(), version)
+
+
+class AudioDeliveryTests(TemporaryAudioDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 40
+        self.filename = 'a' * 64 + '.mp3'
+        with open(os.path.join(self.audio_dir, self.filename), 'wb') as f:
+            f.write(self.content)
+        self.url = f'/media/audio/{self.filename}'
+
+    def test_full_response_streams_file_with_immutable_caching(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response.headers['Content-Type'], 'audio/mpeg')
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'], f'bytes */{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(AUDIO_SENDFILE='x-accel-redirect', AUDIO_SENDFILE_PREFIX='/protected-audio/')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/protected-audio/{self.filename}')
+        self.assertEqual(response.content, b'')
+
+    def test_rejects_unknown_and_unsafe_names(self):
+        self.assertEqual(self.client.get('/media/audio/missing.mp3').status_code, 404)
+        self.assertEqual(self.client.get('/media/audio/..%2Fdb.sqlite3').status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+
+class LazyAudioTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quiz = seed_catalogue(questions_per_quiz=1)[0]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_audio_is_synthesized_on_first_request(self):
+        question = Question.objects.create(
+            quiz=self.quiz, text='Repeat', question_type='speech', correct_answer='Guten Tag'
+        )
+        self.assertFalse(AudioJob.objects.exists())
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = client.get(f'/api/quizzes/{self.quiz.id}/').data
+        lazy_url = next(q for q in payload['questions'] if q['id'] == question.id)['audio_url']
+        self.assertEqual(lazy_url, f'/api/quizzes/questions/{question.id}/audio/')
+
+        # A GET stores the URL without invalidating cached content
+        version = content_cache.get_content_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.get(lazy_url)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(content_cache.get_content_version(), version)
+        question.refresh_from_db()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], question.audio_url)
+        self.assertEqual(question.audio_status, Question.AUDIO_READY)
+        self.assertEqual(self.client.get(question.audio_url).status_code, 200)
+
+    def test_engine_failure_returns_503(self):
+        question = Question.objects.create(
+            quiz=self.quiz, text='Repeat', question_type='speech', correct_answer='Guten Tag'
+        )
+        with mock.patch.object(StubTTSEngine, '_synthesize', side_effect=RuntimeError('down')):
+            response = self.client.get(f'/api/quizzes/questions/{question.id}/audio/')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_other_processes_wait_on_the_lock_file(self):
+        # As if another worker were synthesizing the phrase
+        lock = os.path.join(self.audio_dir, f"{TTSService.audio_filename('Hola', 'es', 'mp3')}.lock")
+        with open(lock, 'w') as f:
+            f.write('0')
+        with self.assertRaises(TimeoutError):
+            TTSService.get_or_generate_audio('Hola', 'es', wait=0.3)
+        self.assertEqual(get_engine().stats()['calls'], 0)
+
+        # A lock its process died holding is taken over
+        os.utime(lock, (time.time() - 60, time.time() - 60))
+        self.assertIsNotNone(TTSService.get_or_generate_audio('Hola', 'es', wait=1))
+        self.assertEqual(get_engine().stats()['calls'], 1)
+        self.assertFalse(os.path.exists(lock))
+
+    @override_settings(TTS_ENGINE_OPTIONS={'latency': 0.2})
+    def test_concurrent_first_requests_synthesize_once(self):
+        barrier = threading.Barrier(100)
+        urls = []
+
+        def request_audio():
+            barrier.wait()
+            urls.append(TTSService.get_or_generate_audio('Bonjour tout le monde', 'fr'))
+
+        threads = [threading.Thread(target=request_audio) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(urls), 100)
+        self.assertEqual(len(set(urls)), 1)
+        self.assertEqual(get_engine().stats()['calls'], 1)
+
+
+class AudioFormatTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = seed_catalogue(questions_per_quiz=1)[0]
+        cls.question = Question.objects.create(
+            quiz=cls.quiz, text='Repeat', question_type='speech', correct_answer='Buongiorno'
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = f'/api/quizzes/questions/{self.question.id}/audio/'
+
+    def test_accept_header_negotiation(self):
+        for accept, expected in [
+            ('', 'mp3'),
+            ('*/*', 'mp3'),
+            ('audio/mpeg', 'mp3'),
+            ('audio/ogg; codecs=opus, audio/mpeg', 'opus'),
+            ('audio/ogg;q=0.5, audio/mpeg;q=0.9', 'mp3'),
+            ('audio/webm, audio/ogg, audio/*;q=0.9, */*;q=0.5', 'opus'),
+        ]:
+            with self.subTest(accept=accept):
+                self.assertEqual(negotiate_format(accept), expected)
+
+    def test_format_parameter_selects_variant(self):
+        response = self.client.get(self.url, {'format': 'opus'}, HTTP_ACCEPT='audio/mpeg')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('.opus'))
+        self.assertIn('Accept', response.headers['Vary'])
+        # Compact variants don't replace the default-format audio_url
+        self.question.refresh_from_db()
+        self.assertIsNone(self.question.audio_url)
+
+        audio = self.client.get(response.headers['Location'])
+        self.assertEqual(audio.headers['Content-Type'], 'audio/ogg')
+        self.assertEqual(b''.join(audio.streaming_content), STUB_OGG_PAGE)
+
+        self.assertEqual(self.client.get(self.url, {'format': 'wav'}).status_code, 400)
+
+    def test_falls_back_to_default_format(self):
+        with mock.patch('quizzes.tts.shutil.which', return_value=None), \
+                mock.patch.object(StubTTSEngine, 'native_formats', ('mp3',)):
+            response = self.client.get(self.url, HTTP_ACCEPT='audio/ogg')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('.mp3'))
+        # The MP3 made to transcode from is the one served
+        self.assertEqual(get_engine().stats()['calls'], 1)
+
+    def test_variants_are_transcoded_from_the_stored_file(self):
+        transcoded = b'OggS transcoded'
+        code = self.quiz.language.code
+        with mock.patch.object(StubTTSEngine, 'native_formats', ('mp3',)), \
+                mock.patch('quizzes.services.transcode', return_value=transcoded) as transcode:
+            TTSService.generate_audio('Buongiorno', code)
+            response = self.client.get(self.url, {'format': 'opus'})
+            self.assertEqual(get_engine().stats()['calls'], 1)
+            transcode.assert_called_once_with(STUB_MP3_FRAME, 'opus', '24k', timeout=30)
+            audio = self.client.get(response.headers['Location'])
+            self.assertEqual(b''.join(audio.streaming_content), transcoded)
+
+            # A new bitrate is a new file, not the old one served again
+            with override_settings(AUDIO_FORMATS={'opus': {'bitrate': '32k'}, 'mp3': {'bitrate': '64k'}}):
+                self.assertIsNone(TTSService.cached_audio_url('Buongiorno', code, 'opus'))
+                self.assertNotEqual(TTSService.get_or_generate_audio('Buongiorno', code, audio_format='opus'),
+                                    response.headers['Location'])
+            self.assertEqual(get_engine().stats()['calls'], 1)
+
+            # Batches only wait on the rate limiter for engine calls
+            with mock.patch('quizzes.services.RateLimiter.acquire') as acquire:
+                urls, errors = TTSService.generate_audio_batch([('Ciao', code), ('Buongiorno', code)])
+            self.assertEqual(errors, {})
+            self.assertEqual(acquire.call_count, 1)
+            self.assertEqual(get_engine().stats()['calls'], 2)
+
+            # Transcoded variants count as their phrase's files
+            variant = os.path.join(self.audio_dir, response.headers['Location'].rsplit('/', 1)[1])
+            call_command('gc_audio', '--min-age', '0', stdout=io.StringIO())
+            self.assertTrue(os.path.exists(variant))
+
+    def test_api_lists_sources_most_compact_first(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='learner@example.com', password='pass'))
+        payload = client.get(f'/api/quizzes/{self.quiz.id}/').data
+        sources = next(q for q in payload['questions'] if q['id'] == self.question.id)['audio_sources']
+        self.assertEqual(sources, [
+            {'src': f'{self.url}?format=opus', 'type': 'audio/ogg; codecs=opus'},
+            {'src': f'{self.url}?format=mp3', 'type': 'audio/mpeg'},
+        ])
+
+    def test_report_lists_bytes_saved_per_language(self):
+        TTSService.generate_audio_batch([('Buongiorno', self.quiz.language.code)], rate_limit=0)
+        out = io.StringIO()
+        call_command('audio_report', stdout=out)
+        saved = len(STUB_MP3_FRAME) - len(STUB_OGG_PAGE)
+        self.assertIn(f"{self.quiz.language.name:<12} {1:>8}", out.getvalue())
+        self.assertIn(f"save {saved / 1024:.1f} KiB of {len(STUB_MP3_FRAME) / 1024:.1f} KiB", out.getvalue())
+
+
+class QuizBundleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=3)
+
+    def setUp(self):
+        cache.clear()
+        self.bundles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bundles_dir, ignore_errors=True)
+        settings_override = override_settings(QUIZ_BUNDLES='redirect', QUIZ_BUNDLES_DIR=self.bundles_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        call_command('build_quiz_bundles', stdout=io.StringIO())
+
+    def entry(self, key='es:beginner'):
+        return QuizBundleService.manifest()['bundles'][key]
+
+    def test_build_writes_compressed_bundles_and_manifest(self):
+        self.assertEqual(len(QuizBundleService.manifest()['bundles']), 12)
+        entry = self.entry()
+        path = os.path.join(self.bundles_dir, entry['url'].rsplit('/', 1)[-1])
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), data)
+        self.assertLess(entry['bytes']['gzip'], entry['bytes']['identity'])
+
+        with override_settings(QUIZ_BUNDLES=None):
+            api = self.api.get('/api/quizzes/', {'language': 'es', 'level': 'beginner', 'expand': 'questions'})
+        self.assertEqual(json.loads(data), json.loads(api.content))
+
+        out = io.StringIO()
+        call_command('build_quiz_bundles', stdout=out)
+        self.assertNotIn('written', out.getvalue())
+
+    def test_expanded_list_redirects_to_bundle(self):
+        response = self.api.get('/api/quizzes/', {'language': 'es', 'level': 'beginner', 'expand': 'questions'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], self.entry()['url'])
+        # Summary lists and retrieve stay dynamic
+        self.assertEqual(self.api.get('/api/quizzes/', {'language': 'es', 'level': 'beginner'}).status_code, 200)
+
+        bundle = self.client.get(response.headers['Location'], HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(bundle.headers['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', bundle.headers['Cache-Control'])
+        self.assertEqual(json.loads(gzip.decompress(b''.join(bundle.streaming_content)))['results'][0]['language']['code'], 'es')
+
+    @override_settings(QUIZ_BUNDLES='serve')
+    def test_serve_mode_sends_bundle(self):
+        response = self.api.get(
+            '/api/quizzes/', {'language': 'fr', 'level': 'expert', 'expand': 'questions'},
+            HTTP_ACCEPT_ENCODING='identity'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['results'][0]['level'], 'expert')
+
+    def test_content_edit_rebuilds_only_its_bundle(self):
+        before = QuizBundleService.manifest()['bundles']
+        question = self.quizzes[0].questions.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = 'Edited'
+            question.save()
+
+        after = QuizBundleService.manifest()['bundles']
+        self.assertNotEqual(after['es:beginner']['hash'], before['es:beginner']['hash'])
+        self.assertEqual(after['fr:beginner']['hash'], before['fr:beginner']['hash'])
+        response = self.api.get('/api/quizzes/', {'language': 'es', 'level': 'beginner', 'expand': 'questions'})
+        self.assertEqual(response.headers['Location'], after['es:beginner']['url'])
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_content_edits_compress_fast_until_the_next_full_build(self):
+        question = self.quizzes[0].questions.first()
+        with mock.patch('quizzes.bundles.brotli.compress', wraps=brotli.compress) as compress, \
+                self.captureOnCommitCallbacks(execute=True):
+            question.text = 'Edited'
+            question.save()
+        self.assertEqual(compress.call_args.kwargs['quality'], 5)
+        self.assertEqual(self.entry()['compression'], 'fast')
+
+        out = io.StringIO()
+        call_command('build_quiz_bundles', stdout=out)
+        self.assertEqual(self.entry()['compression'], 'best')
+        self.assertEqual(out.getvalue().count(' written'), 1)
+        path = os.path.join(self.bundles_dir, self.entry()['url'].rsplit('/', 1)[-1])
+        with open(path, 'rb') as f, open(path + '.br', 'rb') as compressed:
+            self.assertEqual(compressed.read(), brotli.compress(f.read(), quality=11))
+
+    def test_stale_bundle_is_not_served(self):
+        # update() skips the signals, so the bundle is now out of date
+        Quiz.objects.filter(pk=self.quizzes[0].pk).update(title='Renamed', updated_at=timezone.now())
+        response = self.api.get('/api/quizzes/', {'language': 'es', 'level': 'beginner', 'expand': 'questions'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+    def test_rolled_back_edits_are_not_rebuilt(self):
+        spanish, french = self.quizzes[0], next(q for q in self.quizzes if q.language.code == 'fr')
+        with mock.patch.object(QuizBundleService, 'build') as build, \
+                self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                question = spanish.questions.first()
+                question.text = 'Rolled back'
+                question.save()
+                raise RuntimeError
+            question = french.questions.first()
+            question.text = 'Committed'
+            question.save()
+        build.assert_called_once_with({('fr', french.level)}, compression='fast')
+
+    def test_manifest_lock_is_shared_through_the_bundles_directory(self):
+        lock = os.path.join(self.bundles_dir, 'manifest.lock')
+        with open(lock, 'w') as f:
+            f.write('0')
+        with mock.patch('quizzes.bundles.time.monotonic', side_effect=[0, 31]), \
+                mock.patch('quizzes.bundles.time.sleep'), self.assertRaises(TimeoutError):
+            QuizBundleService.build()
+
+        # A lock its process died holding is taken over
+        os.utime(lock, (time.time() - 120, time.time() - 120))
+        QuizBundleService.build()
+        self.assertFalse(os.path.exists(lock))
+
+    def test_prune_keeps_files_in_the_manifest(self):
+        stale = os.path.join(self.bundles_dir, f"es-beginner.{'0' * 16}.json")
+        with open(stale, 'wb') as f:
+            f.write(b'[]')
+        current = set(os.listdir(self.bundles_dir)) - {os.path.basename(stale)}
+
+        self.assertEqual(QuizBundleService.prune(min_age=0)[0], 1)
+        self.assertEqual(set(os.listdir(self.bundles_dir)), current)
+
+
+class PaginationAndFieldSelectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        seed_catalogue(questions_per_quiz=5)
+        languages = Language.objects.bulk_create([
+            Language(name=f'Language {i}', code=f'l{i}', flag_emoji='') for i in range(36)
+        ])
+        Quiz.objects.bulk_create([
+            Quiz(language=language, level=level, title=f'{language.name} {level}', description='')
+            for language in languages
+            for level in ['beginner', 'intermediate', 'expert']
+        ])
+        UserProgress.objects.bulk_create([
+            UserProgress(user=cls.user, quiz=quiz, score=i % 100) for i, quiz in enumerate(Quiz.objects.all())
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_progress_is_paginated_by_cursor(self):
+        seen, url, pages = [], '/api/quizzes/progress/', 0
+        while url:
+            response = self.client.get(url, {'fields': 'id,score'} if not pages else None)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            url, pages = response.data['next'], pages + 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(seen), sorted(UserProgress.objects.values_list('id', flat=True)))
+
+    def test_dashboard_fields_need_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/quizzes/progress/', {'fields': 'score,quiz.id', 'page_size': 200})
+        self.assertEqual(len(response.data['results']), 120)
+        self.assertEqual(set(response.data['results'][0]), {'score', 'quiz'})
+        self.assertEqual(set(response.data['results'][0]['quiz']), {'id'})
+
+    def test_omit_drops_nested_fields(self):
+        response = self.client.get('/api/quizzes/progress/', {'omit': 'quiz.questions,last_attempted'})
+        row = response.data['results'][0]
+        self.assertNotIn('last_attempted', row)
+        self.assertEqual(set(row['quiz']), {'id', 'language', 'level', 'title', 'description'})
+
+    def test_fields_on_cached_quiz_detail(self):
+        quiz = Quiz.objects.filter(language__code='es').first()
+        full = self.client.get(f'/api/quizzes/{quiz.id}/')
+        sparse = self.client.get(f'/api/quizzes/{quiz.id}/', {'fields': 'id,title,questions.id'})
+        self.assertIn('language', full.data)
+        self.assertEqual(set(sparse.data), {'id', 'title', 'questions'})
+        self.assertEqual(set(sparse.data['questions'][0]), {'id'})
+        self.assertNotEqual(full.headers['ETag'], sparse.headers['ETag'])
+
+    def test_page_size_is_capped(self):
+        Quiz.objects.bulk_create([
+            Quiz(language=language, level=f'level {i}', title='', description='')
+            for language in Language.objects.all()[:20]
+            for i in range(5)
+        ])
+        response = self.client.get('/api/quizzes/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 200)
+        response = self.client.get('/api/quizzes/languages/', {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+
+class ProgressByLanguageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        other = User.objects.create_user(username='other@example.com', password='pass')
+        quizzes = {(quiz.language.code, quiz.level): quiz for quiz in seed_catalogue(questions_per_quiz=1)}
+        UserProgress.objects.bulk_create([
+            UserProgress(user=cls.user, quiz=quizzes['es', 'beginner'], score=100, completed=True),
+            UserProgress(user=cls.user, quiz=quizzes['es', 'expert'], score=40, completed=False),
+            UserProgress(user=cls.user, quiz=quizzes['fr', 'beginner'], score=70, completed=True),
+            UserProgress(user=other, quiz=quizzes['es', 'intermediate'], score=10, completed=True),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_summary_by_language_code(self):
+        # Language codes load once, then one grouped query per request
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/quizzes/progress/by_language/', {'language': 'es,de'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'language': 'es', 'attempted': 2, 'completed': 1, 'average_score': 70.0},
+            {'language': 'de', 'attempted': 0, 'completed': 0, 'average_score': None},
+        ])
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/quizzes/progress/by_language/', {'language': 'fr'})
+        self.assertEqual(response.data[0]['completed'], 1)
+
+    def test_unknown_or_missing_language(self):
+        response = self.client.get('/api/quizzes/progress/by_language/', {'language': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Unknown language code(s): 1')
+        self.assertEqual(self.client.get('/api/quizzes/progress/by_language/').status_code, 400)
+
+    def test_new_language_is_picked_up(self):
+        self.client.get('/api/quizzes/progress/by_language/', {'language': 'es'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Language.objects.create(name='Portuguese', code='pt', flag_emoji='')
+        response = self.client.get('/api/quizzes/progress/by_language/', {'language': 'pt'})
+        self.assertEqual(response.status_code, 200)
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=4)
+        cls.spanish = [quiz for quiz in cls.quizzes if quiz.language.code == 'es']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, quiz, correct):
+        self.client.post(f'/api/quizzes/{quiz.id}/start/')
+        return self.client.post(f'/api/quizzes/{quiz.id}/submit/', build_answers(quiz, correct), format='json')
+
+    def stats(self, code='es'):
+        return next(row for row in self.client.get('/api/quizzes/progress/stats/').data['languages']
+                    if row['language'] == code)
+
+    def test_submissions_update_stats_incrementally(self):
+        self.submit(self.spanish[0], correct=4)
+        self.submit(self.spanish[1], correct=1)
+        # Retaking replaces the earlier result rather than adding to it
+        self.submit(self.spanish[1], correct=3)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/quizzes/progress/stats/')
+        spanish = response.data['languages'][0]
+        self.assertEqual(spanish['language'], 'es')
+        self.assertEqual(spanish['quizzes_attempted'], 2)
+        self.assertEqual(spanish['quizzes_completed'], 2)
+        self.assertEqual(spanish['average_score'], 87.5)
+        self.assertEqual((spanish['answers_given'], spanish['correct_answers']), (8, 7))
+        self.assertEqual(spanish['current_streak'], 1)
+        self.assertEqual(response.data['totals']['quizzes_completed'], 2)
+        self.assertEqual(UserStatsService.rebuild(dry_run=True), [])
+
+    def test_streak_counts_consecutive_days(self):
+        today = timezone.localdate()
+        for offset in (3, 2, 1, 0):
+            UserStatsService.apply(self.user.pk, self.spanish[0].language_id, active_on=today - timedelta(days=offset))
+        UserStatsService.apply(self.user.pk, self.quizzes[3].language_id, active_on=today - timedelta(days=5))
+        UserStatsService.apply(self.user.pk, self.quizzes[3].language_id, active_on=today - timedelta(days=3))
+
+        data = self.client.get('/api/quizzes/progress/stats/').data
+        self.assertEqual((self.stats('es')['current_streak'], self.stats('es')['longest_streak']), (4, 4))
+        # A streak that ended before yesterday is no longer current
+        self.assertEqual(self.stats('fr')['current_streak'], 0)
+        self.assertEqual(data['totals']['current_streak'], 4)
+
+    def test_rebuild_reports_and_fixes_drift(self):
+        self.submit(self.spanish[0], correct=2)
+        # Bulk deletes skip the incremental updates
+        UserAnswer.objects.filter(user=self.user).delete()
+
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 drifted values in 1 stats rows'):
+            call_command('rebuild_user_stats', '--check', stdout=out)
+        self.assertIn('answers_given: 4 -> 0', out.getvalue())
+
+        call_command('rebuild_user_stats', stdout=io.StringIO())
+        self.assertEqual(self.stats()['answers_given'], 0)
+        self.assertEqual(self.stats()['quizzes_completed'], 1)
+        call_command('rebuild_user_stats', '--check', stdout=io.StringIO())
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'learner{i}@example.com', password='pass', first_name=f'Learner{i}')
+            for i in range(4)
+        ]
+        cls.quizzes = seed_catalogue(questions_per_quiz=4)
+        cls.beginner, cls.intermediate = [quiz for quiz in cls.quizzes if quiz.language.code == 'es'][:2]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def submit(self, user, quiz, correct):
+        self.client.force_authenticate(user)
+        self.client.post(f'/api/quizzes/{quiz.id}/start/')
+        self.client.post(f'/api/quizzes/{quiz.id}/submit/', build_answers(quiz, correct), format='json')
+
+    def leaderboard(self, user, **params):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/quizzes/progress/leaderboard/', {'language': 'es', **params})
+
+    def test_level_and_language_boards(self):
+        for user, correct in zip(self.users, [4, 2, 4, 1]):
+            self.submit(user, self.beginner, correct)
+        self.submit(self.users[1], self.intermediate, correct=4)
+
+        level = self.leaderboard(self.users[3], level='beginner').data
+        self.assertEqual(level['total'], 4)
+        self.assertEqual(
+            [(row['rank'], row['name'], row['score']) for row in level['top']],
+            [(1, 'Learner0', 100), (1, 'Learner2', 100), (3, 'Learner1', 50), (4, 'Learner3', 25)],
+        )
+        self.assertEqual(level['me'], {'rank': 4, 'score': 25})
+
+        overall = self.leaderboard(self.users[1], limit=2).data
+        self.assertEqual([row['score'] for row in overall['top']], [150, 100])
+        self.assertEqual(overall['me'], {'rank': 1, 'score': 150})
+
+        # Rank and top N don't scan the board
+        with self.assertNumQueries(3):
+            self.leaderboard(self.users[3])
+
+    def test_retake_and_resubmit_move_the_score(self):
+        self.submit(self.users[0], self.beginner, correct=4)
+        self.submit(self.users[1], self.beginner, correct=3)
+        self.submit(self.users[0], self.beginner, correct=1)
+        self.assertEqual(self.leaderboard(self.users[0], level='beginner').data['me'], {'rank': 2, 'score': 25})
+
+        # Starting a retake resets the quiz's score until it's submitted
+        self.client.post(f'/api/quizzes/{self.beginner.id}/start/')
+        self.assertEqual(self.leaderboard(self.users[0]).data['me'], {'rank': 2, 'score': 0})
+        self.assertEqual(LeaderboardService.rebuild(dry_run=True), [])
+
+    def test_buckets_are_updated_lowest_score_first(self):
+        self.submit(self.users[0], self.beginner, correct=4)
+        with CaptureQueriesContext(connection) as queries:
+            self.submit(self.users[0], self.beginner, correct=0)
+        scores = [
+            int(query['sql'].rsplit('"score" = ', 1)[1].split(')')[0])
+            for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "quizzes_leaderboardbucket"')
+        ]
+        self.assertEqual(scores, [0, 100, 0, 100])
+
+    def test_users_without_progress_are_not_ranked(self):
+        self.submit(self.users[0], self.beginner, correct=4)
+        data = self.leaderboard(self.users[1]).data
+        self.assertEqual((data['total'], data['me']), (1, None))
+
+    def test_rejects_unknown_language_and_level(self):
+        self.assertEqual(self.leaderboard(self.users[0], language='xx').status_code, 400)
+        self.assertEqual(self.leaderboard(self.users[0], level='master').status_code, 400)
+
+    def test_rebuild_reports_and_fixes_drift(self):
+        self.submit(self.users[0], self.beginner, correct=4)
+        self.submit(self.users[1], self.beginner, correct=2)
+        # Bulk updates skip the incremental maintenance
+        UserProgress.objects.filter(user=self.users[1]).update(score=75)
+
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '6 drifted leaderboard rows'):
+            call_command('rebuild_leaderboards', '--check', stdout=out)
+        self.assertIn(f"entry ({self.users[1].pk}, {self.beginner.language_id}, 'beginner'): 50 -> 75", out.getvalue())
+
+        call_command('rebuild_leaderboards', '--language', 'es', stdout=io.StringIO())
+        self.assertEqual(self.leaderboard(self.users[1]).data['me'], {'rank': 2, 'score': 75})
+        call_command('rebuild_leaderboards', '--check', stdout=io.StringIO())
+
+
+class ReviewQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.quizzes = seed_catalogue(questions_per_quiz=4)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, quiz, correct):
+        return self.client.post(f'/api/quizzes/{quiz.id}/submit/', build_answers(quiz, correct), format='json')
+
+    def test_submissions_are_logged_and_scheduled(self):
+        quiz = self.quizzes[0]
+        self.submit(quiz, correct=3)
+        self.submit(quiz, correct=4)
+
+        # UserAnswer keeps the latest answer, the log keeps both
+        self.assertEqual(UserAnswer.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(AnswerLog.objects.filter(user=self.user, source=AnswerLog.SOURCE_QUIZ).count(), 8)
+
+        schedules = {s.question_id: s for s in ReviewSchedule.objects.filter(user=self.user)}
+        first, last = [schedules[q.id] for q in quiz.questions.order_by('id')][::3]
+        # Right twice: 1 day, then 6 days, ease growing each time
+        self.assertEqual((first.repetitions, first.interval_days, first.lapses), (2, 6, 0))
+        self.assertAlmostEqual(first.ease, 2.7)
+        # Wrong, then right: starts over
+        self.assertEqual((last.repetitions, last.interval_days, last.lapses), (1, 1, 1))
+        self.assertAlmostEqual(last.ease, 2.28)
+
+    def test_queue_returns_due_questions_across_quizzes(self):
+        self.submit(self.quizzes[0], correct=4)
+        self.submit(self.quizzes[5], correct=0)
+        self.assertEqual(self.client.get('/api/quizzes/progress/review/').data, [])
+
+        # Overdue since yesterday, so ahead of the questions failed just now
+        ReviewSchedule.objects.filter(question__quiz=self.quizzes[0]).update(
+            due_at=timezone.now() - timedelta(days=1)
+        )
+        later = timezone.now() + timedelta(days=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            # The due range scan (joined to the question and quiz) and the options
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/quizzes/progress/review/', {'limit': 6})
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual([item['quiz_id'] for item in response.data[:4]], [self.quizzes[0].id] * 4)
+        self.assertEqual({item['quiz_id'] for item in response.data[4:]}, {self.quizzes[5].id})
+        self.assertEqual(len(response.data[0]['question']['options']), 3)
+        self.assertNotIn('is_correct', response.data[0]['question']['options'][0])
+
+    def test_review_answers_reschedule_without_touching_progress(self):
+        self.submit(self.quizzes[0], correct=0)
+        question = self.quizzes[0].questions.order_by('id').first()
+        option = question.options.get(is_correct=True)
+
+        response = self.client.post('/api/quizzes/progress/review/', [
+            {'question_id': question.id, 'selected_option_id': option.id}
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data[0]['is_correct'], response.data[0]['interval_days']), (True, 1))
+        self.assertEqual(ReviewSchedule.objects.get(user=self.user, question=question).repetitions, 1)
+        self.assertEqual(AnswerLog.objects.filter(source=AnswerLog.SOURCE_REVIEW).count(), 1)
+        self.assertEqual(UserProgress.objects.get(user=self.user, quiz=self.quizzes[0]).score, 0)
+        self.assertFalse(UserAnswer.objects.get(user=self.user, question=question).is_correct)
+
+    def test_review_rejects_unknown_questions(self):
+        response = self.client.post('/api/quizzes/progress/review/', [
+            {'question_id': 999999, 'selected_option_id': 1}
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ContentLoaderTests(TestCase):
+    def setUp(self):
+        self.content_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.content_dir, ignore_errors=True)
+
+    def write(self, name, text):
+        path = os.path.join(self.content_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def document(self, questions):
+        return json.dumps({'version': 1, 'languages': [{
+            'code': 'es', 'name': 'Spanish', 'flag_emoji': '',
+            'quizzes': [{'level': 'beginner', 'title': 'Spanish - Beginner', 'questions': questions}],
+        }]})
+
+    def load(self, *paths, **options):
+        out = io.StringIO()
+        call_command('load_content', *(paths or [self.content_dir]), stdout=out, **options)
+        return out.getvalue()
+
+    def test_load_creates_content_and_reruns_change_nothing(self):
+        self.write('es.json', self.document([
+            {'key': 'hello', 'type': 'multiple_choice', 'text': 'Hello?', 'answer': 'Hola', 'options': ['Hola', 'Ciao']},
+            {'type': 'speech', 'text': 'Say "gracias"', 'answer': 'gracias'},
+        ]))
+        self.load()
+        quiz = Quiz.objects.get(language__code='es', level='beginner')
+        hello = quiz.questions.get(key='hello')
+        self.assertEqual(list(hello.options.order_by('text').values_list('text', 'is_correct')),
+                         [('Ciao', False), ('Hola', True)])
+        # No key: the text is the key. Speech audio is left for later
+        speech = quiz.questions.get(key='Say "gracias"')
+        self.assertEqual((speech.audio_url, speech.audio_status), (None, Question.AUDIO_PENDING))
+
+        version = content_cache.get_content_version()
+        updated_at = Quiz.objects.get(pk=quiz.pk).updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            out = self.load()
+        self.assertIn('questions        0 created       0 updated       0 deleted', out)
+        self.assertEqual(content_cache.get_content_version(), version)
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).updated_at, updated_at)
+
+    def test_changes_update_in_place_and_missing_rows_are_deleted(self):
+        self.write('es.json', self.document([
+            {'key': 'hello', 'type': 'multiple_choice', 'text': 'Hello?', 'answer': 'Hola', 'options': ['Hola', 'Ciao']},
+            {'key': 'bye', 'type': 'multiple_choice', 'text': 'Bye?', 'answer': 'Adiós', 'options': ['Adiós', 'Hola']},
+            {'key': 'thanks', 'type': 'speech', 'text': 'Say it', 'answer': 'gracias'},
+        ]))
+        self.load()
+        quiz = Quiz.objects.get(language__code='es')
+        hello = quiz.questions.get(key='hello')
+        ciao = hello.options.get(text='Ciao')
+        Question.objects.filter(key='thanks').update(audio_url='/media/tts/old.mp3', audio_status=Question.AUDIO_READY)
+
+        self.write('es.json', self.document([
+            {'key': 'hello', 'type': 'multiple_choice', 'text': 'How do you say hello?', 'answer': 'Hola',
+             'options': ['Hola', 'Ciao', 'Salut']},
+            {'key': 'thanks', 'type': 'speech', 'text': 'Say it', 'answer': 'muchas gracias'},
+        ]))
+        version = content_cache.get_content_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.load()
+
+        hello.refresh_from_db()
+        self.assertEqual(hello.text, 'How do you say hello?')
+        self.assertTrue(hello.options.filter(pk=ciao.pk).exists())
+        self.assertEqual(hello.options.count(), 3)
+        self.assertFalse(quiz.questions.filter(key='bye').exists())
+        # A new phrase drops the old recording
+        thanks = quiz.questions.get(key='thanks')
+        self.assertEqual((thanks.audio_url, thanks.audio_status), (None, Question.AUDIO_PENDING))
+        self.assertGreater(content_cache.get_content_version(), version)
+
+        # --keep leaves rows the files no longer have
+        self.write('es.json', self.document([
+            {'key': 'hello', 'type': 'multiple_choice', 'text': 'How do you say hello?', 'answer': 'Hola',
+             'options': ['Hola']},
+        ]))
+        self.load(keep=True)
+        self.assertEqual(quiz.questions.count(), 2)
+        self.assertEqual(hello.options.count(), 1)
+
+    def test_mass_deletes_cost_a_bounded_number_of_queries(self):
+        questions = [
+            {'key': f'q{i}', 'type': 'multiple_choice', 'text': f'Question {i}', 'answer': 'a', 'options': ['a', 'b', 'c']}
+            for i in range(500)
+        ]
+        self.write('es.json', self.document(questions))
+        self.load()
+        self.write('es.json', self.document(questions[:10]))
+
+        version = content_cache.get_content_version()
+        # Without the content receivers muted, every deleted question and
+        # option would cost its own UPDATE of the quiz
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.load()
+        self.assertLess(len(queries), 60)
+        self.assertEqual(Question.objects.count(), 10)
+        self.assertEqual(QuestionOption.objects.count(), 30)
+        self.assertGreater(content_cache.get_content_version(), version)
+
+    def test_unkeyed_rows_are_matched_by_text(self):
+        quiz = seed_catalogue(questions_per_quiz=2)[0]
+        original = set(quiz.questions.values_list('pk', flat=True))
+        self.write('es.json', self.document([
+            {'type': 'multiple_choice', 'text': f"Question {i}", 'answer': '0', 'options': ['0', '1', '2']}
+            for i in range(2)
+        ]))
+        out = self.load()
+        self.assertIn('questions        0 created       2 updated       0 deleted', out)
+        self.assertIn('options          0 created       0 updated       0 deleted', out)
+        self.assertEqual(set(quiz.questions.values_list('pk', flat=True)), original)
+        self.assertEqual(set(quiz.questions.values_list('key', flat=True)), {'Question 0', 'Question 1'})
+
+    def test_csv_and_yaml_match_json(self):
+        self.write('es.csv', (
+            'language,language_name,level,key,type,text,answer,options\n'
+            'es,Spanish,beginner,hello,multiple_choice,Hello?,Hola,Hola|Ciao\n'
+        ))
+        self.load()
+        self.assertEqual(Question.objects.get(key='hello').options.count(), 2)
+        os.remove(os.path.join(self.content_dir, 'es.csv'))
+
+        try:
+            import yaml  # noqa: F401
+        except ImportError:
+            return
+        self.write('es.yaml', (
+            'version: 1\n'
+            'languages:\n'
+            '  - code: es\n'
+            '    name: Spanish\n'
+            '    quizzes:\n'
+            '      - level: beginner\n'
+            '        title: Spanish - Beginner\n'
+            '        questions:\n'
+            "          - {key: hello, type: multiple_choice, text: 'Hello?', answer: Hola, options: [Hola, Ciao]}\n"
+        ))
+        self.assertIn('questions        0 created       0 updated       0 deleted', self.load())
+
+    @override_settings(AUDIO_SYNTHESIS='queue')
+    def test_speech_questions_are_queued(self):
+        self.write('es.json', self.document([{'key': 'thanks', 'type': 'speech', 'text': 'Say it', 'answer': 'gracias'}]))
+        self.load()
+        job = AudioJob.objects.get(question__key='thanks')
+        self.assertEqual(job.status, AudioJob.QUEUED)
+
+    def test_dry_run_and_bad_files(self):
+        self.write('es.json', self.document([{'key': 'a', 'type': 'speech', 'text': 'Say it', 'answer': 'a'}]))
+        self.assertIn('Dry run', self.load(dry_run=True))
+        self.assertFalse(Language.objects.filter(code='es').exists())
+
+        self.write('es.json', self.document([{'key': 'a', 'type': 'essay', 'text': 'Write', 'answer': ''}]))
+        with self.assertRaisesMessage(CommandError, "unknown type 'essay'"):
+            self.load()
+        self.write('es.json', json.dumps({'version': 2, 'languages': []}))
+        with self.assertRaisesMessage(CommandError, 'version: 1'):
+            self.load()
+
+    def test_bundled_catalogue(self):
+        call_command('populate_quizzes', stdout=io.StringIO())
+        self.assertEqual(Quiz.objects.count(), 12)
+        self.assertEqual(Question.objects.count(), 24)
+
+
+class ProgressTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'learner{i}@example.com', password='pass') for i in range(3)]
+        cls.quizzes = seed_catalogue(questions_per_quiz=2)
+
+    def setUp(self):
+        self.transfer_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.transfer_dir, ignore_errors=True)
+        client = APIClient()
+        for user, quiz in [(self.users[0], self.quizzes[0]), (self.users[0], self.quizzes[4]),
+                           (self.users[1], self.quizzes[1])]:
+            client.force_authenticate(user)
+            client.post(f'/api/quizzes/{quiz.id}/start/')
+            client.post(f'/api/quizzes/{quiz.id}/submit/', build_answers(quiz, 1), format='json')
+        UserProgress.objects.filter(user=self.users[1]).update(last_attempted=timezone.now() - timedelta(days=30))
+
+    def export(self, table, name, *args):
+        path = os.path.join(self.transfer_dir, name)
+        call_command('export_progress', table, '--output', path, *args, stdout=io.StringIO())
+        return path
+
+    def snapshot(self):
+        return (
+            sorted(UserProgress.objects.values_list('user_id', 'quiz_id', 'score', 'completed', 'last_attempted', 'created_at')),
+            sorted(UserAnswer.objects.values_list('user_id', 'question_id', 'selected_option_id', 'is_correct', 'created_at')),
+            sorted(UserLanguageStats.objects.values_list('user_id', 'language_id', 'quizzes_attempted', 'answers_given')),
+            sorted(LeaderboardEntry.objects.values_list('user_id', 'language_id', 'level', 'score')),
+        )
+
+    def test_round_trip_restores_rows_and_derived_data(self):
+        for format in ('ndjson', 'csv'):
+            before = self.snapshot()
+            progress = self.export('progress', f'progress.{format}')
+            answers = self.export('answers', f'answers.{format}')
+            UserProgress.objects.all().delete()
+            UserAnswer.objects.all().delete()
+            UserLanguageStats.objects.all().delete()
+            LeaderboardEntry.objects.all().delete()
+
+            call_command('import_progress', 'answers', answers, stdout=io.StringIO())
+            call_command('import_progress', 'progress', progress, stdout=io.StringIO())
+            self.assertEqual(self.snapshot(), before)
+            # Upserts: importing again changes nothing
+            call_command('import_progress', 'progress', progress, stdout=io.StringIO())
+            self.assertEqual(self.snapshot(), before)
+
+    def test_export_filters(self):
+        def exported(*args):
+            with open(self.export('progress', 'progress.ndjson', *args), encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+
+        self.assertEqual(len(exported()), 3)
+        self.assertEqual({row['user'] for row in exported('--user', 'learner1@example.com')}, {'learner1@example.com'})
+        self.assertEqual([row['language'] for row in exported('--language', self.quizzes[4].language.code)],
+                         [self.quizzes[4].language.code])
+        recent = exported('--since', str(timezone.localdate() - timedelta(days=7)))
+        self.assertEqual({row['user'] for row in recent}, {'learner0@example.com'})
+        older = exported('--until', str(timezone.localdate() - timedelta(days=30)))
+        self.assertEqual({row['user'] for row in older}, {'learner1@example.com'})
+        with self.assertRaisesMessage(CommandError, 'not a date'):
+            exported('--since', 'last week')
+
+    def test_interrupted_import_resumes(self):
+        path = self.export('answers', 'answers.ndjson')
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 6)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"user": \n')
+        UserAnswer.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, 'continue after row 6'):
+            call_command('import_progress', 'answers', path, '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(UserAnswer.objects.count(), 6)
+        with open(f'{path}.checkpoint', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['rows'], 6)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines + [lines[0].replace('learner0', 'nobody')])
+        out = io.StringIO()
+        call_command('import_progress', 'answers', path, '--resume', stdout=out)
+        self.assertIn('Resuming after row 6', out.getvalue())
+        self.assertIn('Imported 0 answers rows, skipped 1', out.getvalue())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', password='pass')
+        cls.admin = User.objects.create_user(username='admin@example.com', password='pass', is_staff=True)
+        cls.quizzes = seed_catalogue(questions_per_quiz=5)
+
+    def setUp(self):
+        cache.clear()
+        perf.reset_perf_stats()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get('/api/quizzes/')
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertEqual(perf.perf_stats()['routes'], {})
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_sampled_requests_are_timed_per_route(self):
+        with self.assertLogs('quizzes.perf', 'INFO') as logs:
+            response = self.client.get('/api/quizzes/', {'expand': 'questions'})
+            self.client.get('/api/quizzes/')
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['route'], line['status']), ('GET quiz-list', 200))
+        self.assertGreater(line['queries'], 0)
+        self.assertGreater(line['serialize_ms'], 0)
+        self.assertEqual(line['bytes'], len(response.content))
+
+        with self.assertLogs('quizzes.perf', 'INFO'):
+            self.client.post(f'/api/quizzes/{self.quizzes[0].id}/submit/', build_answers(self.quizzes[0], 2), format='json')
+            self.assertEqual(self.client.get('/api/quizzes/perf-stats/').status_code, 403)
+            self.client.force_authenticate(self.admin)
+            routes = self.client.get('/api/quizzes/perf-stats/').data['routes']
+        self.assertEqual(routes['GET quiz-list']['count'], 2)
+        self.assertEqual(routes['POST quiz-submit']['count'], 1)
+        total = routes['GET quiz-list']['total_ms']
+        self.assertLessEqual(total['p50'], total['p99'])
+        self.assertLessEqual(total['p99'], total['max'])
+
+    def test_percentiles_come_from_buckets(self):
+        histogram = perf.Histogram()
+        for ms in range(1, 101):
+            histogram.add(ms)
+        for p in perf.PERCENTILES:
+            self.assertAlmostEqual(histogram.percentile(p), p, delta=p * 0.1)
+        self.assertEqual(histogram.percentile(100), 100)
+
+
+class MetricsTests(TemporaryAudioDirMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='learner@example.com', email='learner@example.com', password='pass')
+        cls.quiz = seed_catalogue(questions_per_quiz=4)[0]
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def value(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_submissions_are_counted(self):
+        labels = {'language': self.quiz.language.code, 'level': self.quiz.level}
+        before = (self.value('quiz_submissions_total', **labels), self.value('quiz_answers_per_submission_sum'))
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/quizzes/{self.quiz.id}/submit/', build_answers(self.quiz, 2), format='json')
+
+        self.assertEqual(self.value('quiz_submissions_total', **labels), before[0] + 1)
+        self.assertEqual(self.value('quiz_answers_per_submission_sum'), before[1] + 4)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'quiz_grading_seconds_bucket{', response.content)
+
+    def test_auth_latency_and_token_issuance(self):
+        def login(password):
+            return self.client.post('/api/users/login/', {'email': 'learner@example.com', 'password': password})
+
+        success = self.value('auth_request_seconds_count', endpoint='login', outcome='success')
+        failure = self.value('auth_request_seconds_count', endpoint='login', outcome='failure')
+        issued = {endpoint: self.value('jwt_tokens_issued_total', endpoint=endpoint) for endpoint in ('login', 'refresh')}
+
+        refresh = login('pass').data['tokens']['refresh']
+        login('wrong')
+        self.client.post('/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(self.value('auth_request_seconds_count', endpoint='login', outcome='success'), success + 1)
+        self.assertEqual(self.value('auth_request_seconds_count', endpoint='login', outcome='failure'), failure + 1)
+        self.assertEqual(self.value('jwt_tokens_issued_total', endpoint='login'), issued['login'] + 1)
+        self.assertEqual(self.value('jwt_tokens_issued_total', endpoint='refresh'), issued['refresh'] + 1)
+
+    def test_tts_calls_cache_lookups_and_audio_bytes(self):
+        calls = self.value('tts_synthesis_total', engine='stub', outcome='success')
+        hits, misses = (self.value('tts_cache_lookups_total', result=result) for result in ('hit', 'miss'))
+        served = self.value('audio_bytes_served_total', format='mp3')
+
+        url = TTSService.get_or_generate_audio('Hola', 'es')
+        TTSService.get_or_generate_audio('Hola', 'es')
+        self.assertEqual(self.value('tts_synthesis_total', engine='stub', outcome='success'), calls + 1)
+        self.assertEqual(self.value('tts_cache_lookups_total', result='miss'), misses + 1)
+        self.assertEqual(self.value('tts_cache_lookups_total', result='hit'), hits + 1)
+
+        self.client.get(url)
+        self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(self.value('audio_bytes_served_total', format='mp3'), served + len(STUB_MP3_FRAME) + 10)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_protects_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+    def test_workers_are_aggregated_through_shared_directory(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        worker = "from quizzes.metrics import QUIZ_SUBMISSIONS; QUIZ_SUBMISSIONS.labels('xx', 'expert').inc({})"
+        for count in (2, 3):
+            subprocess.run(
+                [sys.executable, '-c', worker.format(count)], check=True,
+                cwd=os.path.dirname(os.path.dirname(__file__)),
+                env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': metrics_dir},
+            )
+
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': metrics_dir}):
+            response = self.client.get('/metrics')
+        self.assertIn(b'quiz_submissions_total{language="xx",level="expert"} 5.0', response.content)
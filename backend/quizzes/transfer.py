@@ -0,0 +1,284 @@
+"""
+Streaming export and import of user progress and answers.
+
+Rows are written as NDJSON (one JSON object per line) or CSV, with users,
+quizzes and questions named rather than numbered so a file can be loaded
+into another database with the same content:
+
+    progress: user, language, level, score, completed, last_attempted, created_at
+    answers:  user, language, level, question, selected_option, is_correct, created_at
+
+`user` is the username, `question` the question's content key (its text
+for questions without one) and `selected_option` the option's text.
+
+Exports read through a database cursor in chunks and imports work a batch
+at a time, so memory use doesn't grow with the table. Imports upsert on
+(user, quiz) and (user, question), so loading a file twice, or again after
+an interruption, leaves the same rows.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Question, QuestionOption, Quiz, UserAnswer, UserProgress
+from .stats import UserStatsService
+
+User = get_user_model()
+
+COLUMNS = {
+    'progress': ['user', 'language', 'level', 'score', 'completed', 'last_attempted', 'created_at'],
+    'answers': ['user', 'language', 'level', 'question', 'selected_option', 'is_correct', 'created_at'],
+}
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 2000
+
+
+class TransferError(ValueError):
+    pass
+
+
+def parse_when(value, end=False):
+    """
+    A --since/--until bound: a datetime, or a date meaning the start of that
+    day (with end, the start of the next, so the day itself is included).
+    """
+    day = parse_date(value)
+    when = parse_datetime(value) if day is None else datetime.combine(day + timedelta(days=end), time())
+    if when is None:
+        raise TransferError(f"'{value}' is not a date or datetime")
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def export_rows(table, usernames=None, language=None, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the table's rows as dicts of COLUMNS[table], oldest first,
+    fetched `chunk_size` at a time (a server-side cursor where the backend
+    has them).
+    """
+    if table == 'progress':
+        rows = UserProgress.objects.values_list(
+            'user__username', 'quiz__language__code', 'quiz__level',
+            'score', 'completed', 'last_attempted', 'created_at',
+        )
+        quiz, date_field = 'quiz', 'last_attempted'
+    else:
+        rows = UserAnswer.objects.values_list(
+            'user__username', 'question__quiz__language__code', 'question__quiz__level',
+            'question__key', 'question__text', 'selected_option__text', 'is_correct', 'created_at',
+        )
+        quiz, date_field = 'question__quiz', 'created_at'
+
+    if usernames:
+        rows = rows.filter(user__username__in=usernames)
+    if language:
+        rows = rows.filter(**{f'{quiz}__language__code': language})
+    if since:
+        rows = rows.filter(**{f'{date_field}__gte': since})
+    if until:
+        rows = rows.filter(**{f'{date_field}__lt': until})
+
+    for values in rows.order_by('pk').iterator(chunk_size=chunk_size):
+        if table == 'answers':
+            key, text, *rest = values[3:]
+            values = values[:3] + (key or text, *rest)
+        yield {
+            column: value.isoformat() if isinstance(value, datetime) else value
+            for column, value in zip(COLUMNS[table], values)
+        }
+
+
+def write_rows(table, rows, stream, format) -> int:
+    """
+    Write rows from export_rows() to a text stream. Returns how many.
+    """
+    count = 0
+    if format == 'csv':
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(COLUMNS[table])
+        for row in rows:
+            writer.writerow([
+                ('true' if value else 'false') if isinstance(value, bool) else ('' if value is None else value)
+                for value in row.values()
+            ])
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def read_rows(table, stream, format):
+    """
+    Yield rows of a file written by write_rows(), typed as export_rows()
+    yields them.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        missing = set(COLUMNS[table]) - set(reader.fieldnames or [])
+        if missing:
+            raise TransferError(f"CSV header lacks {', '.join(sorted(missing))}")
+        for line, row in enumerate(reader, start=2):
+            try:
+                yield clean_row(table, row)
+            except (KeyError, ValueError) as e:
+                raise TransferError(f"line {line}: {e}")
+    else:
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                yield clean_row(table, json.loads(text))
+            except (KeyError, TypeError, ValueError) as e:
+                raise TransferError(f"line {line}: {e}")
+
+
+def clean_row(table, row) -> dict:
+    def flag(value):
+        return value if isinstance(value, bool) else str(value).lower() in ('true', '1')
+
+    def when(value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"bad timestamp '{value}'")
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    cleaned = {
+        'user': row['user'],
+        'language': row['language'],
+        'level': row['level'],
+        'created_at': when(row['created_at']),
+    }
+    if table == 'progress':
+        cleaned.update(
+            score=int(row['score']),
+            completed=flag(row['completed']),
+            last_attempted=when(row['last_attempted']),
+        )
+    else:
+        cleaned.update(
+            question=row['question'],
+            selected_option=row['selected_option'] or None,
+            is_correct=flag(row['is_correct']),
+        )
+    return cleaned
+
+
+class TransferService:
+    @staticmethod
+    def import_rows(table, rows) -> dict:
+        """
+        Upsert one batch of rows from read_rows() in a transaction and
+        recount the stats of the users it touched. Rows naming a user, quiz
+        or question this database doesn't have are skipped. Returns
+        {'imported', 'skipped', 'language_ids'}.
+        """
+        users = dict(User.objects.filter(
+            username__in={row['user'] for row in rows}
+        ).values_list('username', 'pk'))
+        quizzes = {
+            (code, level): (pk, language_id)
+            for pk, language_id, code, level in Quiz.objects.filter(
+                language__code__in={row['language'] for row in rows}
+            ).values_list('pk', 'language_id', 'language__code', 'level')
+        }
+
+        with transaction.atomic():
+            if table == 'progress':
+                records = TransferService._import_progress(rows, users, quizzes)
+            else:
+                records = TransferService._import_answers(rows, users, quizzes)
+            user_ids = {user_id for user_id, *_ in records}
+            if user_ids:
+                # Bulk upserts skip the signals that keep these in step
+                UserStatsService.rebuild(list(user_ids))
+
+        return {
+            'imported': len(records),
+            'skipped': len(rows) - len(records),
+            'language_ids': {language_id for *_, language_id in records.values()} if table == 'progress' else set(),
+        }
+
+    @staticmethod
+    def _import_progress(rows, users, quizzes) -> dict:
+        records = {}
+        for row in rows:
+            user_id = users.get(row['user'])
+            quiz = quizzes.get((row['language'], row['level']))
+            if user_id is not None and quiz is not None:
+                # Later rows win, as they would have in the source table
+                records[user_id, quiz[0]] = (row, quiz[1])
+        if not records:
+            return records
+
+        progress = [
+            UserProgress(user_id=user_id, quiz_id=quiz_id, score=row['score'], completed=row['completed'])
+            for (user_id, quiz_id), (row, _) in records.items()
+        ]
+        UserProgress.objects.bulk_create(
+            progress, update_conflicts=True, unique_fields=['user', 'quiz'], update_fields=['score', 'completed'],
+        )
+        # Inserts stamp auto_now fields with the current time; put the
+        # file's timestamps back
+        stored = {
+            (user_id, quiz_id): pk for pk, user_id, quiz_id in UserProgress.objects.filter(
+                user_id__in={user_id for user_id, _ in records}, quiz_id__in={quiz_id for _, quiz_id in records},
+            ).values_list('pk', 'user_id', 'quiz_id')
+        }
+        for item in progress:
+            row = records[item.user_id, item.quiz_id][0]
+            item.pk = stored[item.user_id, item.quiz_id]
+            item.last_attempted, item.created_at = row['last_attempted'], row['created_at']
+        UserProgress.objects.bulk_update(progress, ['last_attempted', 'created_at'])
+        return records
+
+    @staticmethod
+    def _import_answers(rows, users, quizzes) -> dict:
+        quiz_ids = {(code, level): pk for (code, level), (pk, _) in quizzes.items()}
+        names = {row['question'] for row in rows}
+        questions = {}
+        for pk, quiz_id, key, text in Question.objects.filter(quiz_id__in=quiz_ids.values()).filter(
+            Q(key__in=names) | Q(key='', text__in=names)
+        ).values_list('pk', 'quiz_id', 'key', 'text'):
+            questions[quiz_id, key or text] = pk
+        options = {
+            (question_id, text): pk for pk, question_id, text in QuestionOption.objects.filter(
+                question_id__in=questions.values(),
+                text__in={row['selected_option'] for row in rows if row['selected_option']},
+            ).values_list('pk', 'question_id', 'text')
+        }
+
+        records = {}
+        for row in rows:
+            user_id = users.get(row['user'])
+            question_id = questions.get((quiz_ids.get((row['language'], row['level'])), row['question']))
+            if user_id is not None and question_id is not None:
+                records[user_id, question_id] = (row, None)
+        if not records:
+            return records
+
+        UserAnswer.objects.bulk_create(
+            [
+                UserAnswer(
+                    user_id=user_id,
+                    question_id=question_id,
+                    # An option renamed since the export leaves the answer without one
+                    selected_option_id=options.get((question_id, row['selected_option'])),
+                    is_correct=row['is_correct'],
+                    created_at=row['created_at'],
+                )
+                for (user_id, question_id), (row, _) in records.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'question'],
+            update_fields=['selected_option', 'is_correct', 'created_at'],
+        )
+        return records
@@ -0,0 +1,227 @@
+"""
+Pluggable text-to-speech engines.
+
+settings.TTS_ENGINE picks the engine by name ('gtts', 'google', 'stub') or
+by dotted path to a TTSEngine subclass; settings.TTS_ENGINE_OPTIONS is
+passed to its constructor. Engines are created once per process and reused,
+so clients with expensive setup (the Google Cloud gRPC client) are built
+once instead of on every call.
+
+Engines produce MP3 and, where the service supports it, Ogg Opus; any other
+format in settings.AUDIO_FORMATS is transcoded with ffmpeg from audio the
+engine already produced (see TTSService.generate_audio), so each phrase
+costs one engine call however many formats are stored.
+"""
+import io
+import logging
+import shutil
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .metrics import TTS_SYNTHESIS, TTS_SYNTHESIS_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Smallest valid MPEG-1 Layer III frame header, used by the offline stub engine
+STUB_MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+# Ogg page header, the stub engine's Opus output
+STUB_OGG_PAGE = b'OggS\x00\x02' + b'\x00' * 52
+
+# MIME types of the formats engines can produce, as used in <source type>
+FORMAT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'opus': 'audio/ogg; codecs=opus',
+}
+
+# ffmpeg encoder arguments and container for each format
+FFMPEG_ENCODERS = {
+    'mp3': (['-c:a', 'libmp3lame'], 'mp3'),
+    'opus': (['-c:a', 'libopus', '-application', 'voip'], 'ogg'),
+}
+
+
+def transcode(audio: bytes, audio_format: str, bitrate: str = None, timeout: float = 30) -> bytes:
+    """
+    Re-encode audio to `audio_format` with ffmpeg, mono at `bitrate`.
+    """
+    binary = getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+    if shutil.which(binary) is None:
+        raise RuntimeError(f"ffmpeg is needed to produce {audio_format} audio but '{binary}' was not found")
+    encoder, container = FFMPEG_ENCODERS[audio_format]
+    command = [binary, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-vn', '-ac', '1', *encoder]
+    if bitrate:
+        command += ['-b:a', str(bitrate)]
+    command += ['-f', container, 'pipe:1']
+    result = subprocess.run(command, input=audio, capture_output=True, timeout=timeout)
+    if result.returncode:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+class TTSEngine:
+    """
+    Base class for engines. Subclasses implement _synthesize() for their
+    native_formats; callers use synthesize(), which records per-engine call
+    counts and latency.
+    """
+    name = 'base'
+    native_formats = ('mp3',)
+
+    def __init__(self, timeout=10, **options):
+        self.timeout = timeout
+        self.options = options
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+
+    def synthesize(self, text: str, language_code: str, voice: str = '', audio_format: str = 'mp3') -> bytes:
+        if audio_format not in self.native_formats:
+            raise ValueError(f"The {self.name} engine can't produce {audio_format} audio; transcode its output")
+        start = time.perf_counter()
+        failed = False
+        try:
+            return self._synthesize(text, language_code, voice, audio_format)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            TTS_SYNTHESIS.labels(self.name, 'failure' if failed else 'success').inc()
+            TTS_SYNTHESIS_SECONDS.labels(self.name).observe(elapsed)
+            with self._stats_lock:
+                self._stats['calls'] += 1
+                self._stats['failures'] += failed
+                self._stats['total_seconds'] += elapsed
+                self._stats['max_seconds'] = max(self._stats['max_seconds'], elapsed)
+            logger.debug("%s synthesized %d chars in %.3fs", self.name, len(text), elapsed)
+
+    def _synthesize(self, text: str, language_code: str, voice: str, audio_format: str) -> bytes:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['engine'] = self.name
+        stats['mean_seconds'] = stats['total_seconds'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+
+class GTTSEngine(TTSEngine):
+    name = 'gtts'
+
+    def _synthesize(self, text, language_code, voice, audio_format):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=language_code, timeout=self.timeout).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class GoogleCloudTTSEngine(TTSEngine):
+    name = 'google'
+    native_formats = ('mp3', 'opus')
+
+    # Google Cloud expects a regional code; the app stores bare language codes
+    REGIONAL_CODES = {
+        'es': 'es-ES',
+        'fr': 'fr-FR',
+        'de': 'de-DE',
+        'it': 'it-IT',
+        'en': 'en-US',
+    }
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google.cloud import texttospeech
+                    self._client = texttospeech.TextToSpeechClient()
+        return self._client
+
+    def _synthesize(self, text, language_code, voice, audio_format):
+        from google.cloud import texttospeech
+
+        voice_params = texttospeech.VoiceSelectionParams(
+            language_code=self.REGIONAL_CODES.get(language_code.lower(), language_code),
+            name=voice or None,
+            ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL
+        )
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=(
+                texttospeech.AudioEncoding.OGG_OPUS if audio_format == 'opus'
+                else texttospeech.AudioEncoding.MP3
+            )
+        )
+        response = self.client.synthesize_speech(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=voice_params,
+            audio_config=audio_config,
+            timeout=self.timeout
+        )
+        return response.audio_content
+
+
+class StubTTSEngine(TTSEngine):
+    """
+    Offline engine for tests and local development: returns a silent frame.
+    The latency option simulates a slow remote engine for benchmarks.
+    """
+    name = 'stub'
+    native_formats = ('mp3', 'opus')
+
+    def __init__(self, latency=0.0, **options):
+        super().__init__(**options)
+        self.latency = latency
+
+    def _synthesize(self, text, language_code, voice, audio_format):
+        if self.latency:
+            time.sleep(self.latency)
+        return STUB_OGG_PAGE if audio_format == 'opus' else STUB_MP3_FRAME
+
+
+ENGINES = {
+    'gtts': GTTSEngine,
+    'google': GoogleCloudTTSEngine,
+    'stub': StubTTSEngine,
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name: str = None) -> TTSEngine:
+    """
+    Return the shared engine instance, the configured one by default.
+    """
+    name = name or getattr(settings, 'TTS_ENGINE', 'gtts')
+    engine = _engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                engine_class = ENGINES[name] if name in ENGINES else import_string(name)
+                engine = engine_class(**getattr(settings, 'TTS_ENGINE_OPTIONS', {}))
+                _engines[name] = engine
+    return engine
+
+
+def engine_stats() -> list:
+    return [engine.stats() for engine in list(_engines.values())]
+
+
+@receiver(setting_changed)
+def reset_engines(setting, **kwargs):
+    if setting in ('TTS_ENGINE', 'TTS_ENGINE_OPTIONS'):
+        with _engines_lock:
+            _engines.clear()
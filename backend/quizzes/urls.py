@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import audio, views
 
 router = DefaultRouter()
 router.register(r'languages', views.LanguageViewSet)
@@ -8,5 +8,6 @@ router.register(r'progress', views.UserProgressViewSet, basename='progress')
 router.register(r'', views.QuizViewSet)
 
 urlpatterns = [
+    path('questions/<int:pk>/audio/', audio.question_audio, name='question-audio'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -1,38 +1,14 @@
-from google.cloud import texttospeech
-import os
-from django.conf import settings
+from .tts import get_engine
 
-def generate_speech(text, language_code):
+def generate_speech(text, language_code, audio_format='mp3'):
     """
     Generate speech from text using Google Cloud Text-to-Speech API
-    Returns the audio content as base64 encoded string
-    """
-    # Initialize the client
-    client = texttospeech.TextToSpeechClient()
-
-    # Set the text input to be synthesized
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-
-    # Build the voice request
-    voice = texttospeech.VoiceSelectionParams(
-        language_code=language_code,
-        ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL
-    )
+    Returns the raw audio content, MP3 unless audio_format='opus'
 
-    # Select the type of audio file you want returned
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
-    )
-
-    # Perform the text-to-speech request
-    response = client.synthesize_speech(
-        input=synthesis_input,
-        voice=voice,
-        audio_config=audio_config
-    )
-
-    # Return the audio content
-    return response.audio_content
+    Uses the shared engine from quizzes.tts, so the gRPC client is created
+    once per process rather than on every call
+    """
+    return get_engine('google').synthesize(text, language_code, audio_format=audio_format)
 
 def get_language_code(language):
     """
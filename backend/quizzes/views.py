@@ -1,32 +1,100 @@
 from django.shortcuts import render, get_object_or_404
+from django.db.models import Avg, Count, Max, Prefetch, Q
+from django.http import HttpResponseRedirect
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.db import transaction
 from django.utils import timezone
-from .models import Language, Quiz, Question, QuestionOption, UserProgress, UserAnswer
+from . import cache as content_cache
+from . import metrics, perf
+from .bundles import QuizBundleService, bundle_response, expanded_quizzes
+from .conditional import ConditionalContentMixin
+from .grading import GradingService
+from .leaderboards import ALL_LEVELS, LeaderboardService
+from .models import AnswerLog, Language, Quiz, Question, QuestionOption, UserProgress, UserAnswer
+from .reviews import ReviewService
+from .stats import UserStatsService
 from .serializers import (
-    LanguageSerializer, QuizSerializer, QuestionSerializer,
-    UserProgressSerializer, UserAnswerSerializer,
-    QuizSubmissionSerializer, QuizResultSerializer
+    LanguageSerializer, QuizSerializer, QuizSummarySerializer, QuestionSerializer,
+    UserProgressSerializer, UserAnswerSerializer, ReviewItemSerializer,
+    QuizSubmissionSerializer, QuizResultSerializer, field_requested
 )
 import requests
+import time
 from django.conf import settings
 
 # Create your views here.
 
-class LanguageViewSet(viewsets.ReadOnlyModelViewSet):
+class SparseFieldsetsViewMixin:
+    """
+    Apply ?fields= / ?omit= to the serializer of GET responses, and paginate
+    lists with the default (cursor) pagination.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.request.query_params.get('fields'))
+            kwargs.setdefault('omit', self.request.query_params.get('omit'))
+        return super().get_serializer(*args, **kwargs)
+
+    def field_requested(self, path):
+        params = self.request.query_params
+        return field_requested(path, params.get('fields'), params.get('omit'))
+
+    def paginated_data(self, queryset):
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data).data
+
+    def page_variant(self, request):
+        # Cached pages embed absolute next/previous links, so the whole URL
+        # (host, filters, cursor, page size, field selection) is the variant
+        return request.build_absolute_uri()
+
+class LanguageViewSet(SparseFieldsetsViewMixin, ConditionalContentMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
     permission_classes = [IsAuthenticated]
+    ordering = 'id'
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(
+            request, 'language-list', self.page_variant(request),
+            lambda: self.paginated_data(self.get_queryset())
+        )
 
-class QuizViewSet(viewsets.ReadOnlyModelViewSet):
+class QuizViewSet(SparseFieldsetsViewMixin, ConditionalContentMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
     permission_classes = [IsAuthenticated]
+    ordering = 'id'
+
+    def expands_questions(self):
+        """
+        Full question payloads are only sent on retrieve, or on list when the
+        client explicitly asks for them with ?expand=questions.
+        """
+        if self.action == 'retrieve':
+            return True
+        if self.action == 'list':
+            expand = self.request.query_params.get('expand', '')
+            return 'questions' in expand.split(',')
+        return False
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not self.expands_questions():
+            return QuizSummarySerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        queryset = Quiz.objects.all()
+        queryset = Quiz.objects.select_related('language')
+        if self.expands_questions():
+            if self.field_requested('questions'):
+                queryset = expanded_quizzes()
+        elif self.action == 'list':
+            queryset = queryset.annotate(question_count=Count('questions'))
+
         language = self.request.query_params.get('language', None)
         level = self.request.query_params.get('level', None)
         
@@ -37,6 +105,73 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        variant = self.page_variant(request)
+        if (
+            params.get('language') and params.get('level') and self.expands_questions()
+            and not {'cursor', 'page_size', 'fields', 'omit'} & set(params)
+        ):
+            response = self.bundle_response(request, params['language'], params['level'], variant)
+            if response is not None:
+                return response
+        return self.conditional_get(
+            request, 'quiz-list', variant,
+            lambda: self.paginated_data(self.filter_queryset(self.get_queryset()))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        params = request.query_params
+        variant = ':'.join([str(kwargs[self.lookup_field]), params.get('fields', ''), params.get('omit', '')])
+        return self.conditional_get(
+            request, 'quiz-detail', variant,
+            lambda: self.get_serializer(self.get_object()).data
+        )
+
+    def bundle_response(self, request, language, level, variant):
+        """
+        Hand a language/level quiz list over to its pre-rendered bundle when
+        QUIZ_BUNDLES is on and the bundle is up to date.
+        """
+        mode = getattr(settings, 'QUIZ_BUNDLES', None)
+        if not mode:
+            return None
+        last_modified = content_cache.get_or_build(
+            'quiz-list-modified', variant,
+            lambda: self.get_last_modified('quiz-list', variant),
+            record_stats=False,
+        )
+        entry = QuizBundleService.current(language, level, last_modified)
+        if entry is None:
+            return None
+        if mode == 'redirect':
+            return HttpResponseRedirect(entry['url'])
+        return bundle_response(request, entry['url'].rsplit('/', 1)[-1])
+
+    def get_last_modified(self, name, variant):
+        queryset = Quiz.objects.all()
+        if name == 'quiz-detail':
+            try:
+                queryset = queryset.filter(pk=variant.split(':', 1)[0])
+            except (TypeError, ValueError):
+                return None
+        else:
+            language = self.request.query_params.get('language')
+            level = self.request.query_params.get('level')
+            if language:
+                queryset = queryset.filter(language__code=language)
+            if level:
+                queryset = queryset.filter(level=level)
+        return queryset.aggregate(last_modified=Max('updated_at'))['last_modified']
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(content_cache.cache_stats())
+
+    @action(detail=False, methods=['get'], url_path='perf-stats', permission_classes=[IsAdminUser])
+    def perf_stats(self, request):
+        return Response(perf.perf_stats())
+
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
         quiz = self.get_object()
@@ -51,9 +186,16 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Reset progress if retaking
         if not created and progress.completed:
-            progress.score = 0
-            progress.completed = False
-            progress.save()
+            with transaction.atomic():
+                UserStatsService.apply(
+                    user.pk, quiz.language_id,
+                    quizzes_completed=-1,
+                    score_total=-progress.score,
+                )
+                LeaderboardService.apply(user.pk, quiz.language_id, quiz.level, -progress.score, create=False)
+                progress.score = 0
+                progress.completed = False
+                progress.save()
 
         serializer = UserProgressSerializer(progress)
         return Response(serializer.data)
@@ -67,61 +209,153 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Delete previous answers for this quiz's questions
-        UserAnswer.objects.filter(
-            user=user,
-            question__quiz=quiz
-        ).delete()
-
-        # Process answers
-        correct_answers = 0
-        total_questions = len(serializer.validated_data)
-
-        for answer_data in serializer.validated_data:
-            question = get_object_or_404(Question, id=answer_data['question_id'])
-            selected_option = get_object_or_404(QuestionOption, id=answer_data['selected_option_id'])
-
-            # Save user's answer
-            user_answer = UserAnswer.objects.create(
-                user=user,
-                question=question,
-                selected_option=selected_option,
-                is_correct=selected_option.is_correct
-            )
+        submission_id = request.headers.get('Idempotency-Key')
+        if submission_id and len(submission_id) > 64:
+            return Response({'error': 'Idempotency-Key must be at most 64 characters'},
+                          status=status.HTTP_400_BAD_REQUEST)
 
-            if selected_option.is_correct:
-                correct_answers += 1
+        start = time.perf_counter()
+        result = GradingService.submit(user, quiz, serializer.validated_data, submission_id=submission_id)
+        metrics.observe_submission(quiz, len(serializer.validated_data), time.perf_counter() - start)
 
-        # Update user progress
-        score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-        progress = UserProgress.objects.get(user=user, quiz=quiz)
-        progress.score = score_percentage
-        progress.completed = True
-        progress.save()
-        
-        result_serializer = QuizResultSerializer(data={
-            'total_questions': total_questions,
-            'correct_answers': correct_answers,
-            'score_percentage': score_percentage,
-            'completed': True
-        })
+        result_serializer = QuizResultSerializer(data=result)
         result_serializer.is_valid()
         return Response(result_serializer.data)
 
-class UserProgressViewSet(viewsets.ReadOnlyModelViewSet):
+class UserProgressViewSet(SparseFieldsetsViewMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = UserProgressSerializer
     permission_classes = [IsAuthenticated]
+    # Matches progress_user_recent_idx, so each page is an index range scan
+    ordering = ('-last_attempted', '-id')
+
+    def get_serializer_class(self):
+        if self.action == 'review':
+            return ReviewItemSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
-        return UserProgress.objects.filter(user=self.request.user)
+        queryset = UserProgress.objects.filter(user=self.request.user).order_by(*self.ordering)
+        # Only join and prefetch the quiz graph the selected fields need;
+        # fields=score,quiz.id costs a single query per page
+        if self.field_requested('quiz.questions'):
+            # Questions by quiz, then id: the quiz_id index's own order, so
+            # the page's questions come back without a sort
+            queryset = queryset.select_related('quiz__language').prefetch_related(
+                Prefetch(
+                    'quiz__questions',
+                    queryset=Question.objects.order_by('quiz', 'id').prefetch_related('options')
+                )
+            )
+        elif self.field_requested('quiz.language'):
+            queryset = queryset.select_related('quiz__language')
+        elif self.field_requested('quiz'):
+            queryset = queryset.select_related('quiz')
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        The user's totals per language and overall, read from their
+        precomputed stats rows.
+        """
+        return Response(UserStatsService.summary(request.user))
 
     @action(detail=False, methods=['get'])
     def by_language(self, request):
+        """
+        Per-language progress summary for ?language=es (or es,fr): quizzes
+        attempted, completed and the average score, aggregated in one
+        grouped query over the user's progress rows.
+        """
         language = request.query_params.get('language')
         if not language:
             return Response({'error': 'Language parameter is required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
-        
-        progress = self.get_queryset().filter(quiz__language=language)
-        serializer = self.get_serializer(progress, many=True)
-        return Response(serializer.data)
+
+        codes = list(dict.fromkeys(code.strip() for code in language.split(',') if code.strip()))
+        known = content_cache.language_ids()
+        unknown = [code for code in codes if code not in known]
+        if unknown:
+            return Response({'error': f"Unknown language code(s): {', '.join(unknown)}"},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        rows = {
+            row['quiz__language_id']: row
+            for row in UserProgress.objects.filter(
+                user=request.user, quiz__language_id__in=[known[code] for code in codes]
+            ).values('quiz__language_id').annotate(
+                attempted=Count('id'),
+                completed=Count('id', filter=Q(completed=True)),
+                average_score=Avg('score'),
+            ).order_by()
+        }
+        summary = []
+        for code in codes:
+            row = rows.get(known[code], {})
+            summary.append({
+                'language': code,
+                'attempted': row.get('attempted', 0),
+                'completed': row.get('completed', 0),
+                'average_score': round(row['average_score'], 1) if row.get('average_score') is not None else None,
+            })
+        return Response(summary)
+
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """
+        The top ?limit= (default 10, at most 100) learners of ?language=es,
+        or of one of its levels with ?level=, and the requesting user's
+        rank. Ranks come from the incrementally kept score buckets, so the
+        cost doesn't grow with the number of users.
+        """
+        language_id = content_cache.language_ids().get(request.query_params.get('language', ''))
+        if language_id is None:
+            return Response({'error': 'A known language code is required'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        level = request.query_params.get('level', ALL_LEVELS)
+        if level and level not in dict(Quiz.LEVEL_CHOICES):
+            return Response({'error': f"Unknown level '{level}'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        me = LeaderboardService.rank(request.user.pk, language_id, level)
+        return Response({
+            'language': request.query_params['language'],
+            'level': level or None,
+            'total': me.pop('total') if me else LeaderboardService.total(language_id, level),
+            'top': LeaderboardService.top(language_id, level, limit),
+            'me': me,
+        })
+
+    @action(detail=False, methods=['get', 'post'])
+    def review(self, request):
+        """
+        GET: the next ?limit= (default 20, at most 100) questions due for
+        review across all quizzes, most overdue first. POST: a list of
+        {'question_id', 'selected_option_id'} review answers, which are
+        graded, logged and rescheduled without touching quiz progress.
+        """
+        if request.method == 'GET':
+            try:
+                limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            except ValueError:
+                return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(self.get_serializer(ReviewService.due(request.user, limit), many=True).data)
+
+        serializer = QuizSubmissionSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user_answers, _ = GradingService.grade_answers(None, serializer.validated_data)
+        with transaction.atomic():
+            schedules = ReviewService.record(request.user, user_answers, source=AnswerLog.SOURCE_REVIEW)
+        return Response([
+            {
+                'question_id': answer.question_id,
+                'is_correct': answer.is_correct,
+                'due_at': schedule.due_at,
+                'interval_days': schedule.interval_days,
+            }
+            for answer, schedule in zip(user_answers, schedules)
+        ])
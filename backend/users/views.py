@@ -4,16 +4,50 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt import views as jwt_views
 from rest_framework_simplejwt.tokens import RefreshToken
+from quizzes.metrics import AUTH_SECONDS, JWT_ISSUED
 from .serializers import UserSerializer
+import functools
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+def timed(endpoint):
+    """
+    Record the view's latency in AUTH_SECONDS, labelled success (2xx),
+    failure (4xx) or error.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                response = view(request, *args, **kwargs)
+                outcome = {2: 'success', 4: 'failure'}.get(response.status_code // 100, 'error')
+                return response
+            finally:
+                AUTH_SECONDS.labels(endpoint, outcome).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def issue_tokens(user, endpoint):
+    refresh = RefreshToken.for_user(user)
+    JWT_ISSUED.labels(endpoint).inc()
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh)
+    }
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@timed('signup')
 def signup(request):
     logger.info("Signup attempt with email: %s", request.data.get('email', 'not provided'))
     
@@ -21,13 +55,9 @@ def signup(request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
             response_data = {
                 'user': serializer.data,
-                'tokens': {
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh)
-                }
+                'tokens': issue_tokens(user, 'signup')
             }
             logger.info("User successfully created with email: %s", user.email)
             return Response(response_data, status=status.HTTP_201_CREATED)
@@ -44,6 +74,7 @@ def signup(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@timed('login')
 def login(request):
     email = request.data.get('email')
     password = request.data.get('password')
@@ -60,13 +91,9 @@ def login(request):
     user = authenticate(username=email, password=password)
     
     if user:
-        refresh = RefreshToken.for_user(user)
         response_data = {
             'user': UserSerializer(user).data,
-            'tokens': {
-                'access': str(refresh.access_token),
-                'refresh': str(refresh)
-            }
+            'tokens': issue_tokens(user, 'login')
         }
         logger.info("Successful login for user: %s", email)
         return Response(response_data)
@@ -76,3 +103,19 @@ def login(request):
         {'error': 'Invalid credentials'},
         status=status.HTTP_401_UNAUTHORIZED
     )
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        if response.status_code == 200:
+            JWT_ISSUED.labels('token').inc()
+        return response
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        if response.status_code == 200:
+            JWT_ISSUED.labels('refresh').inc()
+        return response
@@ -6,7 +6,14 @@ const QuizQuestion = ({ question, onSubmit, showFeedback, isCorrect, userAnswer
   const [audioUrl, setAudioUrl] = useState(null);
 
   useEffect(() => {
-    if (question.audio_url) {
+    // Prefer the most compact format this browser can play
+    const probe = new Audio();
+    const source = (question.audio_sources || []).find(
+      (candidate) => probe.canPlayType(candidate.type) !== ''
+    );
+    if (source) {
+      setAudioUrl(source.src);
+    } else if (question.audio_url) {
       setAudioUrl(question.audio_url);
     }
   }, [question]);
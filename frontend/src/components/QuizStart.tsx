@@ -44,14 +44,14 @@ const QuizStart: React.FC<QuizStartProps> = ({ language, level, onStart, onClose
             });
             console.log('Quiz API response:', response.data);
 
-            if (response.data.length === 0) {
+            if (response.data.results.length === 0) {
                 console.log('No quiz found');
                 setError('No quiz available for this language and level');
                 return;
             }
 
-            console.log('Setting quiz:', response.data[0]);
-            setQuiz(response.data[0]);
+            console.log('Setting quiz:', response.data.results[0]);
+            setQuiz(response.data.results[0]);
         } catch (err) {
             console.error('Error loading quiz:', err);
             setError('Failed to load quiz. Please try again.');
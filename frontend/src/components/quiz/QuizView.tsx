@@ -53,8 +53,8 @@ const QuizView: React.FC = () => {
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      if (response.data.length > 0) {
-        setQuiz(response.data[0]);
+      if (response.data.results.length > 0) {
+        setQuiz(response.data.results[0]);
       } else {
         setError('No quiz found for this language and level');
       }
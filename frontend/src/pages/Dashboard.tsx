@@ -43,28 +43,52 @@ interface UserProgress {
   last_attempted: string;
 }
 
+interface LanguageStats {
+  language: string;
+  quizzes_attempted: number;
+  quizzes_completed: number;
+  average_score: number | null;
+}
+
+interface UserStats {
+  languages: LanguageStats[];
+  totals: {
+    quizzes_attempted: number;
+    quizzes_completed: number;
+    average_score: number | null;
+  };
+}
+
 const Dashboard: React.FC = () => {
   const { user, token } = useAuth();
   const navigate = useNavigate();
   const [loading, setLoading] = useState(true);
   const [progress, setProgress] = useState<UserProgress[]>([]);
   const [languages, setLanguages] = useState<Language[]>([]);
+  const [stats, setStats] = useState<UserStats | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
     const fetchDashboardData = async () => {
       try {
-        const [progressRes, languagesRes] = await Promise.all([
+        const headers = { Authorization: `Bearer ${token}` };
+        // Totals come from the precomputed stats rows; only the latest
+        // attempts are listed, and progress is ordered newest first.
+        const [statsRes, progressRes, languagesRes] = await Promise.all([
+          axios.get('/api/quizzes/progress/stats/', { headers }),
           axios.get('/api/quizzes/progress/', {
-            headers: { Authorization: `Bearer ${token}` }
+            headers,
+            params: {
+              fields: 'id,score,completed,last_attempted,quiz.id,quiz.title,quiz.level,quiz.language',
+              page_size: 3
+            }
           }),
-          axios.get('/api/quizzes/languages/', {
-            headers: { Authorization: `Bearer ${token}` }
-          })
+          axios.get('/api/quizzes/languages/', { headers, params: { page_size: 200 } })
         ]);
 
-        setProgress(progressRes.data);
-        setLanguages(languagesRes.data);
+        setStats(statsRes.data);
+        setProgress(progressRes.data.results);
+        setLanguages(languagesRes.data.results);
         setLoading(false);
       } catch (error) {
         console.error('Error fetching dashboard data:', error);
@@ -77,23 +101,17 @@ const Dashboard: React.FC = () => {
   }, [token]);
 
   const calculateOverallProgress = () => {
-    if (progress.length === 0) return 0;
-    const completedQuizzes = progress.filter(p => p.completed).length;
-    return (completedQuizzes / progress.length) * 100;
+    if (!stats || stats.totals.quizzes_attempted === 0) return 0;
+    return (stats.totals.quizzes_completed / stats.totals.quizzes_attempted) * 100;
   };
 
-  const getLanguageProgress = (languageId: number) => {
-    const languageQuizzes = progress.filter(p => p.quiz.language.id === languageId);
-    if (languageQuizzes.length === 0) return 0;
-    
-    const totalScore = languageQuizzes.reduce((sum, p) => sum + p.score, 0);
-    return totalScore / languageQuizzes.length;
+  const getLanguageProgress = (languageCode: string) => {
+    const languageStats = stats?.languages.find(s => s.language === languageCode);
+    return languageStats?.average_score ?? 0;
   };
 
   const getRecentActivity = () => {
-    return [...progress]
-      .sort((a, b) => new Date(b.last_attempted).getTime() - new Date(a.last_attempted).getTime())
-      .slice(0, 3);
+    return progress.slice(0, 3);
   };
 
   if (loading) {
@@ -191,11 +209,11 @@ const Dashboard: React.FC = () => {
                         </Box>
                         <LinearProgress
                           variant="determinate"
-                          value={getLanguageProgress(language.id)}
+                          value={getLanguageProgress(language.code)}
                           sx={{ height: 10, borderRadius: 5 }}
                         />
                         <Typography variant="body2" color="text.secondary" sx={{ mt: 0.5 }}>
-                          {Math.round(getLanguageProgress(language.id))}% Complete
+                          {Math.round(getLanguageProgress(language.code))}% Complete
                         </Typography>
                       </Box>
                     </Grid>
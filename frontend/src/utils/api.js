@@ -69,7 +69,8 @@ const getAuthHeader = () => {
 
 export const getCourseDetails = async (language, level) => {
   try {
-    const response = await fetch(`${API_BASE_URL}/quizzes/?language=${language}&level=${level}`, {
+    // The list is compact by default; callers need the questions too
+    const response = await fetch(`${API_BASE_URL}/quizzes/?language=${language}&level=${level}&expand=questions`, {
       headers: {
         ...getAuthHeader(),
         'Content-Type': 'application/json',
@@ -87,11 +88,11 @@ export const getCourseDetails = async (language, level) => {
       throw new Error(data.error || 'Failed to fetch course details');
     }
 
-    if (!data.length) {
+    if (!data.results || !data.results.length) {
       throw new Error('No quiz found for this course');
     }
 
-    return data[0];
+    return data.results[0];
   } catch (error) {
     throw error;
   }